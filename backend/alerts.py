@@ -0,0 +1,331 @@
+"""
+Alerts Module
+Configurable alert rules, an index of the alerts currently active per city
+and fan-out of alert changes to stream subscribers
+"""
+import os
+import json
+import time
+import queue
+import logging
+from collections import namedtuple, OrderedDict
+from threading import Lock
+
+
+logger = logging.getLogger(__name__)
+
+
+class AlertRule(namedtuple('AlertRule', 'name metric above below level message cities')):
+    """
+    One threshold on one metric.
+
+    The rule fires when the metric is above 'above' or below 'below'.
+    'cities' (canonical city keys) limits it to those cities; such a rule
+    replaces the general rule of the same name there.
+    """
+
+    __slots__ = ()
+
+    def check(self, value):
+        if value is None:
+            return False
+        return (self.above is not None and value > self.above) or (
+            self.below is not None and value < self.below
+        )
+
+    @property
+    def threshold(self):
+        return self.above if self.above is not None else self.below
+
+
+def metrics_from_owm(data):
+    """Alert metrics from an OpenWeatherMap /weather response"""
+    main = data['main']
+    return {
+        'temperature': main['temp'],
+        'feels_like': main.get('feels_like'),
+        'humidity': main.get('humidity'),
+        'pressure': main.get('pressure'),
+        'wind_speed': data.get('wind', {}).get('speed')
+    }
+
+
+class AlertRules:
+    """
+    Ordered set of alert rules.
+
+    The defaults are high/low temperature (HIGH_TEMP_THRESHOLD,
+    LOW_TEMP_THRESHOLD), high wind (HIGH_WIND_THRESHOLD) and, when
+    HIGH_HUMIDITY_THRESHOLD is set, high humidity. ALERT_RULES_FILE may
+    point at a JSON list of further rules, e.g.
+
+        [{"name": "high_temp", "metric": "temperature", "above": 42,
+          "cities": ["dubai-ae"]},
+         {"name": "freezing", "metric": "feels_like", "below": -15,
+          "level": "FREEZING", "message": "Extreme cold warning!"}]
+
+    A rule with 'cities' overrides the rule of the same name for those
+    cities only; a rule without replaces it everywhere.
+    """
+
+    def __init__(self, rules):
+        # name -> (general rule, {city key: rule})
+        self.rules = OrderedDict()
+        for rule in rules:
+            general, by_city = self.rules.get(rule.name, (None, {}))
+            if rule.cities:
+                for city in rule.cities:
+                    by_city[city] = rule
+            else:
+                general = rule
+            self.rules[rule.name] = (general, by_city)
+
+    @classmethod
+    def from_env(cls, high_temp=None, low_temp=None, path=None):
+        """
+        Build the default rules plus any from ALERT_RULES_FILE
+
+        Args:
+            high_temp: High temperature threshold (°C)
+            low_temp: Low temperature threshold (°C)
+            path: Rules file, overriding ALERT_RULES_FILE
+        """
+        if high_temp is None:
+            high_temp = float(os.getenv('HIGH_TEMP_THRESHOLD', 35))
+        if low_temp is None:
+            low_temp = float(os.getenv('LOW_TEMP_THRESHOLD', 5))
+
+        rules = [
+            AlertRule('high_temp', 'temperature', high_temp, None, 'HOT', 'High temperature warning!', None),
+            AlertRule('low_temp', 'temperature', None, low_temp, 'COLD', 'Low temperature warning!', None),
+            AlertRule('high_wind', 'wind_speed', float(os.getenv('HIGH_WIND_THRESHOLD', 17.2)), None,
+                      'WINDY', 'High wind warning!', None)
+        ]
+        if os.getenv('HIGH_HUMIDITY_THRESHOLD'):
+            rules.append(AlertRule('high_humidity', 'humidity', float(os.getenv('HIGH_HUMIDITY_THRESHOLD')),
+                                   None, 'HUMID', 'High humidity warning!', None))
+
+        path = path or os.getenv('ALERT_RULES_FILE')
+        if path:
+            rules.extend(cls.load(path))
+        return cls(rules)
+
+    @staticmethod
+    def load(path):
+        """
+        Read rules from a JSON file
+
+        Raises:
+            ValueError if a rule is malformed
+        """
+        with open(path, encoding='utf-8') as f:
+            entries = json.load(f)
+
+        rules = []
+        for entry in entries:
+            if 'above' not in entry and 'below' not in entry:
+                raise ValueError(f'Alert rule {entry.get("name")!r} needs "above" or "below"')
+            name = entry['name']
+            rules.append(AlertRule(
+                name,
+                entry['metric'],
+                entry.get('above'),
+                entry.get('below'),
+                entry.get('level', name.upper()),
+                entry.get('message', f'{name.replace("_", " ").capitalize()} warning!'),
+                frozenset(entry['cities']) if entry.get('cities') else None
+            ))
+        return rules
+
+    def evaluate(self, metrics, city=None):
+        """
+        Rules that fire for a set of metrics
+
+        Args:
+            metrics: Dictionary of metric -> value
+            city: Canonical city key, for per-city rules
+
+        Returns:
+            List of fired AlertRule, in rule order
+        """
+        fired = []
+        for general, by_city in self.rules.values():
+            rule = by_city.get(city, general)
+            if rule is not None and rule.check(metrics.get(rule.metric)):
+                fired.append(rule)
+        return fired
+
+
+class AlertSubscription:
+    """
+    Bounded buffer of alert events for one stream client.
+
+    A client that falls more than max_pending events behind is closed
+    rather than letting its buffer grow; it can reconnect and start again
+    from the current alert snapshot.
+    """
+
+    def __init__(self, cities=None, max_pending=1000, wake=None):
+        self.cities = cities
+        self.events = queue.Queue(maxsize=max_pending)
+        self.closed = False
+        # Called after each delivery, e.g. to wake an event loop
+        self.wake = wake
+
+    def deliver(self, event):
+        """Queue an event; returns False once the subscription is closed"""
+        if self.cities and event['city'] not in self.cities:
+            return True
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            self.closed = True
+        if self.wake is not None:
+            self.wake()
+        return not self.closed
+
+    def get(self, timeout=None):
+        """Next event, or None if none arrived within timeout"""
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def get_nowait(self):
+        try:
+            return self.events.get_nowait()
+        except queue.Empty:
+            return None
+
+
+def format_event(event):
+    """Server-Sent Events frame for an alert event"""
+    return f'event: {event["event"]}\ndata: {json.dumps(event)}\n\n'
+
+
+class AlertIndex:
+    """
+    Alerts currently active for each city, updated as observations arrive.
+
+    update() evaluates the rules for one city and compares the result with
+    what was active before, so only changes produce events: 'raised' when
+    a rule starts firing and 'cleared' when it stops. Events go to every
+    subscriber; /alerts reads the index directly.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.active = {}  # city key -> {rule name: alert}
+        self.lock = Lock()
+        self.subscribers = []
+        self.raised = 0
+        self.cleared = 0
+        self.dropped_subscribers = 0
+
+    def update(self, city, display_name, metrics):
+        """
+        Evaluate the rules for a new observation of a city
+
+        Args:
+            city: Canonical city key
+            display_name: City name shown in alerts
+            metrics: Dictionary of metric -> value
+
+        Returns:
+            List of events for alerts raised or cleared by this observation
+        """
+        fired = {rule.name: rule for rule in self.rules.evaluate(metrics, city)}
+        now = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        events = []
+
+        with self.lock:
+            previous = self.active.get(city, {})
+            current = {}
+            for name, rule in fired.items():
+                alert = previous.get(name)
+                if alert is None or alert['level'] != rule.level:
+                    alert = {
+                        'city': city,
+                        'name': display_name,
+                        'rule': name,
+                        'level': rule.level,
+                        'message': rule.message,
+                        'metric': rule.metric,
+                        'threshold': rule.threshold,
+                        'since': now
+                    }
+                    events.append(alert)
+                alert['value'] = metrics.get(rule.metric)
+                current[name] = alert
+            events = [dict(alert, event='raised') for alert in events]
+            for name, alert in previous.items():
+                if name not in current:
+                    events.append(dict(alert, event='cleared', value=metrics.get(alert['metric']), until=now))
+
+            if current:
+                self.active[city] = current
+            else:
+                self.active.pop(city, None)
+            self.raised += sum(1 for e in events if e['event'] == 'raised')
+            self.cleared += sum(1 for e in events if e['event'] == 'cleared')
+            subscribers = list(self.subscribers) if events else []
+
+        for subscription in subscribers:
+            for event in events:
+                try:
+                    delivered = subscription.deliver(event)
+                except Exception as e:
+                    # e.g. the subscriber's event loop has shut down
+                    logger.warning('Alert stream subscriber failed: %s', e)
+                    delivered = False
+                if not delivered:
+                    self._drop(subscription)
+                    break
+        return events
+
+    def _drop(self, subscription):
+        subscription.closed = True
+        self.unsubscribe(subscription)
+        with self.lock:
+            self.dropped_subscribers += 1
+        logger.warning('Dropped an alert stream subscriber')
+
+    def current(self, cities=None):
+        """
+        Active alerts, optionally for some cities only
+
+        Returns:
+            List of alert dictionaries
+        """
+        with self.lock:
+            return [
+                dict(alert)
+                for city, alerts in self.active.items()
+                if not cities or city in cities
+                for alert in alerts.values()
+            ]
+
+    def snapshot(self, cities=None):
+        """Active alerts as 'active' events, sent when a stream starts"""
+        return [dict(alert, event='active') for alert in self.current(cities)]
+
+    def subscribe(self, subscription):
+        with self.lock:
+            self.subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            if subscription in self.subscribers:
+                self.subscribers.remove(subscription)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'active': sum(len(alerts) for alerts in self.active.values()),
+                'cities': len(self.active),
+                'raised': self.raised,
+                'cleared': self.cleared,
+                'subscribers': len(self.subscribers),
+                'dropped_subscribers': self.dropped_subscribers
+            }
@@ -1,12 +1,21 @@
 import os
+import sys
+import time
+import atexit
+import signal
 import logging
 from datetime import datetime
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
 
+from alerts import AlertSubscription, format_event
+from circuit_breaker import CircuitOpenError
+from history_store import HistoryQueryError, parse_range
+from http_cache import response_headers
+from metrics import CONTENT_TYPE, IN_FLIGHT, REGISTRY, REQUEST_SECONDS, REQUESTS
 from weather_service import WeatherService
-from utils import setup_logging, get_recent_logs
+from utils import setup_logging, get_recent_logs, query_logs
 
 # Load environment variables
 load_dotenv()
@@ -26,12 +35,67 @@ weather_service = WeatherService(
     low_temp_threshold=float(os.getenv('LOW_TEMP_THRESHOLD', 5))
 )
 
+BATCH_MAX_CITIES = int(os.getenv('BATCH_MAX_CITIES', 50))
+MAX_LOG_LIMIT = 1000
+MAX_AUTOCOMPLETE_LIMIT = 50
+ALERT_STREAM_HEARTBEAT_SECONDS = float(os.getenv('ALERT_STREAM_HEARTBEAT_SECONDS', 15))
+
+# Cache, fetch and alert counters are read from the service at scrape time
+REGISTRY.register_collector(weather_service.metric_families)
+
+# Restore the last cache snapshot and preload popular cities; /health
+# reports 503 until the preload is done. A final snapshot is written on exit.
+weather_service.warm_up()
+atexit.register(weather_service.shutdown)
+
+
+def _route():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+@app.before_request
+def _start_request_metrics():
+    g.request_started = time.perf_counter()
+    IN_FLIGHT.labels(_route()).inc()
+
+
+@app.after_request
+def _record_request_metrics(response):
+    # Streaming responses are timed until their first byte
+    route = _route()
+    REQUEST_SECONDS.labels(route).observe(time.perf_counter() - g.request_started)
+    REQUESTS.labels(route, request.method, response.status_code).inc()
+    return response
+
+
+@app.teardown_request
+def _end_request_metrics(error=None):
+    if 'request_started' in g:
+        IN_FLIGHT.labels(_route()).dec()
+
+
+def _rendered_response(rendered):
+    """Send a pre-serialized response, or 304 if the client's copy is current"""
+    status, body, headers = response_headers(
+        rendered, request.headers.get('If-None-Match'), request.headers.get('Accept-Encoding')
+    )
+    response = Response(body, status=status, headers=headers)
+    if status == 304:
+        del response.headers['Content-Type']
+    return response
+
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint for monitoring"""
     logger.info('Health check endpoint accessed')
-    return jsonify({'status': 'ok'}), 200
+    breaker = weather_service.client.breaker.stats()
+    if not weather_service.ready():
+        # Keeps load balancers away until the preload has warmed the cache
+        return jsonify({'status': 'starting', 'upstream': breaker}), 503
+    # Still 200 while the breaker is open: cached data keeps being served
+    status = 'ok' if breaker['state'] == 'closed' else 'degraded'
+    return jsonify({'status': status, 'upstream': breaker}), 200
 
 
 @app.route('/weather', methods=['GET'])
@@ -47,22 +111,26 @@ def get_weather():
         return jsonify({'error': 'City parameter is required'}), 400
     
     try:
-        logger.info(f'Weather request for city: {city}')
-        weather_data = weather_service.get_current_weather(city)
+        logger.info('Weather request for city: %s', city, extra={'city': city})
+        weather_data, rendered = weather_service.get_current_weather_response(city)
         
         # Log any alerts
         if weather_data.get('alert'):
-            logger.warning(f'Alert for {city}: {weather_data["alert"]}')
+            logger.warning('Alert for %s: %s', city, weather_data['alert'], extra={'city': city})
         
-        logger.info(f'Weather request successful for {city} - Status: 200')
-        return jsonify(weather_data), 200
+        logger.info('Weather request successful for %s - Status: 200', city, extra={'city': city})
+        return _rendered_response(rendered)
         
     except ValueError as e:
-        logger.error(f'Invalid city error for {city}: {str(e)}')
+        logger.error('Invalid city error for %s: %s', city, e, extra={'city': city})
         return jsonify({'error': str(e)}), 404
         
+    except CircuitOpenError as e:
+        logger.warning('Upstream unavailable for %s: %s', city, e, extra={'city': city})
+        return jsonify({'error': 'Weather service temporarily unavailable'}), 503
+        
     except Exception as e:
-        logger.error(f'Error fetching weather for {city}: {str(e)}')
+        logger.error('Error fetching weather for %s: %s', city, e, extra={'city': city})
         return jsonify({'error': 'Failed to fetch weather data'}), 500
 
 
@@ -75,40 +143,237 @@ def get_forecast():
         logger.warning('Forecast request without city parameter')
         return jsonify({'error': 'City parameter is required'}), 400
     
+    # ?current=derived takes current conditions from the forecast itself
+    derive_current = request.args.get('current') == 'derived'
+    
     try:
-        logger.info(f'Forecast request for city: {city}')
-        forecast_data = weather_service.get_forecast(city)
+        logger.info('Forecast request for city: %s', city, extra={'city': city})
+        forecast_data, rendered = weather_service.get_forecast_response(city, derive_current=derive_current)
         
         # Log any alerts in current conditions
         if forecast_data.get('current', {}).get('alert'):
-            logger.warning(f'Alert for {city}: {forecast_data["current"]["alert"]}')
+            logger.warning('Alert for %s: %s', city, forecast_data['current']['alert'], extra={'city': city})
         
-        logger.info(f'Forecast request successful for {city} - Status: 200')
-        return jsonify(forecast_data), 200
+        logger.info('Forecast request successful for %s - Status: 200', city, extra={'city': city})
+        return _rendered_response(rendered)
         
     except ValueError as e:
-        logger.error(f'Invalid city error for {city}: {str(e)}')
+        logger.error('Invalid city error for %s: %s', city, e, extra={'city': city})
         return jsonify({'error': str(e)}), 404
         
+    except CircuitOpenError as e:
+        logger.warning('Upstream unavailable for %s: %s', city, e, extra={'city': city})
+        return jsonify({'error': 'Weather service temporarily unavailable'}), 503
+        
     except Exception as e:
-        logger.error(f'Error fetching forecast for {city}: {str(e)}')
+        logger.error('Error fetching forecast for %s: %s', city, e, extra={'city': city})
         return jsonify({'error': 'Failed to fetch forecast data'}), 500
 
 
+def _batch_cities():
+    """
+    Read the city list from ?cities=a,b,c or a JSON body {"cities": [...]}
+    
+    Returns:
+        List of city names, or None if the JSON body is malformed
+    """
+    if request.method == 'POST':
+        body = request.get_json(silent=True)
+        if body is None:
+            body = {}
+        if not isinstance(body, dict) or not isinstance(body.get('cities', []), list):
+            return None
+        cities = body.get('cities') or []
+    else:
+        cities = request.args.get('cities', '').split(',')
+    
+    return [c.strip() for c in cities if isinstance(c, str) and c.strip()]
+
+
+def _batch_response(kind):
+    cities = _batch_cities()
+    
+    if cities is None:
+        logger.warning('Batch %s request with a malformed body', kind)
+        return jsonify({'error': 'Body must be an object with a "cities" list'}), 400
+    
+    if not cities:
+        logger.warning('Batch %s request without cities', kind)
+        return jsonify({'error': 'Cities parameter is required'}), 400
+    
+    if len(cities) > BATCH_MAX_CITIES:
+        logger.warning('Batch %s request with %d cities', kind, len(cities))
+        return jsonify({'error': f'At most {BATCH_MAX_CITIES} cities per request'}), 400
+    
+    try:
+        logger.info('Batch %s request for %d cities', kind, len(cities))
+        batch_data = weather_service.get_batch(cities, kind)
+        logger.info(
+            'Batch %s request done - %d ok, %d failed',
+            kind, len(batch_data['results']), len(batch_data['errors'])
+        )
+        return jsonify(batch_data), 200
+    
+    except Exception as e:
+        logger.error('Error fetching batch %s: %s', kind, e)
+        return jsonify({'error': f'Failed to fetch {kind} data'}), 500
+
+
+@app.route('/weather/batch', methods=['GET', 'POST'])
+def get_weather_batch():
+    """
+    Get current weather for several cities
+    Query params: cities (comma separated), or POST {"cities": [...]}
+    """
+    return _batch_response('weather')
+
+
+@app.route('/forecast/batch', methods=['GET', 'POST'])
+def get_forecast_batch():
+    """
+    Get 5-day forecasts for several cities
+    Query params: cities (comma separated), or POST {"cities": [...]}
+    """
+    return _batch_response('forecast')
+
+
 @app.route('/logs', methods=['GET'])
 def get_logs():
     """
-    Get last 10 log entries
+    Get recent log entries (last 10 by default)
+    Query params (optional): level, since, city, limit
     """
+    level = request.args.get('level')
+    since = request.args.get('since')
+    city = request.args.get('city')
+    
     try:
-        logs = get_recent_logs(count=10)
+        limit = min(int(request.args.get('limit', 10)), MAX_LOG_LIMIT)
+        if limit < 1:
+            return jsonify({'error': 'limit must be at least 1'}), 400
+        
+        if level or since or city:
+            logs = query_logs(level=level, since=since, city=city, limit=limit)
+        else:
+            logs = get_recent_logs(count=limit)
         return jsonify({'logs': logs}), 200
+    except ValueError as e:
+        return jsonify({'error': f'Invalid log query: {str(e)}'}), 400
     except Exception as e:
-        logger.error(f'Error fetching logs: {str(e)}')
+        logger.error('Error fetching logs: %s', e)
         return jsonify({'error': 'Failed to fetch logs'}), 500
     
 
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text-format metrics"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    """
+    Get cache and upstream fetch statistics
+    """
+    return jsonify(weather_service.get_stats()), 200
+
+
+@app.route('/cities/autocomplete', methods=['GET'])
+def autocomplete_cities():
+    """
+    Suggest known cities by name prefix
+    Query params: q (prefix), limit (optional, default 10)
+    """
+    prefix = request.args.get('q', '').strip()
+    if not prefix:
+        return jsonify({'error': 'Query parameter q is required'}), 400
+    
+    try:
+        limit = min(int(request.args.get('limit', 10)), MAX_AUTOCOMPLETE_LIMIT)
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+    
+    if limit < 1:
+        return jsonify({'error': 'limit must be at least 1'}), 400
+    
+    cities = weather_service.cities.autocomplete(prefix, limit)
+    return jsonify({'query': prefix, 'results': [c.to_dict() for c in cities]}), 200
+
+
+@app.route('/history', methods=['GET'])
+def get_history():
+    """
+    Get stored snapshot history for a city
+    Query params: city (required), from, to (ISO time or epoch seconds),
+    resolution (raw, hour, day, week or auto)
+    """
+    city = request.args.get('city')
+    if not city:
+        return jsonify({'error': 'City parameter is required'}), 400
+    
+    try:
+        start, end = parse_range(request.args.get('from'), request.args.get('to'))
+        history = weather_service.get_history(
+            city, start, end, request.args.get('resolution', 'auto')
+        )
+        return jsonify(history), 200
+    
+    except HistoryQueryError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+    
+    except Exception as e:
+        logger.error('Error reading history for %s: %s', city, e, extra={'city': city})
+        return jsonify({'error': 'Failed to fetch history'}), 500
+
+
+def _alert_cities():
+    """Canonical keys from ?cities=a,b, or None for every city"""
+    cities = [c.strip() for c in request.args.get('cities', '').split(',') if c.strip()]
+    return weather_service.city_keys(cities) if cities else None
+
+
+@app.route('/alerts', methods=['GET'])
+def get_alerts():
+    """
+    Get currently active alerts
+    Query params: cities (optional, comma separated)
+    """
+    return jsonify({'alerts': weather_service.alerts.current(_alert_cities())}), 200
+
+
+@app.route('/alerts/stream', methods=['GET'])
+def stream_alerts():
+    """
+    Server-Sent Events stream of alert changes
+    Query params: cities (optional, comma separated)
+    """
+    cities = _alert_cities()
+    alert_index = weather_service.alerts
+    subscription = alert_index.subscribe(AlertSubscription(cities))
+    logger.info('Alert stream opened (%d subscribers)', len(alert_index.subscribers))
+    
+    def generate():
+        try:
+            # Current alerts first, then changes as they happen
+            for event in alert_index.snapshot(cities):
+                yield format_event(event)
+            while not subscription.closed:
+                event = subscription.get(timeout=ALERT_STREAM_HEARTBEAT_SECONDS)
+                yield format_event(event) if event else ': keep-alive\n\n'
+        finally:
+            alert_index.unsubscribe(subscription)
+    
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @app.route('/health')
 def health():
     return {"status": "healthy"}, 200
@@ -123,7 +388,7 @@ def not_found(error):
 @app.errorhandler(500)
 def internal_error(error):
     """Handle 500 errors"""
-    logger.error(f'Internal server error: {str(error)}')
+    logger.error('Internal server error: %s', error)
     return jsonify({'error': 'Internal server error'}), 500
 
 
@@ -131,5 +396,8 @@ if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
     debug = os.getenv('FLASK_ENV') == 'development'
     
-    logger.info(f'Starting Flask application on port {port}')
+    # Exit normally on SIGTERM (docker stop) so the cache snapshot is saved
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
+    logger.info('Starting Flask application on port %s', port)
     app.run(host='0.0.0.0', port=port, debug=debug)
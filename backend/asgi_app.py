@@ -0,0 +1,556 @@
+"""
+ASGI Application
+Asyncio serving mode for the weather API; the Flask app in app.py remains
+the synchronous mode
+
+Usage: python asgi_app.py   or   uvicorn asgi_app:app --port 5000
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+from urllib.parse import parse_qs
+from dotenv import load_dotenv
+
+from async_weather_service import AsyncWeatherService
+from alerts import AlertSubscription, format_event
+from circuit_breaker import CircuitOpenError
+from history_store import HistoryQueryError, parse_range
+from http_cache import RenderedResponse, response_headers
+from metrics import CONTENT_TYPE, IN_FLIGHT, REGISTRY, REQUEST_SECONDS, REQUESTS
+from utils import setup_logging, get_recent_logs, query_logs
+
+# Load environment variables
+load_dotenv()
+
+# Setup logging
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Initialize weather service
+weather_service = AsyncWeatherService(
+    api_key=os.getenv('OPENWEATHER_API_KEY'),
+    high_temp_threshold=float(os.getenv('HIGH_TEMP_THRESHOLD', 35)),
+    low_temp_threshold=float(os.getenv('LOW_TEMP_THRESHOLD', 5))
+)
+
+BATCH_MAX_CITIES = int(os.getenv('BATCH_MAX_CITIES', 50))
+MAX_LOG_LIMIT = 1000
+MAX_AUTOCOMPLETE_LIMIT = 50
+ALERT_STREAM_HEARTBEAT_SECONDS = float(os.getenv('ALERT_STREAM_HEARTBEAT_SECONDS', 15))
+
+# Cache, fetch and alert counters are read from the service at scrape time
+REGISTRY.register_collector(weather_service.metric_families)
+
+
+class EventStream:
+    """Handler result sent as a text/event-stream instead of JSON"""
+
+    def __init__(self, events):
+        self.events = events  # async iterator of SSE frames
+
+
+class PlainText:
+    """Handler result sent as-is with its own content type"""
+
+    def __init__(self, body, content_type):
+        self.body = body
+        self.content_type = content_type
+
+
+class Request:
+    """The parts of an ASGI HTTP request the handlers need"""
+
+    def __init__(self, scope, receive):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.args = {
+            key: values[0]
+            for key, values in parse_qs(scope['query_string'].decode()).items()
+        }
+        self.headers = {k.decode().lower(): v.decode() for k, v in scope['headers']}
+        self._receive = receive
+
+    async def body(self):
+        chunks = []
+        while True:
+            message = await self._receive()
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    async def json(self):
+        try:
+            return json.loads(await self.body() or b'null')
+        except ValueError:
+            return None
+
+
+async def health_check(request):
+    """Health check endpoint for monitoring"""
+    logger.info('Health check endpoint accessed')
+    breaker = weather_service.client.breaker.stats()
+    if not weather_service.ready():
+        # Keeps load balancers away until the preload has warmed the cache
+        return {'status': 'starting', 'upstream': breaker}, 503
+    # Still 200 while the breaker is open: cached data keeps being served
+    status = 'ok' if breaker['state'] == 'closed' else 'degraded'
+    return {'status': status, 'upstream': breaker}, 200
+
+
+async def get_weather(request):
+    """
+    Get current weather for a city
+    Query params: city (required)
+    """
+    city = request.args.get('city')
+
+    if not city:
+        logger.warning('Weather request without city parameter')
+        return {'error': 'City parameter is required'}, 400
+
+    try:
+        logger.info('Weather request for city: %s', city, extra={'city': city})
+        weather_data, rendered = await weather_service.get_current_weather_response_async(city)
+
+        if weather_data.get('alert'):
+            logger.warning('Alert for %s: %s', city, weather_data['alert'], extra={'city': city})
+
+        logger.info('Weather request successful for %s - Status: 200', city, extra={'city': city})
+        return rendered, 200
+
+    except ValueError as e:
+        logger.error('Invalid city error for %s: %s', city, e, extra={'city': city})
+        return {'error': str(e)}, 404
+
+    except CircuitOpenError as e:
+        logger.warning('Upstream unavailable for %s: %s', city, e, extra={'city': city})
+        return {'error': 'Weather service temporarily unavailable'}, 503
+
+    except Exception as e:
+        logger.error('Error fetching weather for %s: %s', city, e, extra={'city': city})
+        return {'error': 'Failed to fetch weather data'}, 500
+
+
+async def get_forecast(request):
+    """
+    Get 5-day forecast for a city
+    Query params: city (required)
+    """
+    city = request.args.get('city')
+
+    if not city:
+        logger.warning('Forecast request without city parameter')
+        return {'error': 'City parameter is required'}, 400
+
+    # ?current=derived takes current conditions from the forecast itself
+    derive_current = request.args.get('current') == 'derived'
+
+    try:
+        logger.info('Forecast request for city: %s', city, extra={'city': city})
+        forecast_data, rendered = await weather_service.get_forecast_response_async(
+            city, derive_current=derive_current
+        )
+
+        if forecast_data.get('current', {}).get('alert'):
+            logger.warning('Alert for %s: %s', city, forecast_data['current']['alert'], extra={'city': city})
+
+        logger.info('Forecast request successful for %s - Status: 200', city, extra={'city': city})
+        return rendered, 200
+
+    except ValueError as e:
+        logger.error('Invalid city error for %s: %s', city, e, extra={'city': city})
+        return {'error': str(e)}, 404
+
+    except CircuitOpenError as e:
+        logger.warning('Upstream unavailable for %s: %s', city, e, extra={'city': city})
+        return {'error': 'Weather service temporarily unavailable'}, 503
+
+    except Exception as e:
+        logger.error('Error fetching forecast for %s: %s', city, e, extra={'city': city})
+        return {'error': 'Failed to fetch forecast data'}, 500
+
+
+async def _batch_cities(request):
+    """
+    Read the city list from ?cities=a,b,c or a JSON body {"cities": [...]}
+
+    Returns:
+        List of city names, or None if the JSON body is malformed
+    """
+    if request.method == 'POST':
+        body = await request.json()
+        if body is None:
+            body = {}
+        if not isinstance(body, dict) or not isinstance(body.get('cities', []), list):
+            return None
+        cities = body.get('cities') or []
+    else:
+        cities = request.args.get('cities', '').split(',')
+
+    return [c.strip() for c in cities if isinstance(c, str) and c.strip()]
+
+
+async def _batch_response(request, kind):
+    cities = await _batch_cities(request)
+
+    if cities is None:
+        logger.warning('Batch %s request with a malformed body', kind)
+        return {'error': 'Body must be an object with a "cities" list'}, 400
+
+    if not cities:
+        logger.warning('Batch %s request without cities', kind)
+        return {'error': 'Cities parameter is required'}, 400
+
+    if len(cities) > BATCH_MAX_CITIES:
+        logger.warning('Batch %s request with %d cities', kind, len(cities))
+        return {'error': f'At most {BATCH_MAX_CITIES} cities per request'}, 400
+
+    try:
+        logger.info('Batch %s request for %d cities', kind, len(cities))
+        batch_data = await weather_service.get_batch_async(cities, kind)
+        logger.info(
+            'Batch %s request done - %d ok, %d failed',
+            kind, len(batch_data['results']), len(batch_data['errors'])
+        )
+        return batch_data, 200
+
+    except Exception as e:
+        logger.error('Error fetching batch %s: %s', kind, e)
+        return {'error': f'Failed to fetch {kind} data'}, 500
+
+
+async def get_weather_batch(request):
+    """
+    Get current weather for several cities
+    Query params: cities (comma separated), or POST {"cities": [...]}
+    """
+    return await _batch_response(request, 'weather')
+
+
+async def get_forecast_batch(request):
+    """
+    Get 5-day forecasts for several cities
+    Query params: cities (comma separated), or POST {"cities": [...]}
+    """
+    return await _batch_response(request, 'forecast')
+
+
+async def get_logs(request):
+    """
+    Get recent log entries (last 10 by default)
+    Query params (optional): level, since, city, limit
+    """
+    level = request.args.get('level')
+    since = request.args.get('since')
+    city = request.args.get('city')
+
+    try:
+        limit = min(int(request.args.get('limit', 10)), MAX_LOG_LIMIT)
+        if limit < 1:
+            return {'error': 'limit must be at least 1'}, 400
+
+        if level or since or city:
+            logs = query_logs(level=level, since=since, city=city, limit=limit)
+        else:
+            # File I/O is kept off the event loop
+            logs = await asyncio.to_thread(get_recent_logs, limit)
+        return {'logs': logs}, 200
+    except ValueError as e:
+        return {'error': f'Invalid log query: {str(e)}'}, 400
+    except Exception as e:
+        logger.error('Error fetching logs: %s', e)
+        return {'error': 'Failed to fetch logs'}, 500
+
+
+async def get_metrics(request):
+    """Prometheus text-format metrics"""
+    return PlainText(REGISTRY.render(), CONTENT_TYPE), 200
+
+
+async def get_stats(request):
+    """
+    Get cache and upstream fetch statistics
+    """
+    return weather_service.get_stats(), 200
+
+
+async def autocomplete_cities(request):
+    """
+    Suggest known cities by name prefix
+    Query params: q (prefix), limit (optional, default 10)
+    """
+    prefix = request.args.get('q', '').strip()
+    if not prefix:
+        return {'error': 'Query parameter q is required'}, 400
+
+    try:
+        limit = min(int(request.args.get('limit', 10)), MAX_AUTOCOMPLETE_LIMIT)
+    except ValueError:
+        return {'error': 'limit must be a number'}, 400
+
+    if limit < 1:
+        return {'error': 'limit must be at least 1'}, 400
+
+    # Indexed SQLite lookups take microseconds; no need to leave the loop
+    cities = weather_service.cities.autocomplete(prefix, limit)
+    return {'query': prefix, 'results': [c.to_dict() for c in cities]}, 200
+
+
+async def get_history(request):
+    """
+    Get stored snapshot history for a city
+    Query params: city (required), from, to (ISO time or epoch seconds),
+    resolution (raw, hour, day, week or auto)
+    """
+    city = request.args.get('city')
+    if not city:
+        return {'error': 'City parameter is required'}, 400
+
+    try:
+        start, end = parse_range(request.args.get('from'), request.args.get('to'))
+        # Chunk files may need reading; keep that off the event loop
+        history = await asyncio.to_thread(
+            weather_service.get_history, city, start, end, request.args.get('resolution', 'auto')
+        )
+        return history, 200
+
+    except HistoryQueryError as e:
+        return {'error': str(e)}, 400
+
+    except ValueError as e:
+        return {'error': str(e)}, 404
+
+    except Exception as e:
+        logger.error('Error reading history for %s: %s', city, e, extra={'city': city})
+        return {'error': 'Failed to fetch history'}, 500
+
+
+def _alert_cities(request):
+    """Canonical keys from ?cities=a,b, or None for every city"""
+    cities = [c.strip() for c in request.args.get('cities', '').split(',') if c.strip()]
+    return weather_service.city_keys(cities) if cities else None
+
+
+async def get_alerts(request):
+    """
+    Get currently active alerts
+    Query params: cities (optional, comma separated)
+    """
+    return {'alerts': weather_service.alerts.current(_alert_cities(request))}, 200
+
+
+async def stream_alerts(request):
+    """
+    Server-Sent Events stream of alert changes
+    Query params: cities (optional, comma separated)
+    """
+    cities = _alert_cities(request)
+    alert_index = weather_service.alerts
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+    # Alerts may change on any thread; wake this stream on the event loop
+    subscription = alert_index.subscribe(
+        AlertSubscription(cities, wake=lambda: loop.call_soon_threadsafe(wake.set))
+    )
+    logger.info('Alert stream opened (%d subscribers)', len(alert_index.subscribers))
+
+    async def events():
+        try:
+            for event in alert_index.snapshot(cities):
+                yield format_event(event)
+            while not subscription.closed:
+                try:
+                    await asyncio.wait_for(wake.wait(), ALERT_STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                wake.clear()
+                event = subscription.get_nowait()
+                while event is not None:
+                    yield format_event(event)
+                    event = subscription.get_nowait()
+        finally:
+            alert_index.unsubscribe(subscription)
+
+    return EventStream(events()), 200
+
+
+ROUTES = {
+    '/health': (health_check, ('GET',)),
+    '/weather': (get_weather, ('GET',)),
+    '/forecast': (get_forecast, ('GET',)),
+    '/weather/batch': (get_weather_batch, ('GET', 'POST')),
+    '/forecast/batch': (get_forecast_batch, ('GET', 'POST')),
+    '/logs': (get_logs, ('GET',)),
+    '/metrics': (get_metrics, ('GET',)),
+    '/stats': (get_stats, ('GET',)),
+    '/cities/autocomplete': (autocomplete_cities, ('GET',)),
+    '/history': (get_history, ('GET',)),
+    '/alerts': (get_alerts, ('GET',)),
+    '/alerts/stream': (stream_alerts, ('GET',)),
+}
+
+CORS_HEADERS = [
+    (b'access-control-allow-origin', b'*'),
+    (b'access-control-allow-methods', b'GET, POST, OPTIONS'),
+    (b'access-control-allow-headers', b'Content-Type'),
+]
+
+
+async def send_json(send, payload, status):
+    body = json.dumps(payload).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+        ] + CORS_HEADERS
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_rendered(send, request, rendered):
+    """Send a pre-serialized response, or 304 if the client's copy is current"""
+    status, body, headers = response_headers(
+        rendered, request.headers.get('if-none-match'), request.headers.get('accept-encoding')
+    )
+    headers = [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+    if status != 304:
+        headers.append((b'content-length', str(len(body)).encode()))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers + CORS_HEADERS})
+    await send({'type': 'http.response.body', 'body': body})
+    return status
+
+
+async def send_event_stream(send, receive, stream):
+    """Send SSE frames until the stream ends or the client disconnects"""
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+        ] + CORS_HEADERS
+    })
+
+    async def pump():
+        async for frame in stream.events:
+            await send({'type': 'http.response.body', 'body': frame.encode(), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def watch_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    # Stop as soon as the client goes away rather than at the next frame
+    tasks = [asyncio.create_task(pump()), asyncio.create_task(watch_disconnect())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await stream.events.aclose()
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Build the city index before serving, not on the first lookup
+            await asyncio.to_thread(weather_service.cities.load)
+            # Restores the cache snapshot (a local file read) and starts the preload thread
+            weather_service.warm_up()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            # Writes the final cache snapshot
+            weather_service.shutdown()
+            await weather_service.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    request = Request(scope, receive)
+    path = request.path.rstrip('/') or '/'
+    route_name = path if path in ROUTES else 'unmatched'
+
+    started = time.perf_counter()
+    IN_FLIGHT.labels(route_name).inc()
+    status = 500
+    try:
+        status = await dispatch(request, ROUTES.get(path), receive, send, started)
+    finally:
+        IN_FLIGHT.labels(route_name).dec()
+        if status is not None:
+            REQUEST_SECONDS.labels(route_name).observe(time.perf_counter() - started)
+        REQUESTS.labels(route_name, request.method, status or 200).inc()
+
+
+async def dispatch(request, route, receive, send, started):
+    """
+    Run the handler for a request and send its response
+
+    Returns:
+        Response status, or None for an event stream (already timed)
+    """
+    if request.method == 'OPTIONS':
+        await send({'type': 'http.response.start', 'status': 204, 'headers': CORS_HEADERS})
+        await send({'type': 'http.response.body', 'body': b''})
+        return 204
+
+    if route is None:
+        await send_json(send, {'error': 'Endpoint not found'}, 404)
+        return 404
+
+    handler, methods = route
+    if request.method not in methods:
+        await send_json(send, {'error': 'Method not allowed'}, 405)
+        return 405
+
+    try:
+        payload, status = await handler(request)
+    except Exception as e:
+        logger.error('Internal server error: %s', e)
+        payload, status = {'error': 'Internal server error'}, 500
+
+    if isinstance(payload, EventStream):
+        # Streams are timed until their first byte, as in the Flask app
+        REQUEST_SECONDS.labels(request.path.rstrip('/')).observe(time.perf_counter() - started)
+        await send_event_stream(send, receive, payload)
+        return None
+    if isinstance(payload, RenderedResponse):
+        return await send_rendered(send, request, payload)
+    if isinstance(payload, PlainText):
+        body = payload.body.encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', payload.content_type.encode()),
+                (b'content-length', str(len(body)).encode()),
+            ] + CORS_HEADERS
+        })
+        await send({'type': 'http.response.body', 'body': body})
+        return status
+    await send_json(send, payload, status)
+    return status
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    port = int(os.getenv('PORT', 5000))
+
+    logger.info('Starting ASGI application on port %s', port)
+    uvicorn.run('asgi_app:app', host='0.0.0.0', port=port, log_level='warning')
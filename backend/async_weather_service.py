@@ -0,0 +1,282 @@
+"""
+Async Weather Service Module
+Non-blocking variant of WeatherService for the asyncio serving mode
+"""
+import asyncio
+
+from cache_backends import SharedWeatherCache
+from circuit_breaker import CircuitOpenError
+from http_client import AsyncUpstreamClient
+from single_flight import AsyncSingleFlight
+from weather_service import WeatherService
+
+
+class AsyncWeatherService(WeatherService):
+    """
+    WeatherService whose upstream fetches are coroutines.
+
+    Cache hits are answered directly on the event loop; misses await a
+    pooled httpx client instead of holding a thread. With a shared cache
+    (SQLite or Redis) every cache read and write blocks on I/O, so those
+    calls and city resolution run on worker threads instead. Background stale-while-revalidate refreshes
+    keep using the synchronous fetch on the cache's refresh threads.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # One breaker per upstream, shared with the sync client
+        self.async_client = AsyncUpstreamClient(breaker=self.client.breaker)
+        self.async_flight = AsyncSingleFlight()
+        self.blocking_lookups = isinstance(self.cache, SharedWeatherCache)
+
+    async def _lookup(self, func, *args, **kwargs):
+        """Call a cache or city index method, on a worker thread if it may block"""
+        if self.blocking_lookups:
+            return await asyncio.to_thread(func, *args, **kwargs)
+        return func(*args, **kwargs)
+
+    async def _get_json(self, endpoint, city, key):
+        """
+        Fetch one OpenWeatherMap endpoint for a city
+
+        Args:
+            endpoint: 'weather' or 'forecast'
+            city: Upstream query
+            key: Canonical city key, negatively cached on 404
+
+        Raises:
+            ValueError if the city is not found, CircuitOpenError while the
+            upstream circuit is open, Exception on other errors
+        """
+        params = {
+            'q': city,
+            'appid': self.api_key,
+            'units': 'metric'
+        }
+
+        try:
+            response = await self.async_client.get(f'{self.base_url}/{endpoint}', params=params)
+        except self.async_client.httpx.TransportError as e:
+            raise Exception(f'Network error: {str(e)}')
+
+        if response.status_code == 404:
+            self.not_found.add(key)
+            raise ValueError(f'City "{city}" not found')
+        if response.status_code >= 400:
+            raise Exception(f'API error: {response.status_code}')
+
+        return response.json()
+
+    async def get_current_weather_async(self, city):
+        """
+        Get current weather for a city without blocking the event loop
+
+        Args:
+            city: City name
+
+        Returns:
+            Dictionary with weather data
+        """
+        key, query = await self._lookup(self._resolve_city, city)
+        return await self._current_weather_async(key, query)
+
+    async def get_current_weather_response_async(self, city):
+        """
+        Get current weather for a city along with its serialized response
+
+        Returns:
+            (weather data, http_cache.RenderedResponse)
+        """
+        key, query = await self._lookup(self._resolve_city, city)
+        weather_data = await self._current_weather_async(key, query)
+        return weather_data, self._render_current(key, weather_data)
+
+    async def _current_weather_async(self, key, query):
+        cache_key = f'weather_{key}'
+        cached_data = await self._lookup(
+            self._cache_get, cache_key, refresh=lambda: self._refresh_current_weather(query, cache_key)
+        )
+        if cached_data:
+            return cached_data
+
+        return await self.async_flight.do(
+            cache_key, lambda: self._fetch_current_weather_async(query, key, cache_key)
+        )
+
+    async def _fetch_current_weather_async(self, query, key, cache_key):
+        cached_data = await self._lookup(self._cache_get, cache_key)
+        if cached_data:
+            return cached_data
+
+        try:
+            data = await self._get_json('weather', query, key)
+        except ValueError:
+            raise
+        except Exception as e:
+            return await self._lookup(self._serve_stale, cache_key, e)
+        return await self._lookup(self._store_current_weather, cache_key, data)
+
+    async def get_forecast_async(self, city, derive_current=False):
+        """
+        Get 5-day forecast for a city without blocking the event loop
+
+        Args:
+            city: City name
+            derive_current: Take current conditions from the nearest
+                forecast slot when they are not already cached
+
+        Returns:
+            Dictionary with current weather and forecast data
+        """
+        _, forecast_entry, current_weather = await self._forecast_parts_async(city, derive_current)
+        return self._compose_forecast(forecast_entry, current_weather)
+
+    async def get_forecast_response_async(self, city, derive_current=False):
+        """
+        Get 5-day forecast for a city along with its serialized response
+
+        Returns:
+            (forecast data, http_cache.RenderedResponse)
+        """
+        key, forecast_entry, current_weather = await self._forecast_parts_async(city, derive_current)
+        return (
+            self._compose_forecast(forecast_entry, current_weather),
+            self._render_forecast(key, forecast_entry, current_weather)
+        )
+
+    async def _forecast_parts_async(self, city, derive_current):
+        key, query = await self._lookup(self._resolve_city, city)
+        cache_key = f'forecast_{key}'
+        forecast_entry = await self._lookup(
+            self._cache_get, cache_key, refresh=lambda: self._refresh_forecast(query, cache_key)
+        )
+        if forecast_entry:
+            current_weather = await self._current_for_forecast_async(
+                city, forecast_entry, derive_current
+            )
+            return key, forecast_entry, current_weather
+
+        fetch_forecast = self.async_flight.do(
+            cache_key, lambda: self._fetch_forecast_async(query, key, cache_key)
+        )
+        if derive_current:
+            forecast_entry = await fetch_forecast
+            current_weather = await self._current_for_forecast_async(city, forecast_entry, True)
+        else:
+            # Fetch /weather and /forecast concurrently rather than back to back
+            forecast_entry, current_weather = await asyncio.gather(
+                fetch_forecast, self.get_current_weather_async(city), return_exceptions=True
+            )
+            for outcome in (forecast_entry, current_weather):
+                if isinstance(outcome, Exception):
+                    raise outcome
+
+        return key, forecast_entry, current_weather
+
+    async def _current_for_forecast_async(self, city, forecast_entry, derive_current):
+        if derive_current:
+            key, _ = await self._lookup(self._resolve_city, city)
+            cached_data = await self._lookup(self._cache_get, f'weather_{key}')
+            return cached_data or self._derive_current_weather(forecast_entry, key)
+        return await self.get_current_weather_async(city)
+
+    async def _fetch_forecast_async(self, query, key, cache_key):
+        cached_data = await self._lookup(self._cache_get, cache_key)
+        if cached_data:
+            return cached_data
+
+        try:
+            data = await self._get_json('forecast', query, key)
+        except ValueError:
+            raise
+        except Exception as e:
+            return await self._lookup(self._serve_stale, cache_key, e)
+        forecast_data = self._process_forecast(data)
+        await self._lookup(self.cache.set, cache_key, forecast_data)
+        return forecast_data
+
+    async def get_batch_async(self, cities, kind='weather'):
+        """
+        Get current weather or forecasts for several cities at once
+
+        Cache hits are answered immediately. Current conditions for the
+        misses come from bulk /group calls once their city IDs are known;
+        the rest is awaited concurrently, at most BATCH_MAX_CONCURRENCY at a time.
+
+        Args:
+            cities: List of city names
+            kind: 'weather' or 'forecast'
+
+        Returns:
+            Dictionary with per-city results and per-city errors
+        """
+        if kind == 'weather':
+            fetch = self.get_current_weather_async
+        elif kind == 'forecast':
+            fetch = self.get_forecast_async
+        else:
+            raise ValueError(f'Unknown batch type: {kind}')
+
+        results = {}
+        errors = {}
+        misses = []
+
+        for city in dict.fromkeys(cities):
+            try:
+                cached_data = await self._lookup(self._get_cached, kind, city)
+            except ValueError as e:
+                errors[city] = {'error': str(e), 'status': 404}
+                continue
+            if cached_data:
+                results[city] = cached_data
+            else:
+                misses.append(city)
+
+        cache_hits = len(results)
+        fetched = len(misses)
+
+        # The bulk /group calls use the pooled sync client on a worker thread
+        failures = await asyncio.to_thread(self._prefetch_current_weather, misses)
+        self._take_not_found(misses, errors, failures)
+
+        semaphore = asyncio.Semaphore(self.batch_concurrency)
+
+        async def fetch_one(city):
+            async with semaphore:
+                return await fetch(city)
+
+        outcomes = await asyncio.gather(
+            *(fetch_one(city) for city in misses), return_exceptions=True
+        )
+        for city, outcome in zip(misses, outcomes):
+            if isinstance(outcome, ValueError):
+                errors[city] = {'error': str(outcome), 'status': 404}
+            elif isinstance(outcome, CircuitOpenError):
+                errors[city] = {'error': 'Weather service temporarily unavailable', 'status': 503}
+            elif isinstance(outcome, Exception):
+                errors[city] = {'error': f'Failed to fetch {kind} data', 'status': 500}
+            else:
+                results[city] = outcome
+
+        return {
+            'type': kind,
+            'results': results,
+            'errors': errors,
+            'cache_hits': cache_hits,
+            'fetched': fetched
+        }
+
+    def get_stats(self):
+        """
+        Get cache and upstream fetch statistics for both fetch paths
+
+        Returns:
+            Dictionary as WeatherService.get_stats, plus async counters
+        """
+        stats = super().get_stats()
+        stats['fetches_async'] = self.async_flight.stats()
+        stats['upstream_async'] = self.async_client.stats()
+        return stats
+
+    async def close(self):
+        await self.async_client.close()
@@ -0,0 +1,103 @@
+"""
+Cache Microbenchmark
+Compares WeatherCache (single lock) with ShardedWeatherCache (lock-striped)
+throughput as the number of threads grows
+
+Usage: python benchmarks/cache_bench.py [--threads 1,2,4,8,16] [--seconds 2]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from threading import Barrier, Thread
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from cache_layer import WeatherCache, ShardedWeatherCache
+
+
+def run_workload(cache, threads, seconds, keys=500, write_ratio=0.1):
+    """
+    Hammer a cache with a get-heavy mix from several threads
+
+    Returns:
+        Total operations per second across all threads
+    """
+    key_names = [f'weather_city{i}' for i in range(keys)]
+    for key in key_names:
+        cache.set(key, {'city': key, 'temperature': 20.0})
+
+    counts = [0] * threads
+    barrier = Barrier(threads + 1)
+    deadline = [0.0]
+
+    def worker(index):
+        rng = random.Random(index)
+        ops = 0
+        barrier.wait()
+        while time.perf_counter() < deadline[0]:
+            for _ in range(100):
+                key = key_names[rng.randrange(keys)]
+                if rng.random() < write_ratio:
+                    cache.set(key, {'city': key, 'temperature': 21.0})
+                else:
+                    cache.get(key)
+            ops += 100
+        counts[index] = ops
+
+    workers = [Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    deadline[0] = time.perf_counter() + seconds
+    barrier.wait()
+    for t in workers:
+        t.join()
+
+    return sum(counts) / seconds
+
+
+def run(thread_counts=(1, 2, 4, 8, 16), seconds=2.0, shards=16):
+    """
+    Run the benchmark for every thread count
+
+    Returns:
+        List of result dictionaries (ops/s per implementation)
+    """
+    results = []
+    for threads in thread_counts:
+        single = WeatherCache(sweep_interval=0)
+        sharded = ShardedWeatherCache(shards=shards, sweep_interval=0)
+        results.append({
+            'threads': threads,
+            'single_lock_ops_per_sec': round(run_workload(single, threads, seconds)),
+            'sharded_ops_per_sec': round(run_workload(sharded, threads, seconds))
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='WeatherCache lock contention benchmark')
+    parser.add_argument('--threads', default='1,2,4,8,16', help='comma separated thread counts')
+    parser.add_argument('--seconds', type=float, default=2.0, help='duration per run')
+    parser.add_argument('--shards', type=int, default=16)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    thread_counts = [int(t) for t in args.threads.split(',')]
+    results = run(thread_counts, args.seconds, args.shards)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'threads':>8} {'single lock ops/s':>18} {'sharded ops/s':>14} {'speedup':>8}")
+    for r in results:
+        speedup = r['sharded_ops_per_sec'] / r['single_lock_ops_per_sec']
+        print(f"{r['threads']:>8} {r['single_lock_ops_per_sec']:>18,} "
+              f"{r['sharded_ops_per_sec']:>14,} {speedup:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
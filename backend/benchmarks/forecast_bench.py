@@ -0,0 +1,126 @@
+"""
+Forecast Aggregation Benchmark
+Compares the original per-day grouping loop from WeatherService.get_forecast
+with forecast_aggregation.aggregate_daily on synthetic forecast lists
+
+Usage: python benchmarks/forecast_bench.py [--sizes 40,4000,400000]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import forecast_aggregation
+from forecast_aggregation import aggregate_daily
+
+CONDITIONS = [('Clear', '01d'), ('Clouds', '03d'), ('Rain', '10d'), ('Snow', '13d'), ('Mist', '50d')]
+
+
+def synthetic_forecast(size, seed=42):
+    """Build 'size' 3-hour slots shaped like the OpenWeatherMap forecast list"""
+    rng = random.Random(seed)
+    start = 1_700_000_000 // 10800 * 10800
+    items = []
+    for i in range(size):
+        condition, icon = rng.choice(CONDITIONS)
+        items.append({
+            'dt': start + i * 10800,
+            'main': {'temp': round(rng.uniform(-10, 35), 2)},
+            'weather': [{'main': condition, 'icon': icon}]
+        })
+    return items
+
+
+def legacy_aggregate(items, days=5):
+    """The grouping loop WeatherService.get_forecast used before aggregate_daily"""
+    daily_forecasts = {}
+
+    for item in items:
+        date = datetime.fromtimestamp(item['dt']).strftime('%Y-%m-%d')
+
+        if date not in daily_forecasts:
+            daily_forecasts[date] = {
+                'temps': [],
+                'conditions': [],
+                'icons': []
+            }
+
+        daily_forecasts[date]['temps'].append(item['main']['temp'])
+        daily_forecasts[date]['conditions'].append(item['weather'][0]['main'])
+        daily_forecasts[date]['icons'].append(item['weather'][0]['icon'])
+
+    forecast_array = []
+    for date in sorted(daily_forecasts.keys())[:days]:
+        day_data = daily_forecasts[date]
+        condition = max(set(day_data['conditions']), key=day_data['conditions'].count)
+        icon = max(set(day_data['icons']), key=day_data['icons'].count)
+        forecast_array.append({
+            'date': date,
+            'day_name': datetime.strptime(date, '%Y-%m-%d').strftime('%A'),
+            'min_temp': round(min(day_data['temps']), 1),
+            'max_temp': round(max(day_data['temps']), 1),
+            'condition': condition,
+            'icon': icon
+        })
+    return forecast_array
+
+
+def best_of(fn, repeat):
+    """Best wall time in ms over several runs"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 3)
+
+
+def run(sizes=(40, 4000, 400000), repeat=5):
+    """
+    Time each implementation for every input size
+
+    Returns:
+        List of result dictionaries (milliseconds per call)
+    """
+    results = []
+    for size in sizes:
+        items = synthetic_forecast(size)
+        # Aggregate every day so the work scales with the input
+        days = size
+        result = {
+            'slots': size,
+            'legacy_ms': best_of(lambda: legacy_aggregate(items, days), repeat),
+            'single_pass_ms': best_of(lambda: aggregate_daily(items, days=days, use_numpy=False), repeat)
+        }
+        if forecast_aggregation.np is not None:
+            result['numpy_ms'] = best_of(lambda: aggregate_daily(items, days=days, use_numpy=True), repeat)
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Forecast aggregation benchmark')
+    parser.add_argument('--sizes', default='40,4000,400000', help='comma separated slot counts')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = run([int(s) for s in args.sizes.split(',')], args.repeat)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'slots':>8} {'legacy ms':>11} {'single-pass ms':>15} {'numpy ms':>10}")
+    for r in results:
+        numpy_ms = r.get('numpy_ms', 'n/a')
+        print(f"{r['slots']:>8} {r['legacy_ms']:>11} {r['single_pass_ms']:>15} {numpy_ms:>10}")
+
+
+if __name__ == '__main__':
+    main()
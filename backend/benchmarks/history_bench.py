@@ -0,0 +1,118 @@
+"""
+History Store Benchmark
+Times /history-style range queries against history_store.HistoryStore and
+against scanning the same snapshots as newline-delimited JSON (the S3 layout)
+
+Usage: python benchmarks/history_bench.py [--days 365] [--cities 5]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from history_store import HistoryStore, snapshot_values
+
+START = 1_700_000_000 // 86400 * 86400
+
+
+def synthetic_snapshots(days, seed=42):
+    """Hourly /weather responses for 'days' days"""
+    rng = random.Random(seed)
+    for hour in range(days * 24):
+        temp = round(10 + 8 * rng.random() + (hour % 24) / 3, 2)
+        yield {
+            'dt': START + hour * 3600,
+            'main': {'temp': temp, 'feels_like': temp - 1, 'humidity': rng.randint(40, 95),
+                     'pressure': rng.randint(990, 1030)},
+            'wind': {'speed': round(rng.uniform(0, 12), 1)}
+        }
+
+
+def ndjson_query(path, start, end, step):
+    """Daily min/max/mean temperature by scanning every stored line"""
+    buckets = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            data = json.loads(line)
+            if start <= data['dt'] < end:
+                buckets.setdefault(data['dt'] - data['dt'] % step, []).append(data['main']['temp'])
+    return [
+        {'time': bucket, 'min': min(t), 'max': max(t), 'mean': sum(t) / len(t)}
+        for bucket, t in sorted(buckets.items())
+    ]
+
+
+def best_of(fn, repeat):
+    """Best wall time in ms over several runs"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 3)
+
+
+def run(days=365, cities=5, repeat=5):
+    """
+    Fill a temporary store and time queries of several spans
+
+    Returns:
+        List of result dictionaries (milliseconds per query)
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        store = HistoryStore(path=os.path.join(root, 'store'), max_points=100000)
+        snapshots = list(synthetic_snapshots(days))
+        for city in range(cities):
+            ndjson_path = os.path.join(root, f'city{city}.ndjson')
+            with open(ndjson_path, 'w', encoding='utf-8') as f:
+                for data in snapshots:
+                    store.append(f'city{city}', data)
+                    f.write(json.dumps(data) + '\n')
+
+        end = snapshot_values(snapshots[-1])[0] + 1
+        for span_days, resolution in ((1, 'raw'), (7, 'hour'), (30, 'day'), (days, 'day'), (days, 'week')):
+            start = end - span_days * 86400
+            step = {'raw': 1, 'hour': 3600, 'day': 86400, 'week': 7 * 86400}[resolution]
+
+            def cold():
+                HistoryStore(path=store.path).query('city0', start, end, resolution)
+
+            results.append({
+                'span_days': span_days,
+                'resolution': resolution,
+                'points': len(store.query('city0', start, end, resolution)[1]),
+                'ndjson_ms': best_of(lambda: ndjson_query(os.path.join(root, 'city0.ndjson'), start, end, step), repeat),
+                'cold_ms': best_of(cold, repeat),
+                'warm_ms': best_of(lambda: store.query('city0', start, end, resolution), repeat)
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='History store benchmark')
+    parser.add_argument('--days', type=int, default=365, help='days of hourly samples per city')
+    parser.add_argument('--cities', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = run(args.days, args.cities, args.repeat)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'span':>6} {'resolution':>10} {'points':>7} {'ndjson ms':>10} {'cold ms':>9} {'warm ms':>9}")
+    for r in results:
+        print(f"{r['span_days']:>5}d {r['resolution']:>10} {r['points']:>7} "
+              f"{r['ndjson_ms']:>10} {r['cold_ms']:>9} {r['warm_ms']:>9}")
+
+
+if __name__ == '__main__':
+    main()
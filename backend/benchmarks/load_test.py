@@ -0,0 +1,362 @@
+"""
+Load Test
+Closed-loop HTTP load against /weather, /forecast and /logs, with the
+mock OpenWeatherMap server (devtools/mock_owm.py) as the upstream
+
+By default the mock upstream runs in-process and the API is started as a
+subprocess pointed at it (OPENWEATHER_BASE_URL), so every run starts from
+an empty cache. Use --target to load an API that is already running.
+
+Scenarios:
+    weather-hot, forecast-hot            90% of requests go to 10 cities
+    weather-uniform, forecast-uniform    every city in data/cities.csv equally
+    weather-cold, forecast-cold          a new city per request (always a cache miss)
+    logs                                 GET /logs
+
+Results (p50/p95/p99 latency, req/s, status codes, upstream calls) can be
+saved as JSON and compared with a previous run:
+
+Usage: python benchmarks/load_test.py [--server flask|asgi] [--scenarios weather-hot,logs]
+       [--concurrency 16] [--duration 10] [--output results.json] [--compare baseline.json]
+"""
+import os
+import sys
+import csv
+import json
+import time
+import random
+import socket
+import argparse
+import platform
+import subprocess
+import http.client
+from threading import Barrier, Thread
+from urllib.parse import quote, urlsplit
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND_DIR)
+
+from devtools.mock_owm import MockOWMServer
+
+
+SCENARIOS = (
+    'weather-hot', 'weather-uniform', 'weather-cold',
+    'forecast-hot', 'forecast-uniform', 'forecast-cold',
+    'logs'
+)
+HOT_CITIES = 10
+HOT_SHARE = 0.9
+
+
+def load_cities():
+    path = os.path.join(BACKEND_DIR, 'data', 'cities.csv')
+    with open(path, encoding='utf-8', newline='') as f:
+        return [row['name'].strip() for row in csv.DictReader(f)]
+
+
+def request_paths(scenario, cities, rng, worker):
+    """
+    Endless stream of request paths for one worker
+
+    Cold names include the worker index so no two requests share a key.
+    """
+    if scenario == 'logs':
+        while True:
+            yield '/logs?limit=50'
+
+    endpoint, _, keys = scenario.partition('-')
+    hot, rest = cities[:HOT_CITIES], cities[HOT_CITIES:] or cities
+    n = 0
+    while True:
+        if keys == 'hot':
+            city = rng.choice(hot) if rng.random() < HOT_SHARE else rng.choice(rest)
+        elif keys == 'uniform':
+            city = rng.choice(cities)
+        else:
+            n += 1
+            city = f'Loadtest {worker} {n}'
+        yield f'/{endpoint}?city={quote(city)}'
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(target, scenario, cities, concurrency, duration, warmup, seed=0):
+    """
+    Run one scenario with 'concurrency' keep-alive connections
+
+    Each worker sends its next request as soon as the previous one is
+    answered; only requests completed after 'warmup' seconds are counted.
+
+    Returns:
+        Result dictionary (latencies in milliseconds)
+    """
+    url = urlsplit(target)
+    latencies = [[] for _ in range(concurrency)]
+    statuses = [{} for _ in range(concurrency)]
+    errors = [0] * concurrency
+    barrier = Barrier(concurrency + 1)
+    window = [0.0, 0.0]  # measure from, stop at
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        paths = request_paths(scenario, cities, rng, index)
+        conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+        barrier.wait()
+        while True:
+            started = time.perf_counter()
+            if started >= window[1]:
+                break
+            try:
+                conn.request('GET', next(paths), headers={'Accept-Encoding': 'gzip'})
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+                status = None
+            finished = time.perf_counter()
+            if started < window[0]:
+                continue
+            if status is None:
+                errors[index] += 1
+                continue
+            latencies[index].append((finished - started) * 1000)
+            statuses[index][status] = statuses[index].get(status, 0) + 1
+        conn.close()
+
+    workers = [Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in workers:
+        t.start()
+    window[0] = time.perf_counter() + warmup
+    window[1] = window[0] + duration
+    barrier.wait()
+    for t in workers:
+        t.join()
+
+    samples = sorted(ms for worker_latencies in latencies for ms in worker_latencies)
+    status_counts = {}
+    for counts in statuses:
+        for status, count in counts.items():
+            status_counts[str(status)] = status_counts.get(str(status), 0) + count
+    non_2xx = sum(count for status, count in status_counts.items() if not status.startswith('2'))
+
+    return {
+        'scenario': scenario,
+        'requests': len(samples),
+        'rps': round(len(samples) / duration, 1),
+        'p50_ms': _round(percentile(samples, 50)),
+        'p95_ms': _round(percentile(samples, 95)),
+        'p99_ms': _round(percentile(samples, 99)),
+        'mean_ms': _round(sum(samples) / len(samples) if samples else None),
+        'max_ms': _round(samples[-1] if samples else None),
+        'status': status_counts,
+        'errors': sum(errors) + non_2xx
+    }
+
+
+def _round(value):
+    return None if value is None else round(value, 3)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until_ready(target, process, timeout=30):
+    url = urlsplit(target)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'API server exited with code {process.returncode}')
+        try:
+            conn = http.client.HTTPConnection(url.hostname, url.port, timeout=2)
+            conn.request('GET', '/health')
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'API server not ready after {timeout}s')
+
+
+def start_api(server, upstream_url, port):
+    """Start app.py (Flask) or asgi_app.py under uvicorn against the mock upstream"""
+    env = dict(os.environ)
+    env.update({
+        'OPENWEATHER_BASE_URL': upstream_url,
+        'OPENWEATHER_API_KEY': env.get('OPENWEATHER_API_KEY') or 'load-test',
+        'PORT': str(port),
+        'FLASK_ENV': 'production'
+    })
+    if server == 'asgi':
+        command = [sys.executable, '-m', 'uvicorn', 'asgi_app:app', '--port', str(port), '--log-level', 'warning']
+    else:
+        command = [sys.executable, 'app.py']
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def upstream_calls(mock, upstream_url):
+    """Total upstream requests so far, from the in-process mock or its /__stats"""
+    if mock is not None:
+        return mock.stats()['total_requests']
+    url = urlsplit(upstream_url)
+    try:
+        conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=5)
+        conn.request('GET', '/__stats')
+        stats = json.loads(conn.getresponse().read())
+        conn.close()
+        return stats['total_requests']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def micro_benchmarks():
+    """The WeatherCache and forecast aggregation microbenchmarks, at short settings"""
+    from benchmarks import cache_bench, forecast_bench
+    return {
+        'cache': cache_bench.run(thread_counts=(1, 4, 16), seconds=1.0),
+        'forecast_aggregation': forecast_bench.run(sizes=(40, 4000), repeat=3)
+    }
+
+
+def compare(results, baseline):
+    """Print the change in req/s and p95/p99 against a previous run"""
+    previous = {r['scenario']: r for r in baseline.get('scenarios', [])}
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'}:")
+    print(f"{'scenario':<18} {'req/s':>16} {'p95 ms':>16} {'p99 ms':>16}")
+    for r in results['scenarios']:
+        old = previous.get(r['scenario'])
+        if not old:
+            continue
+        cells = []
+        for field in ('rps', 'p95_ms', 'p99_ms'):
+            if r[field] is None or not old[field]:
+                cells.append(f"{'n/a':>16}")
+            else:
+                change = (r[field] - old[field]) / old[field] * 100
+                cells.append(f'{r[field]:>9} {change:>+5.0f}%')
+        print(f"{r['scenario']:<18} " + ' '.join(cells))
+
+
+def print_table(results):
+    print(f"{'scenario':<18} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} "
+          f"{'errors':>7} {'upstream':>9}")
+    for r in results['scenarios']:
+        print(f"{r['scenario']:<18} {r['rps']:>9} {r['p50_ms']!s:>9} {r['p95_ms']!s:>9} "
+              f"{r['p99_ms']!s:>9} {r['max_ms']!s:>9} {r['errors']:>7} {r['upstream_calls']!s:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='API load test against a mock upstream')
+    parser.add_argument('--server', choices=('flask', 'asgi'), default='flask', help='API server to start')
+    parser.add_argument('--target', help='URL of an already running API (skips starting one)')
+    parser.add_argument('--upstream', help='URL of a running mock_owm.py, e.g. http://127.0.0.1:8090/data/2.5')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma separated scenario names')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent connections')
+    parser.add_argument('--duration', type=float, default=10, help='measured seconds per scenario')
+    parser.add_argument('--warmup', type=float, default=2, help='unmeasured seconds before each scenario')
+    parser.add_argument('--latency-ms', type=float, default=50, help='in-process mock upstream latency')
+    parser.add_argument('--jitter-ms', type=float, default=20)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0, help='seed for key choice and mock jitter')
+    parser.add_argument('--micro', action='store_true', help='also run the cache and forecast microbenchmarks')
+    parser.add_argument('--output', help='write JSON results to this file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    scenarios = args.scenarios.split(',')
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    mock = None
+    upstream_url = args.upstream
+    if upstream_url is None and args.target is None:
+        mock = MockOWMServer(port=0, latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                             error_rate=args.error_rate, seed=args.seed)
+        mock.start()
+        upstream_url = mock.base_url()
+
+    process = None
+    target = args.target
+    if target is None:
+        port = free_port()
+        target = f'http://127.0.0.1:{port}'
+        process = start_api(args.server, upstream_url, port)
+
+    cities = load_cities()
+    results = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'server': 'external' if args.target else args.server,
+        'config': {
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'warmup': args.warmup,
+            'upstream_latency_ms': None if mock is None else args.latency_ms,
+            'upstream_jitter_ms': None if mock is None else args.jitter_ms,
+            'upstream_error_rate': None if mock is None else args.error_rate
+        },
+        'scenarios': []
+    }
+
+    try:
+        if process is not None:
+            wait_until_ready(target, process)
+        for scenario in scenarios:
+            before = upstream_calls(mock, upstream_url) if upstream_url else None
+            result = run_scenario(target, scenario, cities, args.concurrency, args.duration,
+                                  args.warmup, args.seed)
+            after = upstream_calls(mock, upstream_url) if upstream_url else None
+            # Includes warmup traffic: the cache fills during warmup too
+            result['upstream_calls'] = None if before is None or after is None else after - before
+            results['scenarios'].append(result)
+            if not args.json:
+                print(f"{scenario}: {result['rps']} req/s, p99 {result['p99_ms']} ms", file=sys.stderr)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+        if mock is not None:
+            mock.shutdown()
+            mock.server_close()
+
+    if args.micro:
+        results['micro'] = micro_benchmarks()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
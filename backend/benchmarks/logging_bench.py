@@ -0,0 +1,130 @@
+"""
+Logging Overhead Benchmark
+Measures what logging costs a request thread with the original synchronous
+handlers and with the queue-based pipeline from utils.setup_logging
+
+Usage: python benchmarks/logging_bench.py [--requests 20000]
+"""
+import os
+import sys
+import json
+import queue
+import time
+import logging
+import argparse
+import tempfile
+from logging.handlers import RotatingFileHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from utils import (
+    TEXT_LOG_FORMAT, BatchRotatingFileHandler, BatchStreamHandler,
+    BatchingQueueListener, JsonLineFormatter, LazyQueueHandler
+)
+
+
+def simulate_requests(logger, requests, lazy):
+    """
+    Emit the log calls of a successful /weather request, requests times
+
+    Returns:
+        Seconds spent in the calling thread
+    """
+    cities = ['London', 'Paris', 'Tokyo', 'New York', 'Sydney']
+    start = time.perf_counter()
+    for i in range(requests):
+        city = cities[i % len(cities)]
+        if lazy:
+            logger.info('Weather request for city: %s', city, extra={'city': city})
+            logger.info('Weather request successful for %s - Status: 200', city, extra={'city': city})
+        else:
+            logger.info(f'Weather request for city: {city}')
+            logger.info(f'Weather request successful for {city} - Status: 200')
+    return time.perf_counter() - start
+
+
+def run_mode(mode, requests, log_dir):
+    """
+    Run one logging configuration
+
+    Returns:
+        Result dictionary with per-request caller overhead and total time
+    """
+    logger = logging.getLogger(f'bench.{mode}')
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    console = open(os.devnull, 'w')
+    log_file = os.path.join(log_dir, f'{mode}.log')
+    formatter = JsonLineFormatter() if mode == 'async_json' else logging.Formatter(TEXT_LOG_FORMAT)
+
+    listener = None
+    if mode.startswith('sync'):
+        # The original setup: every record is formatted and flushed in the caller
+        handlers = [RotatingFileHandler(log_file, maxBytes=0, encoding='utf-8'),
+                    logging.StreamHandler(console)]
+        for handler in handlers:
+            handler.setFormatter(formatter)
+            logger.addHandler(handler)
+    else:
+        handlers = [BatchRotatingFileHandler(log_file, maxBytes=0, encoding='utf-8'),
+                    BatchStreamHandler(console)]
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        log_queue = queue.SimpleQueue()
+        listener = BatchingQueueListener(log_queue, *handlers)
+        listener.start()
+        logger.addHandler(LazyQueueHandler(log_queue))
+
+    start = time.perf_counter()
+    caller_seconds = simulate_requests(logger, requests, lazy=mode != 'sync_fstring')
+    if listener is not None:
+        # Wait until everything queued has been written
+        listener.stop()
+    total_seconds = time.perf_counter() - start
+
+    for handler in logger.handlers[:] + handlers:
+        logger.removeHandler(handler)
+        handler.close()
+    console.close()
+
+    return {
+        'mode': mode,
+        'requests': requests,
+        'caller_us_per_request': round(caller_seconds / requests * 1e6, 2),
+        'total_us_per_request': round(total_seconds / requests * 1e6, 2)
+    }
+
+
+def run(requests=20000, modes=('sync_fstring', 'sync_lazy', 'async_text', 'async_json')):
+    """
+    Run the benchmark for every logging mode
+
+    Returns:
+        List of result dictionaries
+    """
+    with tempfile.TemporaryDirectory() as log_dir:
+        return [run_mode(mode, requests, log_dir) for mode in modes]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-request logging overhead benchmark')
+    parser.add_argument('--requests', type=int, default=20000, help='simulated requests per mode')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = run(args.requests)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    baseline = results[0]['caller_us_per_request']
+    print(f"{'mode':>14} {'caller us/req':>14} {'total us/req':>13} {'caller speedup':>15}")
+    for r in results:
+        speedup = baseline / r['caller_us_per_request']
+        print(f"{r['mode']:>14} {r['caller_us_per_request']:>14} "
+              f"{r['total_us_per_request']:>13} {speedup:>14.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,433 @@
+"""
+Cache Backends Module
+Shared out-of-process cache stores so several workers reuse the same entries
+"""
+import os
+import json
+import time
+import socket
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from urllib.parse import urlparse
+
+from cache_layer import WeatherCache
+
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackendError(Exception):
+    """Raised when a shared cache store cannot be reached or rejects a command"""
+
+
+class CacheBackend:
+    """
+    Interface for shared key/value stores.
+
+    Values are strings; the backend is responsible for expiring them after
+    ttl seconds.
+    """
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """Cache stored in a local SQLite file shared by every worker on the host"""
+
+    def __init__(self, path=None):
+        default_path = Path(__file__).parent / 'cache' / 'weather_cache.sqlite3'
+        self.path = Path(path or os.getenv('CACHE_SQLITE_PATH', default_path))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+
+        try:
+            self._connection().execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+        except sqlite3.Error as e:
+            raise CacheBackendError(str(e))
+
+    def _connection(self):
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        try:
+            row = self._connection().execute(
+                'SELECT value FROM cache WHERE key = ? AND expires_at > ?', (key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            raise CacheBackendError(str(e))
+        return row[0] if row else None
+
+    def set(self, key, value, ttl):
+        try:
+            self._connection().execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, value, time.time() + ttl)
+            )
+        except sqlite3.Error as e:
+            raise CacheBackendError(str(e))
+
+    def delete(self, key):
+        try:
+            self._connection().execute('DELETE FROM cache WHERE key = ?', (key,))
+        except sqlite3.Error as e:
+            raise CacheBackendError(str(e))
+
+    def clear(self):
+        try:
+            self._connection().execute('DELETE FROM cache')
+        except sqlite3.Error as e:
+            raise CacheBackendError(str(e))
+
+    def remove_expired(self):
+        try:
+            self._connection().execute('DELETE FROM cache WHERE expires_at <= ?', (time.time(),))
+        except sqlite3.Error as e:
+            raise CacheBackendError(str(e))
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Cache stored in a Redis-protocol server (Redis, Valkey, KeyDB, ...).
+
+    Speaks RESP directly over one socket per thread, so no client library
+    is needed. Keys are namespaced with a prefix so clear() only removes
+    this service's entries.
+    """
+
+    def __init__(self, url=None, prefix='weather:', timeout=None):
+        parsed = urlparse(url or os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.prefix = prefix
+        self.timeout = timeout if timeout is not None else float(os.getenv('REDIS_TIMEOUT_SECONDS', 0.5))
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            conn = (sock, sock.makefile('rb'))
+            self._local.conn = conn
+            if self.password:
+                self._send(conn, 'AUTH', self.password)
+            if self.db:
+                self._send(conn, 'SELECT', self.db)
+        return conn
+
+    def _send(self, conn, *args):
+        parts = [str(a).encode() if not isinstance(a, bytes) else a for a in args]
+        payload = b'*%d\r\n' % len(parts) + b''.join(
+            b'$%d\r\n%s\r\n' % (len(p), p) for p in parts
+        )
+        conn[0].sendall(payload)
+        return self._read_reply(conn[1])
+
+    def _read_reply(self, reader):
+        line = reader.readline()
+        if not line:
+            raise CacheBackendError('Connection closed by server')
+        kind, rest = line[:1], line[1:-2]
+
+        if kind == b'+':
+            return rest.decode()
+        if kind == b'-':
+            raise CacheBackendError(rest.decode())
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)
+            return data[:-2].decode()
+        if kind == b'*':
+            length = int(rest)
+            if length < 0:
+                return None
+            return [self._read_reply(reader) for _ in range(length)]
+        raise CacheBackendError(f'Unexpected reply: {line!r}')
+
+    def command(self, *args):
+        """Send one command, dropping the connection if it fails"""
+        try:
+            return self._send(self._connection(), *args)
+        except (OSError, CacheBackendError) as e:
+            conn = getattr(self._local, 'conn', None)
+            if conn is not None:
+                conn[0].close()
+                self._local.conn = None
+            raise CacheBackendError(str(e))
+
+    def get(self, key):
+        return self.command('GET', self.prefix + key)
+
+    def set(self, key, value, ttl):
+        self.command('SET', self.prefix + key, value, 'PX', max(int(ttl * 1000), 1))
+
+    def delete(self, key):
+        self.command('DEL', self.prefix + key)
+
+    def clear(self):
+        cursor = '0'
+        while True:
+            cursor, keys = self.command('SCAN', cursor, 'MATCH', self.prefix + '*', 'COUNT', 500)
+            if keys:
+                self.command('DEL', *keys)
+            if cursor == '0':
+                break
+
+
+class SharedWeatherCache:
+    """
+    WeatherCache-compatible cache stored in a shared backend.
+
+    Entries are serialized as JSON together with their soft, stale and hard expiry
+    so stale-while-revalidate works across workers. Every value is also
+    written to a local WeatherCache; when the shared store errors, reads
+    and writes fall back to that local copy for CACHE_BACKEND_RETRY_SECONDS
+    before the store is tried again. Every CACHE_SWEEP_INTERVAL_SECONDS
+    expired entries are removed from both the local copy and the backend.
+    """
+
+    def __init__(self, backend, fallback=None, sweep_interval=None):
+        self.backend = backend
+        self.local = fallback or WeatherCache(sweep_interval=0)
+        self.ttl = self.local.ttl
+        self.stale_ttl = self.local.stale_ttl
+        self.stale_if_error = self.local.stale_if_error
+        self.refresher = self.local.refresher
+        self.retry_interval = float(os.getenv('CACHE_BACKEND_RETRY_SECONDS', 30))
+        self.down_until = 0
+
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.fallbacks = 0
+
+        if sweep_interval is None:
+            sweep_interval = int(os.getenv('CACHE_SWEEP_INTERVAL_SECONDS', 60))
+        self._stopped = threading.Event()
+        if sweep_interval > 0:
+            threading.Thread(
+                target=self._sweep, args=(sweep_interval,), name='cache-sweeper', daemon=True
+            ).start()
+
+    def _available(self):
+        return time.time() >= self.down_until
+
+    def _mark_down(self, error):
+        with self.lock:
+            self.errors += 1
+            self.down_until = time.time() + self.retry_interval
+        logger.warning('Shared cache unavailable, using local memory: %s', error)
+
+    def _read(self, key):
+        """Fetch and decode the stored record for key, or None"""
+        raw = self.backend.get(key)
+        if raw is None:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+    def get(self, key, refresh=None):
+        """
+        Get a cached value
+
+        Args:
+            key: Cache key
+            refresh: Optional callable that re-fetches and re-caches the key
+
+        Returns:
+            Cached value or None
+        """
+        if not self._available():
+            with self.lock:
+                self.fallbacks += 1
+            return self.local.get(key, refresh)
+
+        try:
+            record = self._read(key)
+        except CacheBackendError as e:
+            self._mark_down(e)
+            return self.local.get(key, refresh)
+
+        if record is None:
+            with self.lock:
+                self.misses += 1
+            return None
+
+        current_time = time.time()
+        if current_time < record['soft_expiry']:
+            with self.lock:
+                self.hits += 1
+            return record['value']
+
+        # Past soft expiry: serve stale only while revalidating
+        stale_expiry = record.get('stale_expiry', record['hard_expiry'])
+        if refresh is None or current_time >= stale_expiry:
+            with self.lock:
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.stale_hits += 1
+        self.refresher.schedule(key, refresh)
+        return record['value']
+
+    def get_stale(self, key):
+        """
+        Get a value within its hard TTL even if it has expired
+
+        Returns:
+            Cached value or None
+        """
+        if self._available():
+            try:
+                record = self._read(key)
+            except CacheBackendError as e:
+                self._mark_down(e)
+            else:
+                if record is not None and time.time() < record['hard_expiry']:
+                    return record['value']
+        return self.local.get_stale(key)
+
+    def expires_at(self, key):
+        """
+        Soft expiry time of the shared entry for key, without counting a lookup
+
+        Returns:
+            Epoch seconds, or None if key is not cached
+        """
+        if self._available():
+            try:
+                record = self._read(key)
+            except CacheBackendError as e:
+                self._mark_down(e)
+            else:
+                return None if record is None else record['soft_expiry']
+        return self.local.expires_at(key)
+
+    def rendered(self, key, value, render, variant=None):
+        """
+        Get the serialized response for a value
+
+        Renderings are kept with the local copy of the entry; a value read
+        from the shared store matches it as long as both hold the same data.
+        """
+        return self.local.rendered(key, value, render, variant)
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        if not self._available():
+            return
+
+        soft_expiry = time.time() + self.ttl
+        retain = max(self.stale_ttl, self.stale_if_error)
+        record = json.dumps({
+            'value': value,
+            'soft_expiry': soft_expiry,
+            'stale_expiry': soft_expiry + self.stale_ttl,
+            'hard_expiry': soft_expiry + retain
+        })
+        try:
+            self.backend.set(key, record, self.ttl + retain)
+        except CacheBackendError as e:
+            self._mark_down(e)
+
+    def export(self):
+        """The local copy's entries; the shared store outlives restarts itself"""
+        return self.local.export()
+
+    def restore(self, entries):
+        return self.local.restore(entries)
+
+    def clear(self):
+        """Clear all cache entries"""
+        self.local.clear()
+        try:
+            self.backend.clear()
+        except CacheBackendError as e:
+            self._mark_down(e)
+
+    def remove_expired(self):
+        self.local.remove_expired()
+        if hasattr(self.backend, 'remove_expired') and self._available():
+            try:
+                self.backend.remove_expired()
+            except CacheBackendError as e:
+                self._mark_down(e)
+
+    def stats(self):
+        """
+        Get shared cache statistics
+
+        Returns:
+            Dictionary with shared-store counters and the local fallback stats
+        """
+        with self.lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'backend': type(self.backend).__name__,
+                'available': self._available(),
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'hit_ratio': round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+                'errors': self.errors,
+                'fallback_reads': self.fallbacks,
+                'local': self.local.stats()
+            }
+
+    def close(self):
+        """Stop the background sweeper"""
+        self._stopped.set()
+        self.local.close()
+
+    def _sweep(self, interval):
+        while not self._stopped.wait(interval):
+            self.remove_expired()
+
+
+def create_backend(name):
+    """
+    Create a shared cache backend by name
+
+    Args:
+        name: 'sqlite' or 'redis'
+
+    Returns:
+        CacheBackend instance
+    """
+    if name == 'sqlite':
+        return SQLiteCacheBackend()
+    if name == 'redis':
+        return RedisCacheBackend()
+    raise ValueError(f'Unknown cache backend: {name}')
@@ -3,51 +3,646 @@ Cache Layer Module
 Simple in-memory caching with TTL support
 """
 import os
+import json
 import time
-from threading import Lock
+import queue
+import logging
+from collections import OrderedDict
+from threading import Event, Lock, Thread
+
+
+logger = logging.getLogger(__name__)
+
+
+class _CacheEntry:
+    """
+    Cached value with its soft (fresh), stale and hard expiry times, and
+    the value's serialized HTTP response once one has been rendered
+    """
+
+    __slots__ = ('value', 'soft_expiry', 'stale_expiry', 'hard_expiry', 'hits', 'freq', 'size', 'rendered')
+
+    def __init__(self, value, soft_expiry, stale_expiry, hard_expiry, size):
+        self.value = value
+        self.soft_expiry = soft_expiry
+        self.stale_expiry = stale_expiry
+        self.hard_expiry = hard_expiry
+        self.size = size
+        self.hits = 0
+        self.freq = 1
+        self.rendered = None  # (variant, RenderedResponse)
+
+
+class BackgroundRefresher:
+    """
+    Runs cache refresh callbacks on daemon worker threads.
+
+    A key that is already queued or being refreshed is not queued again.
+    """
+
+    def __init__(self, workers=None):
+        self.queue = queue.Queue()
+        self.pending = set()
+        self.lock = Lock()
+        self.refreshed = 0
+        self.failed = 0
+        self.workers = workers or int(os.getenv('CACHE_REFRESH_WORKERS', 2))
+        self.started = False
+
+    def schedule(self, key, refresh):
+        """Queue refresh() for key unless a refresh is already pending"""
+        with self.lock:
+            if key in self.pending:
+                return False
+            self.pending.add(key)
+
+            # Worker threads are only started once something needs refreshing
+            if not self.started:
+                for i in range(self.workers):
+                    Thread(target=self._run, name=f'cache-refresh-{i}', daemon=True).start()
+                self.started = True
+        self.queue.put((key, refresh))
+        return True
+
+    def _run(self):
+        while True:
+            key, refresh = self.queue.get()
+            try:
+                refresh()
+                self.refreshed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.warning('Background refresh failed for %s: %s', key, e)
+            finally:
+                with self.lock:
+                    self.pending.discard(key)
+
+
+def estimate_size(value):
+    """Approximate the memory cost of a cached value by its JSON length"""
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return len(repr(value))
 
 
 class WeatherCache:
+    """
+    Bounded in-memory TTL cache with optional stale-while-revalidate.
 
-    
-    def __init__(self):
+    Entries are fresh for CACHE_TTL_SECONDS (the soft TTL). For a further
+    CACHE_STALE_TTL_SECONDS they are still returned to callers that pass a
+    refresh callback, while the key is refreshed in the background. Expired
+    entries are kept for CACHE_STALE_IF_ERROR_SECONDS past the soft TTL (the
+    hard TTL) so get_stale() can serve them while the upstream is down.
+    Hot keys (at least CACHE_HOT_THRESHOLD hits) are refreshed
+    ahead of time once they are within CACHE_REFRESH_AHEAD_SECONDS of
+    their soft expiry.
 
-        self.cache = {}
+    The cache holds at most CACHE_MAX_ENTRIES entries and roughly
+    CACHE_MAX_BYTES of serialized data, evicting by CACHE_EVICTION_POLICY
+    ('lru' or 'lfu'). Entries past their hard TTL are swept every
+    CACHE_SWEEP_INTERVAL_SECONDS.
+    """
+
+    POLICIES = ('lru', 'lfu')
+
+    def __init__(self, max_entries=None, max_bytes=None, policy=None, sweep_interval=None):
+
+        self.cache = OrderedDict()
         self.lock = Lock()
         self.ttl = int(os.getenv('CACHE_TTL_SECONDS', 600))  # Default 10 minutes
-    
-    def get(self, key):
-        with self.lock:
-            if key in self.cache:
-                value, expiry_time = self.cache[key]
-                
-                # Check if expired
-                if time.time() < expiry_time:
-                    return value
-                else:
-                    # Remove expired entry
-                    del self.cache[key]
-            
-            return None
-    
+        self.stale_ttl = int(os.getenv('CACHE_STALE_TTL_SECONDS', 0))
+        self.stale_if_error = int(os.getenv('CACHE_STALE_IF_ERROR_SECONDS', 3600))
+        self.refresh_ahead = int(os.getenv('CACHE_REFRESH_AHEAD_SECONDS', 0))
+        self.hot_threshold = int(os.getenv('CACHE_HOT_THRESHOLD', 5))
+        self.refresher = BackgroundRefresher()
+
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('CACHE_MAX_ENTRIES', 1000))
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv('CACHE_MAX_BYTES', 50 * 1024 * 1024))
+        self.policy = (policy or os.getenv('CACHE_EVICTION_POLICY', 'lru')).lower()
+        if self.policy not in self.POLICIES:
+            raise ValueError(f'Unknown cache eviction policy: {self.policy}')
+
+        # LFU bookkeeping: frequency -> keys in least-recently-used order
+        self.freq_buckets = {}
+        self.min_freq = 0
+
+        self.bytes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.stale_if_error_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.renders = 0
+        self.render_hits = 0
+
+        if sweep_interval is None:
+            sweep_interval = int(os.getenv('CACHE_SWEEP_INTERVAL_SECONDS', 60))
+        self._stopped = Event()
+        if sweep_interval > 0:
+            Thread(
+                target=self._sweep, args=(sweep_interval,), name='cache-sweeper', daemon=True
+            ).start()
+
+    def get(self, key, refresh=None):
+        """
+        Get a cached value
+
+        Args:
+            key: Cache key
+            refresh: Optional callable that re-fetches and re-caches the key.
+                Without it, stale entries are treated as misses.
+
+        Returns:
+            Cached value or None
+        """
+        schedule = False
+
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            current_time = time.time()
+
+            # Past the hard TTL the entry is unusable
+            if current_time >= entry.hard_expiry:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            if current_time >= entry.soft_expiry:
+                # Stale: serve it only if we can revalidate in the background
+                if refresh is None or current_time >= entry.stale_expiry:
+                    self.misses += 1
+                    return None
+                self.stale_hits += 1
+                schedule = True
+            else:
+                self.hits += 1
+                entry.hits += 1
+                schedule = (
+                    refresh is not None
+                    and self.refresh_ahead > 0
+                    and entry.hits >= self.hot_threshold
+                    and entry.soft_expiry - current_time <= self.refresh_ahead
+                )
+
+            self._touch(key, entry)
+            value = entry.value
+
+        if schedule:
+            self._schedule_refresh(key, refresh)
+
+        return value
+
+    def get_stale(self, key):
+        """
+        Get a cached value even if it has expired, as long as it is within
+        its hard TTL. Used when the upstream cannot be reached.
+
+        Returns:
+            Cached value or None
+        """
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is None or time.time() >= entry.hard_expiry:
+                return None
+            self.stale_if_error_hits += 1
+            return entry.value
+
+    def expires_at(self, key):
+        """
+        Soft expiry time of key's entry, without counting a lookup
+
+        Returns:
+            Epoch seconds, or None if key is not cached
+        """
+        with self.lock:
+            entry = self.cache.get(key)
+            return None if entry is None else entry.soft_expiry
+
+    def rendered(self, key, value, render, variant=None):
+        """
+        Get the serialized response for a value read from the cache
+
+        The response is rendered once per entry and stored with it, so
+        repeat requests skip serialization and compression entirely.
+        Values that are not the current entry for key (stale fallbacks,
+        derived data) are rendered every time and expire immediately.
+
+        Args:
+            key: Cache key the value was read from
+            value: The value to send
+            render: Callable (value, expires) -> response, e.g.
+                http_cache.render_json
+            variant: Anything else the response depends on; a stored
+                rendering for a different variant is replaced
+
+        Returns:
+            The rendered response
+        """
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is not None and (entry.value is value or entry.value == value):
+                if entry.rendered is not None and entry.rendered[0] == variant:
+                    self.render_hits += 1
+                    return entry.rendered[1]
+                expires = entry.soft_expiry
+            else:
+                entry = None
+                expires = time.time()
+            self.renders += 1
+
+        response = render(value, expires)
+
+        if entry is not None:
+            with self.lock:
+                # Only keep it if the entry was not replaced meanwhile
+                if self.cache.get(key) is entry:
+                    if entry.rendered is not None:
+                        entry.size -= entry.rendered[1].size
+                        self.bytes -= entry.rendered[1].size
+                    entry.rendered = (variant, response)
+                    entry.size += response.size
+                    self.bytes += response.size
+        return response
+
     def set(self, key, value):
 
+        size = estimate_size(value)
+
+        with self.lock:
+            # Values that can never fit are not cached at all
+            if self.max_bytes and size > self.max_bytes:
+                return
+
+            freq = 1
+            previous = self.cache.get(key)
+            if previous is not None:
+                # Refreshing a key keeps its access frequency
+                freq = previous.freq
+                self._remove(key)
+
+            soft_expiry = time.time() + self.ttl
+            entry = _CacheEntry(
+                value, soft_expiry, soft_expiry + self.stale_ttl,
+                soft_expiry + max(self.stale_ttl, self.stale_if_error), size
+            )
+            entry.freq = freq
+
+            self._make_room(size)
+            self._insert(key, entry)
+
+    def export(self):
+        """
+        Entries that are still within their hard TTL, for a snapshot
+
+        Returns:
+            List of (key, value, soft_expiry, stale_expiry, hard_expiry),
+            least recently (or least frequently) used first
+        """
         with self.lock:
-            expiry_time = time.time() + self.ttl
-            self.cache[key] = (value, expiry_time)
-    
+            current_time = time.time()
+            if self.policy == 'lfu':
+                keys = [key for freq in sorted(self.freq_buckets) for key in self.freq_buckets[freq]]
+            else:
+                keys = list(self.cache)
+            return [
+                (key, entry.value, entry.soft_expiry, entry.stale_expiry, entry.hard_expiry)
+                for key, entry in ((key, self.cache[key]) for key in keys)
+                if current_time < entry.hard_expiry
+            ]
+
+    def restore(self, entries):
+        """
+        Load entries produced by export(), keeping their original expiry
+
+        Entries past their hard TTL and keys already cached (which are
+        newer) are skipped. Later entries count as more recently used.
+
+        Returns:
+            Number of entries restored
+        """
+        restored = 0
+        current_time = time.time()
+        for key, value, soft_expiry, stale_expiry, hard_expiry in entries:
+            if current_time >= hard_expiry:
+                continue
+            size = estimate_size(value)
+            with self.lock:
+                if key in self.cache or (self.max_bytes and size > self.max_bytes):
+                    continue
+                self._make_room(size)
+                self._insert(key, _CacheEntry(value, soft_expiry, stale_expiry, hard_expiry, size))
+            restored += 1
+        return restored
+
     def clear(self):
         """Clear all cache entries"""
         with self.lock:
             self.cache.clear()
-    
+            self.freq_buckets.clear()
+            self.min_freq = 0
+            self.bytes = 0
+
     def remove_expired(self):
         with self.lock:
             current_time = time.time()
             expired_keys = [
-                key for key, (_, expiry) in self.cache.items()
-                if current_time >= expiry
+                key for key, entry in self.cache.items()
+                if current_time >= entry.hard_expiry
             ]
-            
+
             for key in expired_keys:
-                del self.cache[key]
+                self._remove(key)
+            self.expirations += len(expired_keys)
+
+    def stats(self):
+        """
+        Get cache statistics
+
+        Returns:
+            Dictionary with hit/miss/eviction counters and current size
+        """
+        with self.lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            stats = {
+                'policy': self.policy,
+                'entries': len(self.cache),
+                'bytes': self.bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'stale_if_error_hits': self.stale_if_error_hits,
+                'misses': self.misses,
+                'hit_ratio': round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'renders': self.renders,
+                'render_hits': self.render_hits
+            }
+
+        stats['refreshed'] = self.refresher.refreshed
+        stats['refresh_failed'] = self.refresher.failed
+
+        return stats
+
+    def close(self):
+        """Stop the background sweeper"""
+        self._stopped.set()
+
+    def _sweep(self, interval):
+        while not self._stopped.wait(interval):
+            self.remove_expired()
+
+    def _insert(self, key, entry):
+        self.cache[key] = entry
+        self.bytes += entry.size
+        if self.policy == 'lfu':
+            self.freq_buckets.setdefault(entry.freq, OrderedDict())[key] = None
+            if not self.min_freq or entry.freq < self.min_freq:
+                self.min_freq = entry.freq
+
+    def _remove(self, key):
+        entry = self.cache.pop(key)
+        self.bytes -= entry.size
+        if self.policy == 'lfu':
+            bucket = self.freq_buckets[entry.freq]
+            del bucket[key]
+            if not bucket:
+                del self.freq_buckets[entry.freq]
+        return entry
+
+    def _make_room(self, size):
+        """Evict entries until one more of 'size' bytes fits"""
+        while self.cache and (
+            (self.max_entries and len(self.cache) >= self.max_entries)
+            or (self.max_bytes and self.bytes + size > self.max_bytes)
+        ):
+            self._remove(self._victim())
+            self.evictions += 1
+
+    def _touch(self, key, entry):
+        """Record an access for the eviction policy"""
+        if self.policy == 'lru':
+            self.cache.move_to_end(key)
+            return
+
+        bucket = self.freq_buckets[entry.freq]
+        del bucket[key]
+        if not bucket:
+            del self.freq_buckets[entry.freq]
+            if self.min_freq == entry.freq:
+                self.min_freq = entry.freq + 1
+        entry.freq += 1
+        self.freq_buckets.setdefault(entry.freq, OrderedDict())[key] = None
+
+    def _victim(self):
+        """Pick the key to evict under the configured policy"""
+        if self.policy == 'lru':
+            return next(iter(self.cache))
+
+        if self.min_freq not in self.freq_buckets:
+            self.min_freq = min(self.freq_buckets)
+        return next(iter(self.freq_buckets[self.min_freq]))
+
+    def _schedule_refresh(self, key, refresh):
+        """Hand a refresh to the background worker"""
+        self.refresher.schedule(key, refresh)
+
+
+class ShardedWeatherCache:
+    """
+    Lock-striped cache with the same API as WeatherCache.
+
+    Keys are hashed onto CACHE_SHARDS independent WeatherCache shards, each
+    with its own lock, so concurrent requests for different cities rarely
+    contend. Capacity limits are split evenly across shards; the background
+    refresher and the expiry sweeper are shared.
+    """
+
+    def __init__(self, shards=None, max_entries=None, max_bytes=None, policy=None, sweep_interval=None):
+        shard_count = shards or int(os.getenv('CACHE_SHARDS', 16))
+        if max_entries is None:
+            max_entries = int(os.getenv('CACHE_MAX_ENTRIES', 1000))
+        if max_bytes is None:
+            max_bytes = int(os.getenv('CACHE_MAX_BYTES', 50 * 1024 * 1024))
+
+        self.refresher = BackgroundRefresher()
+        self.shards = []
+        for _ in range(shard_count):
+            shard = WeatherCache(
+                max_entries=-(-max_entries // shard_count),
+                max_bytes=-(-max_bytes // shard_count),
+                policy=policy,
+                sweep_interval=0
+            )
+            shard.refresher = self.refresher
+            self.shards.append(shard)
+
+        self.ttl = self.shards[0].ttl
+        self.stale_ttl = self.shards[0].stale_ttl
+        self.stale_if_error = self.shards[0].stale_if_error
+
+        if sweep_interval is None:
+            sweep_interval = int(os.getenv('CACHE_SWEEP_INTERVAL_SECONDS', 60))
+        self._stopped = Event()
+        if sweep_interval > 0:
+            Thread(
+                target=self._sweep, args=(sweep_interval,), name='cache-sweeper', daemon=True
+            ).start()
+
+    def _shard(self, key):
+        return self.shards[hash(key) % len(self.shards)]
+
+    def get(self, key, refresh=None):
+        return self._shard(key).get(key, refresh)
+
+    def get_stale(self, key):
+        return self._shard(key).get_stale(key)
+
+    def expires_at(self, key):
+        return self._shard(key).expires_at(key)
+
+    def rendered(self, key, value, render, variant=None):
+        return self._shard(key).rendered(key, value, render, variant)
+
+    def set(self, key, value):
+        self._shard(key).set(key, value)
+
+    def export(self):
+        """Entries within their hard TTL from every shard, see WeatherCache.export"""
+        return [entry for shard in self.shards for entry in shard.export()]
+
+    def restore(self, entries):
+        """
+        Load exported entries into their shards
+
+        Returns:
+            Number of entries restored
+        """
+        # Re-sharded here: str hashes differ between processes
+        shard_entries = [[] for _ in self.shards]
+        for entry in entries:
+            shard_entries[hash(entry[0]) % len(self.shards)].append(entry)
+        return sum(shard.restore(chunk) for shard, chunk in zip(self.shards, shard_entries))
+
+    def clear(self):
+        """Clear all cache entries"""
+        for shard in self.shards:
+            shard.clear()
+
+    def remove_expired(self):
+        # Each shard is scanned under its own lock, one at a time
+        for shard in self.shards:
+            shard.remove_expired()
+
+    def stats(self):
+        """
+        Get cache statistics summed over all shards
+
+        Returns:
+            Dictionary with hit/miss/eviction counters and current size
+        """
+        shard_stats = [shard.stats() for shard in self.shards]
+        stats = {'policy': shard_stats[0]['policy'], 'shards': len(self.shards)}
+
+        for field in ('entries', 'bytes', 'max_entries', 'max_bytes', 'hits', 'stale_hits',
+                      'stale_if_error_hits', 'misses', 'evictions', 'expirations', 'renders', 'render_hits'):
+            stats[field] = sum(s[field] for s in shard_stats)
+
+        lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+        stats['hit_ratio'] = round((stats['hits'] + stats['stale_hits']) / lookups, 4) if lookups else 0.0
+        stats['refreshed'] = self.refresher.refreshed
+        stats['refresh_failed'] = self.refresher.failed
+        return stats
+
+    def close(self):
+        """Stop the background sweeper"""
+        self._stopped.set()
+
+    def _sweep(self, interval):
+        while not self._stopped.wait(interval):
+            self.remove_expired()
+
+
+class NegativeCache:
+    """
+    Remembers lookups that failed permanently (e.g. 404 city not found).
+
+    Entries expire after CITY_NEGATIVE_TTL_SECONDS; the oldest entries are
+    dropped beyond max_entries so a flood of bad names cannot grow it
+    without bound.
+    """
+
+    def __init__(self, ttl=None, max_entries=10000):
+        self.ttl = ttl if ttl is not None else int(os.getenv('CITY_NEGATIVE_TTL_SECONDS', 300))
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+
+    def add(self, key):
+        with self.lock:
+            self.entries[key] = time.time() + self.ttl
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def __contains__(self, key):
+        with self.lock:
+            expiry = self.entries.get(key)
+            if expiry is None:
+                return False
+            if time.time() >= expiry:
+                del self.entries[key]
+                return False
+            self.hits += 1
+            return True
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'hits': self.hits}
+
+
+def create_cache():
+    """
+    Create the cache configured by the environment
+
+    CACHE_BACKEND selects 'memory' (default), 'sqlite' or 'redis'. Shared
+    backends keep an in-process cache as their fallback.
+
+    Returns:
+        ShardedWeatherCache when CACHE_SHARDS > 1, otherwise WeatherCache,
+        wrapped in SharedWeatherCache for shared backends
+    """
+    backend_name = os.getenv('CACHE_BACKEND', 'memory').lower()
+    if backend_name != 'memory':
+        # Imported here because cache_backends builds on this module
+        from cache_backends import CacheBackendError, SharedWeatherCache, create_backend
+
+        try:
+            backend = create_backend(backend_name)
+        except (CacheBackendError, OSError) as e:
+            logger.warning('Shared cache backend %s unavailable, using memory: %s', backend_name, e)
+        else:
+            # The shared cache sweeps its local copy together with the backend
+            return SharedWeatherCache(backend, fallback=_create_local_cache(sweep_interval=0))
+
+    return _create_local_cache()
+
+
+def _create_local_cache(sweep_interval=None):
+    if int(os.getenv('CACHE_SHARDS', 1)) > 1:
+        return ShardedWeatherCache(sweep_interval=sweep_interval)
+    return WeatherCache(sweep_interval=sweep_interval)
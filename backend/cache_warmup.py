@@ -0,0 +1,219 @@
+"""
+Cache Warm-up Module
+Cache snapshots that survive restarts, and preloading of popular cities
+before the service reports ready
+"""
+import os
+import gzip
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+
+from group_fetch import GroupFetcher
+from rate_limit import TokenBucket
+
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+
+class CacheSnapshot:
+    """
+    Saves a cache's entries to a gzipped JSON file and loads them back.
+
+    Entries keep their original expiry times, so a snapshot older than the
+    hard TTL restores nothing. The file is written every
+    CACHE_SNAPSHOT_INTERVAL_SECONDS and on shutdown, through a temporary
+    file so a crash mid-write leaves the previous snapshot intact. Its size
+    is bounded by the cache's own limits, not by traffic.
+    """
+
+    def __init__(self, cache, path=None, interval=None):
+        default_path = Path(__file__).parent / 'cache' / 'weather_cache_snapshot.json.gz'
+        self.cache = cache
+        self.path = Path(path or os.getenv('CACHE_SNAPSHOT_PATH', default_path))
+        if interval is None:
+            interval = float(os.getenv('CACHE_SNAPSHOT_INTERVAL_SECONDS', 300))
+        self.interval = interval
+        self.lock = threading.Lock()
+        self._stopped = threading.Event()
+
+        self.restored = 0
+        self.saved = 0
+        self.saved_at = None
+        self.failed = 0
+
+    def save(self):
+        """
+        Write the cache's current entries to the snapshot file
+
+        Returns:
+            Number of entries written, or None if writing failed
+        """
+        entries = self.cache.export()
+        saved_at = time.time()
+
+        # One writer at a time; each process writes its own temporary file
+        with self.lock:
+            tmp_path = self.path.with_name(f'{self.path.name}.{os.getpid()}.tmp')
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=1) as f:
+                    json.dump({'version': SNAPSHOT_VERSION, 'saved_at': saved_at, 'entries': entries},
+                              f, separators=(',', ':'))
+                os.replace(tmp_path, self.path)
+            except (OSError, TypeError, ValueError) as e:
+                self.failed += 1
+                logger.warning('Could not save cache snapshot to %s: %s', self.path, e)
+                return None
+            self.saved = len(entries)
+            self.saved_at = saved_at
+        return len(entries)
+
+    def load(self):
+        """
+        Restore unexpired entries from the snapshot file
+
+        A missing, unreadable or incompatible snapshot restores nothing.
+
+        Returns:
+            Number of entries restored
+        """
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except (OSError, EOFError, ValueError) as e:
+            logger.warning('Ignoring unreadable cache snapshot %s: %s', self.path, e)
+            return 0
+
+        if not isinstance(snapshot, dict) or snapshot.get('version') != SNAPSHOT_VERSION:
+            logger.warning('Ignoring cache snapshot %s with an unknown format', self.path)
+            return 0
+
+        try:
+            self.restored = self.cache.restore(snapshot.get('entries', []))
+        except (TypeError, ValueError) as e:
+            logger.warning('Ignoring malformed cache snapshot %s: %s', self.path, e)
+            return 0
+
+        logger.info('Restored %d cache entries from %s', self.restored, self.path)
+        return self.restored
+
+    def start(self):
+        """Save periodically on a daemon thread"""
+        if self.interval > 0:
+            threading.Thread(target=self._run, name='cache-snapshot', daemon=True).start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.save()
+
+    def close(self):
+        """Stop periodic saves and write a final snapshot"""
+        self._stopped.set()
+        return self.save()
+
+    def stats(self):
+        return {
+            'path': str(self.path),
+            'restored': self.restored,
+            'saved': self.saved,
+            'saved_at': self.saved_at,
+            'failed': self.failed
+        }
+
+
+def configured_cities(city_index):
+    """
+    Cities to preload: CACHE_PRELOAD_CITIES (comma separated), otherwise
+    the first CACHE_PRELOAD_TOP_N cities of the dataset
+
+    Returns:
+        List of city names
+    """
+    names = [name.strip() for name in os.getenv('CACHE_PRELOAD_CITIES', '').split(',') if name.strip()]
+    if names:
+        return names
+    return [city.query for city in city_index.top(int(os.getenv('CACHE_PRELOAD_TOP_N', 0)))]
+
+
+class CachePreloader:
+    """
+    Fetches a list of cities into the cache on a background thread.
+
+    Upstream calls are limited to CACHE_PRELOAD_CALLS_PER_MINUTE, separate
+    from user traffic, with at most CACHE_PRELOAD_CONCURRENCY in flight.
+    Current conditions go through a GroupFetcher that shares the service's
+    city ID map, so cities seen before a restart are fetched 20 per /group
+    call. The service counts as ready once the preload finishes or after
+    CACHE_PRELOAD_TIMEOUT_SECONDS, whichever comes first.
+    """
+
+    def __init__(self, service, cities=None, calls_per_minute=None, concurrency=None,
+                 forecasts=None, timeout=None):
+        self.service = service
+        self.cities = cities if cities is not None else configured_cities(service.cities)
+        if calls_per_minute is None:
+            calls_per_minute = float(os.getenv('CACHE_PRELOAD_CALLS_PER_MINUTE', 60))
+        self.rate_limiter = TokenBucket.per_minute(
+            calls_per_minute, float(os.getenv('CACHE_PRELOAD_BURST', 5))
+        )
+        self.fetcher = GroupFetcher(
+            service.client, service.api_key, service.base_url,
+            id_map=service.group_fetcher.id_map,
+            rate_limiter=self.rate_limiter,
+            workers=concurrency or int(os.getenv('CACHE_PRELOAD_CONCURRENCY', 4))
+        )
+        if forecasts is None:
+            forecasts = os.getenv('CACHE_PRELOAD_FORECASTS', 'false').lower() in ('1', 'true', 'yes')
+        self.forecasts = forecasts
+        self.timeout = timeout if timeout is not None else float(os.getenv('CACHE_PRELOAD_TIMEOUT_SECONDS', 60))
+
+        self.done = threading.Event()
+        self.started = None
+        self.duration = None
+        self.result = {}
+
+    def start(self):
+        """Preload on a daemon thread; returns immediately"""
+        self.started = time.monotonic()
+        if not self.cities:
+            self.done.set()
+            return
+        threading.Thread(target=self._run, name='cache-preload', daemon=True).start()
+
+    def _run(self):
+        try:
+            self.result = self.service.preload(
+                self.cities, self.fetcher, rate_limiter=self.rate_limiter, forecasts=self.forecasts
+            )
+            logger.info('Preloaded %d of %d cities (%d already cached, %d failed)',
+                        self.result['loaded'], len(self.cities), self.result['cached'], self.result['failed'])
+        except Exception as e:
+            logger.warning('Cache preload failed: %s', e)
+        finally:
+            self.duration = time.monotonic() - self.started
+            self.done.set()
+
+    def ready(self):
+        """Whether requests should be sent to this instance yet"""
+        if self.done.is_set():
+            return True
+        return self.started is not None and time.monotonic() - self.started >= self.timeout
+
+    def stats(self):
+        return {
+            'cities': len(self.cities),
+            'done': self.done.is_set(),
+            'duration': None if self.duration is None else round(self.duration, 3),
+            'loaded': self.result.get('loaded', 0),
+            'cached': self.result.get('cached', 0),
+            'failed': self.result.get('failed', 0),
+            'group': self.fetcher.stats(),
+            'rate_limit_wait_seconds': round(self.rate_limiter.waited, 2)
+        }
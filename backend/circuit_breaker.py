@@ -0,0 +1,162 @@
+"""
+Circuit Breaker Module
+Fails fast while OpenWeatherMap is erroring instead of letting every request
+wait out timeouts and retries
+"""
+import os
+import time
+import logging
+from collections import deque
+from threading import Lock
+
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the upstream while the circuit is open"""
+
+    def __init__(self, name, retry_in):
+        super().__init__(f'{name} circuit open, retrying in {retry_in:.0f}s')
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open circuit breaker over a rolling window.
+
+    While closed, call outcomes from the last BREAKER_WINDOW_SECONDS are
+    kept. Once there are at least BREAKER_MIN_CALLS of them and the failed
+    share reaches BREAKER_FAILURE_RATIO, the circuit opens and calls are
+    rejected for BREAKER_OPEN_SECONDS. It then goes half-open and lets up
+    to BREAKER_HALF_OPEN_CALLS probe calls through: once that many succeed
+    it closes again, and any failed probe reopens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_ratio=None, min_calls=None, window=None,
+                 open_seconds=None, half_open_calls=None):
+        self.name = name
+        self.failure_ratio = failure_ratio or float(os.getenv('BREAKER_FAILURE_RATIO', 0.5))
+        self.min_calls = min_calls or int(os.getenv('BREAKER_MIN_CALLS', 10))
+        self.window = window or float(os.getenv('BREAKER_WINDOW_SECONDS', 30))
+        self.open_seconds = open_seconds or float(os.getenv('BREAKER_OPEN_SECONDS', 30))
+        self.half_open_calls = half_open_calls or int(os.getenv('BREAKER_HALF_OPEN_CALLS', 1))
+
+        self.lock = Lock()
+        self.state = self.CLOSED
+        self.calls = deque()  # (time, failed) within the window
+        self.failures = 0
+        self.opened_at = 0
+        self.probes = 0
+        self.probe_successes = 0
+
+        self.rejected = 0
+        self.times_opened = 0
+
+    def before_call(self):
+        """
+        Check that a call may go upstream
+
+        Returns:
+            True if the call is a half-open probe; pass it back to record()
+
+        Raises:
+            CircuitOpenError while the circuit is open, or half-open with
+            all probe slots taken
+        """
+        with self.lock:
+            now = time.monotonic()
+            if self.state == self.OPEN:
+                retry_in = self.opened_at + self.open_seconds - now
+                if retry_in > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, retry_in)
+                self.state = self.HALF_OPEN
+                self.probes = 0
+                self.probe_successes = 0
+                logger.info('%s circuit half-open, probing', self.name)
+
+            if self.state == self.HALF_OPEN:
+                if self.probes + self.probe_successes >= self.half_open_calls:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, 0)
+                self.probes += 1
+                return True
+            return False
+
+    def record(self, failed, probe=False):
+        """
+        Record the outcome of a call let through by before_call()
+
+        Args:
+            failed: Whether the upstream failed (network error, 5xx, 429)
+            probe: Value before_call() returned for this call
+        """
+        with self.lock:
+            now = time.monotonic()
+            if probe:
+                if self.state != self.HALF_OPEN:
+                    return
+                self.probes -= 1
+                if failed:
+                    self._open(now)
+                else:
+                    self.probe_successes += 1
+                    if self.probe_successes >= self.half_open_calls:
+                        self._close()
+                return
+
+            # Calls that started before the circuit opened do not count
+            if self.state != self.CLOSED:
+                return
+
+            self.calls.append((now, failed))
+            self.failures += failed
+            while self.calls and self.calls[0][0] <= now - self.window:
+                self.failures -= self.calls.popleft()[1]
+
+            if len(self.calls) >= self.min_calls and self.failures >= self.failure_ratio * len(self.calls):
+                self._open(now)
+
+    def _open(self, now):
+        if self.state == self.CLOSED:
+            logger.warning('%s circuit opened: %d of %d recent calls failed',
+                           self.name, self.failures, len(self.calls))
+        else:
+            logger.warning('%s circuit reopened: probe failed', self.name)
+        self.state = self.OPEN
+        self.opened_at = now
+        self.times_opened += 1
+        self.calls.clear()
+        self.failures = 0
+
+    def _close(self):
+        logger.info('%s circuit closed', self.name)
+        self.state = self.CLOSED
+        self.calls.clear()
+        self.failures = 0
+
+    def stats(self):
+        """
+        Get breaker state
+
+        Returns:
+            Dictionary with the state, recent call/failure counts, seconds
+            until the next probe and rejection counters
+        """
+        with self.lock:
+            retry_in = 0.0
+            if self.state == self.OPEN:
+                retry_in = max(0.0, self.opened_at + self.open_seconds - time.monotonic())
+            return {
+                'state': self.state,
+                'window_calls': len(self.calls),
+                'window_failures': self.failures,
+                'retry_in': round(retry_in, 1),
+                'rejected': self.rejected,
+                'times_opened': self.times_opened
+            }
@@ -0,0 +1,222 @@
+"""
+City Index Module
+Resolves free-text city input to canonical cities and serves prefix
+autocomplete from a local SQLite index built from the bundled dataset
+"""
+import os
+import re
+import csv
+import sqlite3
+import logging
+import threading
+import unicodedata
+from collections import namedtuple
+from pathlib import Path
+
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).parent / 'data'
+
+
+def normalize_name(text):
+    """
+    Fold case, accents, punctuation and whitespace
+
+    'São Paulo' -> 'sao paulo', ' Tel-Aviv ' -> 'tel aviv'
+    """
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text.lower()).split())
+
+
+def fallback_key(text):
+    """Cache key for input that is not in the index: 'Foo Bar,XX' -> 'foo-bar-xx'"""
+    return '-'.join(normalize_name(text).split())
+
+
+class City(namedtuple('City', 'key name country country_code region')):
+    """A canonical city; 'key' (e.g. 'london-gb') is what the cache uses"""
+
+    __slots__ = ()
+
+    @property
+    def query(self):
+        """OpenWeatherMap q= value"""
+        return f'{self.name},{self.country_code}'
+
+    def to_dict(self):
+        return dict(self._asdict())
+
+
+class CityIndex:
+    """
+    Local index of known cities.
+
+    The bundled CSV (name, country, country_code, region, aliases) is
+    compiled into a SQLite file on first use and rebuilt whenever the CSV
+    is newer. Lookups match the normalized name or any alias, optionally
+    narrowed by a ', country' suffix; when several cities share a name the
+    one listed first in the dataset wins.
+    """
+
+    COLUMNS = 'key, name, country, country_code, region'
+
+    def __init__(self, dataset=None, path=None, strict=None):
+        default_path = Path(__file__).parent / 'cache' / 'city_index.sqlite3'
+        self.dataset = Path(dataset or os.getenv('CITY_DATASET_PATH', DATA_DIR / 'cities.csv'))
+        self.path = Path(path or os.getenv('CITY_INDEX_PATH', default_path))
+        if strict is None:
+            strict = os.getenv('CITY_INDEX_STRICT', 'false').lower() in ('1', 'true', 'yes')
+        self.strict = strict
+        self._local = threading.local()
+        self._build_lock = threading.Lock()
+        self._ready = False
+        self._available = False
+
+    def load(self):
+        """
+        Build or open the index now rather than on the first lookup
+
+        Returns:
+            Whether the index is available
+        """
+        return self._ensure_index()
+
+    def _ensure_index(self):
+        if self._ready:
+            return self._available
+
+        with self._build_lock:
+            if not self._ready:
+                try:
+                    if self._is_stale():
+                        self._build()
+                    self._available = self.path.exists()
+                except (OSError, sqlite3.Error, csv.Error) as e:
+                    logger.warning('City index unavailable, resolving names upstream: %s', e)
+                    self._available = False
+                self._ready = True
+        return self._available
+
+    def _is_stale(self):
+        if not self.dataset.exists():
+            return False
+        return not self.path.exists() or self.path.stat().st_mtime < self.dataset.stat().st_mtime
+
+    def _build(self):
+        """Compile the CSV dataset into a fresh SQLite file"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Each process builds its own file; the last to finish replaces the index
+        tmp_path = self.path.with_name(f'{self.path.name}.{os.getpid()}.tmp')
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.executescript(
+                'CREATE TABLE cities (rank INTEGER PRIMARY KEY, key TEXT UNIQUE, name TEXT, '
+                'country TEXT, country_code TEXT, region TEXT, norm_name TEXT, norm_country TEXT);'
+                'CREATE TABLE names (norm TEXT, rank INTEGER);'
+                'CREATE INDEX names_norm ON names (norm, rank);'
+            )
+            with open(self.dataset, encoding='utf-8', newline='') as f:
+                for rank, row in enumerate(csv.DictReader(f)):
+                    name = row['name'].strip()
+                    country_code = row.get('country_code', '').strip().upper()
+                    norm_name = normalize_name(name)
+                    key = '-'.join(norm_name.split() + ([country_code.lower()] if country_code else []))
+                    conn.execute(
+                        'INSERT OR IGNORE INTO cities VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                        (rank, key, name, row.get('country', '').strip(), country_code,
+                         row.get('region', '').strip(), norm_name, normalize_name(row.get('country', '')))
+                    )
+                    aliases = [a for a in (row.get('aliases') or '').split('|') if a.strip()]
+                    for alias in {norm_name, *(normalize_name(a) for a in aliases)}:
+                        conn.execute('INSERT INTO names VALUES (?, ?)', (alias, rank))
+            conn.commit()
+        finally:
+            conn.close()
+
+        os.replace(tmp_path, self.path)
+        logger.info('Built city index %s from %s', self.path, self.dataset)
+
+    def _connection(self):
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)
+            self._local.conn = conn
+        return conn
+
+    def _query(self, sql, params):
+        try:
+            return [City(*row) for row in self._connection().execute(sql, params)]
+        except sqlite3.Error as e:
+            logger.warning('City index query failed: %s', e)
+            return []
+
+    def resolve(self, text):
+        """
+        Resolve free-text input such as 'london ', 'London,GB' or 'Londres'
+
+        Returns:
+            City, or None if the input is not in the index
+        """
+        if not text or not self._ensure_index():
+            return None
+
+        name, _, country = text.partition(',')
+        name = normalize_name(name)
+        country = normalize_name(country)
+        if not name:
+            return None
+
+        sql = (
+            f'SELECT {self.COLUMNS} FROM cities WHERE rank IN '
+            '(SELECT rank FROM names WHERE norm = ?)'
+        )
+        params = [name]
+        if country:
+            sql += ' AND (lower(country_code) = ? OR norm_country = ?)'
+            params += [country, country]
+        sql += ' ORDER BY rank LIMIT 1'
+
+        matches = self._query(sql, params)
+        return matches[0] if matches else None
+
+    def autocomplete(self, prefix, limit=10):
+        """
+        Cities whose name or an alias starts with prefix
+
+        Returns:
+            List of City, most prominent first
+        """
+        prefix = normalize_name(prefix or '')
+        if not prefix or not self._ensure_index():
+            return []
+
+        # Range scan on the names index: prefix <= norm < prefix + U+FFFF
+        return self._query(
+            f'SELECT {self.COLUMNS} FROM cities WHERE rank IN '
+            '(SELECT rank FROM names WHERE norm >= ? AND norm < ?) '
+            'ORDER BY rank LIMIT ?',
+            (prefix, prefix + '\uffff', limit)
+        )
+
+    def top(self, limit):
+        """
+        The first 'limit' cities in the dataset, which lists the most
+        prominent first
+
+        Returns:
+            List of City
+        """
+        if limit <= 0 or not self._ensure_index():
+            return []
+        return self._query(f'SELECT {self.COLUMNS} FROM cities ORDER BY rank LIMIT ?', (limit,))
+
+    def __len__(self):
+        if not self._ensure_index():
+            return 0
+        return self._connection().execute('SELECT COUNT(*) FROM cities').fetchone()[0]
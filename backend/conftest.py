@@ -0,0 +1,30 @@
+"""
+Shared pytest setup
+Run with: python -m pytest (from backend/)
+"""
+import pytest
+
+# A manual check against the live OpenWeatherMap API, not a unit test
+collect_ignore = ['test_api.py']
+
+
+class FakeClock:
+    """Stands in for a module's time import so tests can move time forward"""
+
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    """A FakeClock; patch it over a module's time with monkeypatch.setattr"""
+    return FakeClock()
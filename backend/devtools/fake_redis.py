@@ -0,0 +1,143 @@
+"""
+Fake Redis Server
+Minimal in-memory Redis-protocol stand-in for exercising RedisCacheBackend
+locally without a real Redis
+
+Supports PING, AUTH, SELECT, GET, SET (EX/PX), DEL, SCAN and FLUSHDB.
+
+Usage: python devtools/fake_redis.py [--port 6379]
+"""
+import time
+import fnmatch
+import argparse
+import threading
+import socketserver
+
+
+class FakeRedisStore:
+    """Thread-safe key/value store with millisecond expiry"""
+
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and time.time() >= expires_at:
+                del self.data[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.data[key] = (value, time.time() + ttl if ttl else None)
+
+    def delete(self, keys):
+        with self.lock:
+            return sum(1 for key in keys if self.data.pop(key, None) is not None)
+
+    def keys(self, pattern):
+        with self.lock:
+            return [key for key in self.data if fnmatch.fnmatchcase(key, pattern)]
+
+    def flush(self):
+        with self.lock:
+            self.data.clear()
+
+
+class RESPHandler(socketserver.StreamRequestHandler):
+    """Handles one client connection speaking RESP2"""
+
+    def handle(self):
+        while True:
+            try:
+                args = self._read_command()
+            except (ConnectionError, ValueError):
+                return
+            if args is None:
+                return
+            self.wfile.write(self._dispatch(args))
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            # Inline command (e.g. from telnet)
+            return line.decode().split()
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2].decode())
+        return args
+
+    def _dispatch(self, args):
+        store = self.server.store
+        command = args[0].upper()
+
+        if command == 'PING':
+            return b'+PONG\r\n'
+        if command in ('AUTH', 'SELECT'):
+            return b'+OK\r\n'
+        if command == 'GET':
+            return _bulk(store.get(args[1]))
+        if command == 'SET':
+            ttl = None
+            options = [a.upper() for a in args[3:]]
+            if 'EX' in options:
+                ttl = float(args[3 + options.index('EX') + 1])
+            if 'PX' in options:
+                ttl = float(args[3 + options.index('PX') + 1]) / 1000
+            store.set(args[1], args[2], ttl)
+            return b'+OK\r\n'
+        if command == 'DEL':
+            return b':%d\r\n' % store.delete(args[1:])
+        if command == 'SCAN':
+            options = [a.upper() for a in args[2:]]
+            pattern = args[2 + options.index('MATCH') + 1] if 'MATCH' in options else '*'
+            keys = store.keys(pattern)
+            return b'*2\r\n' + _bulk('0') + b'*%d\r\n' % len(keys) + b''.join(_bulk(k) for k in keys)
+        if command == 'FLUSHDB':
+            store.flush()
+            return b'+OK\r\n'
+        return b'-ERR unknown command \'%s\'\r\n' % command.encode()
+
+
+def _bulk(value):
+    if value is None:
+        return b'$-1\r\n'
+    data = value.encode()
+    return b'$%d\r\n%s\r\n' % (len(data), data)
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=6379):
+        super().__init__((host, port), RESPHandler)
+        self.store = FakeRedisStore()
+
+    def start(self):
+        """Serve on a background thread; returns the bound port"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self.server_address[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='In-memory Redis protocol stand-in')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6379)
+    args = parser.parse_args()
+
+    server = FakeRedisServer(args.host, args.port)
+    print(f'Fake Redis listening on {args.host}:{args.port}')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
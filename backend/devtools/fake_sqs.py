@@ -0,0 +1,274 @@
+"""
+Fake SQS Server
+Minimal in-memory SQS stand-in for exercising the snapshot producer and
+consumer locally without AWS
+
+Speaks the AWS JSON protocol used by current boto3/botocore. Supports
+CreateQueue, GetQueueUrl, GetQueueAttributes, PurgeQueue, SendMessage(Batch),
+ReceiveMessage (long polling, visibility timeout), DeleteMessage(Batch) and
+ChangeMessageVisibility(Batch).
+
+Usage: python devtools/fake_sqs.py [--port 9324] [--queue weather-snapshots]
+Then set SQS_ENDPOINT_URL=http://127.0.0.1:9324 and
+SQS_QUEUE_URL=http://127.0.0.1:9324/000000000000/weather-snapshots
+"""
+import json
+import time
+import uuid
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeQueue:
+    """One queue: visible messages plus in-flight messages with deadlines"""
+
+    def __init__(self, name, visibility_timeout=30):
+        self.name = name
+        self.visibility_timeout = visibility_timeout
+        self.messages = {}  # message id -> message dict
+        self.receipts = {}  # receipt handle -> message id
+        self.condition = threading.Condition()
+
+    def send(self, body, attributes=None):
+        message_id = str(uuid.uuid4())
+        with self.condition:
+            self.messages[message_id] = {
+                'MessageId': message_id,
+                'Body': body,
+                'MD5OfBody': hashlib.md5(body.encode()).hexdigest(),
+                'MessageAttributes': attributes or {},
+                'visible_at': 0.0,
+                'receive_count': 0,
+                'receipt': None
+            }
+            self.condition.notify_all()
+        return message_id
+
+    def _visible(self, now):
+        return [m for m in self.messages.values() if m['visible_at'] <= now]
+
+    def receive(self, max_messages=1, wait_seconds=0, visibility_timeout=None):
+        timeout = self.visibility_timeout if visibility_timeout is None else visibility_timeout
+        deadline = time.time() + wait_seconds
+
+        with self.condition:
+            while True:
+                now = time.time()
+                visible = self._visible(now)
+                if visible or now >= deadline:
+                    break
+                # Woken by send(); in-flight messages reappear on their own
+                self.condition.wait(min(deadline - now, 0.2))
+
+            received = []
+            for message in visible[:max_messages]:
+                if message['receipt'] is not None:
+                    self.receipts.pop(message['receipt'], None)
+                message['receipt'] = uuid.uuid4().hex
+                message['visible_at'] = now + timeout
+                message['receive_count'] += 1
+                self.receipts[message['receipt']] = message['MessageId']
+                received.append({
+                    'MessageId': message['MessageId'],
+                    'ReceiptHandle': message['receipt'],
+                    'Body': message['Body'],
+                    'MD5OfBody': message['MD5OfBody'],
+                    'Attributes': {'ApproximateReceiveCount': str(message['receive_count'])}
+                })
+            return received
+
+    def delete(self, receipt):
+        with self.condition:
+            message_id = self.receipts.pop(receipt, None)
+            if message_id is None:
+                return False
+            self.messages.pop(message_id, None)
+            return True
+
+    def change_visibility(self, receipt, timeout):
+        with self.condition:
+            message_id = self.receipts.get(receipt)
+            if message_id is None or message_id not in self.messages:
+                return False
+            self.messages[message_id]['visible_at'] = time.time() + timeout
+            self.condition.notify_all()
+            return True
+
+    def attributes(self):
+        with self.condition:
+            now = time.time()
+            visible = len(self._visible(now))
+            return {
+                'ApproximateNumberOfMessages': str(visible),
+                'ApproximateNumberOfMessagesNotVisible': str(len(self.messages) - visible),
+                'VisibilityTimeout': str(self.visibility_timeout)
+            }
+
+    def purge(self):
+        with self.condition:
+            self.messages.clear()
+            self.receipts.clear()
+
+
+class SQSError(Exception):
+    def __init__(self, code, message, status=400):
+        super().__init__(message)
+        self.code = code
+        self.status = status
+
+
+class SQSHandler(BaseHTTPRequestHandler):
+    """Handles AWS JSON protocol requests (X-Amz-Target: AmazonSQS.<Action>)"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        action = self.headers.get('X-Amz-Target', '').split('.')[-1]
+
+        try:
+            handler = getattr(self, f'_action_{action}', None)
+            if handler is None:
+                raise SQSError('InvalidAction', f'Unsupported action: {action}')
+            status, body = 200, handler(payload)
+        except SQSError as e:
+            status, body = e.status, {'__type': f'com.amazonaws.sqs#{e.code}', 'message': str(e)}
+
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/x-amz-json-1.0')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _queue(self, payload):
+        name = payload.get('QueueUrl', '').rstrip('/').rsplit('/', 1)[-1]
+        queue = self.server.queues.get(name)
+        if queue is None:
+            raise SQSError('QueueDoesNotExist', 'The specified queue does not exist.')
+        return queue
+
+    def _action_CreateQueue(self, payload):
+        name = payload['QueueName']
+        timeout = int(payload.get('Attributes', {}).get('VisibilityTimeout', 30))
+        self.server.queues.setdefault(name, FakeQueue(name, timeout))
+        return {'QueueUrl': self.server.queue_url(name)}
+
+    def _action_GetQueueUrl(self, payload):
+        name = payload['QueueName']
+        if name not in self.server.queues:
+            raise SQSError('QueueDoesNotExist', 'The specified queue does not exist.')
+        return {'QueueUrl': self.server.queue_url(name)}
+
+    def _action_GetQueueAttributes(self, payload):
+        return {'Attributes': self._queue(payload).attributes()}
+
+    def _action_PurgeQueue(self, payload):
+        self._queue(payload).purge()
+        return {}
+
+    def _action_SendMessage(self, payload):
+        body = payload['MessageBody']
+        message_id = self._queue(payload).send(body, payload.get('MessageAttributes'))
+        return {'MessageId': message_id, 'MD5OfMessageBody': hashlib.md5(body.encode()).hexdigest()}
+
+    def _action_SendMessageBatch(self, payload):
+        queue = self._queue(payload)
+        entries = payload.get('Entries', [])
+        if len(entries) > 10:
+            raise SQSError('TooManyEntriesInBatchRequest', 'Maximum number of entries per request are 10.')
+        successful = []
+        for entry in entries:
+            body = entry['MessageBody']
+            successful.append({
+                'Id': entry['Id'],
+                'MessageId': queue.send(body, entry.get('MessageAttributes')),
+                'MD5OfMessageBody': hashlib.md5(body.encode()).hexdigest()
+            })
+        return {'Successful': successful, 'Failed': []}
+
+    def _action_ReceiveMessage(self, payload):
+        max_messages = int(payload.get('MaxNumberOfMessages', 1))
+        if not 1 <= max_messages <= 10:
+            raise SQSError('InvalidParameterValue', 'MaxNumberOfMessages must be between 1 and 10.')
+        messages = self._queue(payload).receive(
+            max_messages,
+            min(int(payload.get('WaitTimeSeconds', 0)), 20),
+            payload.get('VisibilityTimeout')
+        )
+        return {'Messages': messages} if messages else {}
+
+    def _action_DeleteMessage(self, payload):
+        if not self._queue(payload).delete(payload['ReceiptHandle']):
+            raise SQSError('ReceiptHandleIsInvalid', 'The receipt handle is not valid.')
+        return {}
+
+    def _action_DeleteMessageBatch(self, payload):
+        queue = self._queue(payload)
+        successful, failed = [], []
+        for entry in payload.get('Entries', []):
+            if queue.delete(entry['ReceiptHandle']):
+                successful.append({'Id': entry['Id']})
+            else:
+                failed.append({'Id': entry['Id'], 'Code': 'ReceiptHandleIsInvalid', 'SenderFault': True})
+        return {'Successful': successful, 'Failed': failed}
+
+    def _action_ChangeMessageVisibility(self, payload):
+        if not self._queue(payload).change_visibility(payload['ReceiptHandle'], int(payload['VisibilityTimeout'])):
+            raise SQSError('ReceiptHandleIsInvalid', 'The receipt handle is not valid.')
+        return {}
+
+    def _action_ChangeMessageVisibilityBatch(self, payload):
+        queue = self._queue(payload)
+        successful, failed = [], []
+        for entry in payload.get('Entries', []):
+            if queue.change_visibility(entry['ReceiptHandle'], int(entry['VisibilityTimeout'])):
+                successful.append({'Id': entry['Id']})
+            else:
+                failed.append({'Id': entry['Id'], 'Code': 'ReceiptHandleIsInvalid', 'SenderFault': True})
+        return {'Successful': successful, 'Failed': failed}
+
+
+class FakeSQSServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=9324, queues=(), verbose=False):
+        super().__init__((host, port), SQSHandler)
+        self.verbose = verbose
+        self.queues = {name: FakeQueue(name) for name in queues}
+
+    def queue_url(self, name):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/000000000000/{name}'
+
+    def start(self):
+        """Serve on a background thread; returns the bound port"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self.server_address[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='In-memory SQS stand-in')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9324)
+    parser.add_argument('--queue', action='append', default=[], help='queue to create at startup')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args()
+
+    server = FakeSQSServer(args.host, args.port, args.queue or ['weather-snapshots'], args.verbose)
+    print(f'Fake SQS listening on {args.host}:{args.port}')
+    for name in server.queues:
+        print(f'  {server.queue_url(name)}')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+"""
+Mock OpenWeatherMap Server
+Local stand-in for the OpenWeatherMap 2.5 API with configurable latency,
+error rate and payloads, for load tests and offline development
+
+Serves /data/2.5/weather, /data/2.5/forecast and /data/2.5/group. Every
+city name is answered (names starting with "nowhere" get a 404) with a
+payload derived from the name, so runs are repeatable. --fixtures DIR
+replaces the generated payloads with DIR/weather.json and DIR/forecast.json
+(e.g. saved real responses); only the city name and ID are filled in.
+GET /__stats returns request counters as JSON.
+
+Usage: python devtools/mock_owm.py [--port 8090] [--latency-ms 50] [--jitter-ms 20] [--error-rate 0.01]
+Then set OPENWEATHER_BASE_URL=http://127.0.0.1:8090/data/2.5
+"""
+import copy
+import json
+import time
+import zlib
+import random
+import argparse
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+CONDITIONS = [
+    (800, 'Clear', 'clear sky', '01d'),
+    (802, 'Clouds', 'scattered clouds', '03d'),
+    (500, 'Rain', 'light rain', '10d'),
+    (600, 'Snow', 'light snow', '13d'),
+    (701, 'Mist', 'mist', '50d')
+]
+
+
+def city_id(name):
+    """Stable numeric ID for a city name (same in every process)"""
+    return zlib.crc32(name.strip().lower().encode()) % 10_000_000
+
+
+def _split_query(query):
+    name, _, country = query.partition(',')
+    return name.strip().title(), (country.strip().upper() or 'GB')[:2]
+
+
+def weather_payload(name, country, cid, now):
+    """/weather response for a city; values vary by city and hour"""
+    rng = random.Random(cid * 1000 + int(now) // 3600)
+    temp = round(-5 + (cid % 400) / 10 + rng.uniform(-2, 2), 2)
+    code, main, description, icon = CONDITIONS[(cid + int(now) // 10800) % len(CONDITIONS)]
+    return {
+        'coord': {'lon': round((cid % 36000) / 100 - 180, 2), 'lat': round((cid % 18000) / 100 - 90, 2)},
+        'weather': [{'id': code, 'main': main, 'description': description, 'icon': icon}],
+        'base': 'stations',
+        'main': {
+            'temp': temp,
+            'feels_like': round(temp - rng.uniform(0, 3), 2),
+            'temp_min': round(temp - 1.5, 2),
+            'temp_max': round(temp + 1.5, 2),
+            'pressure': rng.randint(990, 1030),
+            'humidity': rng.randint(30, 95)
+        },
+        'visibility': 10000,
+        'wind': {'speed': round(rng.uniform(0, 12), 1), 'deg': rng.randint(0, 359)},
+        'clouds': {'all': rng.randint(0, 100)},
+        'dt': int(now),
+        'sys': {'country': country},
+        'timezone': (cid % 25 - 12) * 3600,
+        'id': cid,
+        'name': name,
+        'cod': 200
+    }
+
+
+def forecast_payload(name, country, cid, now, slots=40):
+    """/forecast response: 'slots' 3-hour entries starting at the current slot"""
+    start = int(now) // 10800 * 10800
+    entries = []
+    for i in range(slots):
+        slot = weather_payload(name, country, cid, start + i * 10800)
+        entries.append({
+            'dt': slot['dt'],
+            'main': slot['main'],
+            'weather': slot['weather'],
+            'clouds': slot['clouds'],
+            'wind': slot['wind'],
+            'visibility': slot['visibility'],
+            'pop': 0,
+            'dt_txt': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(slot['dt']))
+        })
+    return {
+        'cod': '200',
+        'message': 0,
+        'cnt': slots,
+        'list': entries,
+        'city': {
+            'id': cid,
+            'name': name,
+            'coord': weather_payload(name, country, cid, now)['coord'],
+            'country': country,
+            'timezone': (cid % 25 - 12) * 3600
+        }
+    }
+
+
+class MockOWMHandler(BaseHTTPRequestHandler):
+    # Keep-alive, as the real API and the pooled clients use
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+        if url.path == '/__stats':
+            self._send(200, self.server.stats())
+            return
+
+        prefix, _, endpoint = url.path.rpartition('/')
+        if prefix != '/data/2.5' or endpoint not in ('weather', 'forecast', 'group'):
+            self._send(404, {'cod': '404', 'message': 'Internal error'})
+            return
+
+        status, body = self.server.respond(endpoint, params)
+        self._send(status, body)
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class MockOWMServer(ThreadingHTTPServer):
+    """
+    Threaded mock API server.
+
+    Each request waits latency +/- jitter seconds, then fails with
+    error_status at error_rate, otherwise returns a generated (or fixture)
+    payload. Settings may be changed while it runs.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=8090, latency=0.0, jitter=0.0, error_rate=0.0,
+                 error_status=503, forecast_slots=40, fixtures=None, seed=None, verbose=False):
+        super().__init__((host, port), MockOWMHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.forecast_slots = forecast_slots
+        self.fixtures = self._load_fixtures(fixtures)
+        self.verbose = verbose
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+
+        self.lock = threading.Lock()
+        self.names = {}  # city ID -> (name, country), for /group
+        self.requests = {}
+        self.errors = 0
+
+    @staticmethod
+    def _load_fixtures(directory):
+        fixtures = {}
+        if directory:
+            for endpoint in ('weather', 'forecast'):
+                path = Path(directory) / f'{endpoint}.json'
+                if path.exists():
+                    fixtures[endpoint] = json.loads(path.read_text(encoding='utf-8'))
+        return fixtures
+
+    def _delay_and_fail(self):
+        """Sleep for the configured latency; True if this request should fail"""
+        with self.rng_lock:
+            delay = self.latency + self.rng.uniform(-self.jitter, self.jitter)
+            failed = self.rng.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay)
+        return failed
+
+    def respond(self, endpoint, params):
+        """
+        Build the response for one API call
+
+        Returns:
+            (status, payload)
+        """
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+        if not params.get('appid'):
+            return 401, {'cod': 401, 'message': 'Invalid API key.'}
+        if self._delay_and_fail():
+            with self.lock:
+                self.errors += 1
+            return self.error_status, {'cod': str(self.error_status), 'message': 'mock upstream error'}
+
+        now = time.time()
+        if endpoint == 'group':
+            entries = []
+            for raw_id in params.get('id', '').split(','):
+                if not raw_id.strip().isdigit():
+                    return 400, {'cod': '400', 'message': f'{raw_id} is not a city ID'}
+                cid = int(raw_id)
+                name, country = self.names.get(cid, (f'City {cid}', 'GB'))
+                entries.append(self._weather(name, country, cid, now))
+            return 200, {'cnt': len(entries), 'list': entries}
+
+        query = params.get('q', '')
+        if not query.strip() or query.strip().lower().startswith('nowhere'):
+            return 404, {'cod': '404', 'message': 'city not found'}
+        name, country = _split_query(query)
+        cid = city_id(query)
+        with self.lock:
+            self.names[cid] = (name, country)
+
+        if endpoint == 'weather':
+            return 200, self._weather(name, country, cid, now)
+
+        if 'forecast' in self.fixtures:
+            payload = copy.deepcopy(self.fixtures['forecast'])
+            payload['city'].update({'id': cid, 'name': name, 'country': country})
+            return 200, payload
+        return 200, forecast_payload(name, country, cid, now, self.forecast_slots)
+
+    def _weather(self, name, country, cid, now):
+        if 'weather' in self.fixtures:
+            payload = copy.deepcopy(self.fixtures['weather'])
+            payload.update({'id': cid, 'name': name, 'dt': int(now)})
+            payload.setdefault('sys', {})['country'] = country
+            return payload
+        return weather_payload(name, country, cid, now)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'requests': dict(self.requests),
+                'total_requests': sum(self.requests.values()),
+                'errors': self.errors
+            }
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests = {}
+            self.errors = 0
+
+    def base_url(self):
+        """Value for OPENWEATHER_BASE_URL"""
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/data/2.5'
+
+    def start(self):
+        """Serve on a background thread; returns the bound port"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self.server_address[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock OpenWeatherMap API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency-ms', type=float, default=50, help='mean response delay')
+    parser.add_argument('--jitter-ms', type=float, default=20, help='delay varies by +/- this much')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests that fail (0-1)')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--forecast-slots', type=int, default=40, help='3-hour entries per forecast')
+    parser.add_argument('--fixtures', help='directory with weather.json / forecast.json templates')
+    parser.add_argument('--seed', type=int, help='seed latency jitter and errors')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args()
+
+    server = MockOWMServer(
+        args.host, args.port, args.latency_ms / 1000, args.jitter_ms / 1000, args.error_rate,
+        args.error_status, args.forecast_slots, args.fixtures, args.seed, args.verbose
+    )
+    print(f'Mock OpenWeatherMap listening on {args.host}:{args.port}')
+    print(f'  OPENWEATHER_BASE_URL={server.base_url()}')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
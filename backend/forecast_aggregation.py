@@ -0,0 +1,122 @@
+"""
+Forecast Aggregation Module
+Single-pass daily aggregation of 3-hour forecast slots, with an optional
+NumPy path for bulk inputs
+"""
+import os
+from datetime import date, timedelta
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the pure Python path is always available
+    np = None
+
+
+SECONDS_PER_DAY = 86400
+EPOCH = date(1970, 1, 1)
+DAY_NAMES = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+# Below this many slots the pure Python loop beats NumPy's setup cost
+NUMPY_THRESHOLD = int(os.getenv('FORECAST_NUMPY_THRESHOLD', 2000))
+
+
+def _mode(counts):
+    """Most common key; ties go to the alphabetically first key"""
+    return min(counts, key=lambda key: (-counts[key], key))
+
+
+def _day_summary(day_index, min_temp, max_temp, mean_temp, condition, icon):
+    day = EPOCH + timedelta(days=int(day_index))
+    return {
+        'date': day.isoformat(),
+        'day_name': DAY_NAMES[day.weekday()],
+        'min_temp': round(float(min_temp), 1),
+        'max_temp': round(float(max_temp), 1),
+        'avg_temp': round(float(mean_temp), 1),
+        'condition': condition,
+        'icon': icon
+    }
+
+
+def aggregate_daily(items, tz_offset=0, days=5, use_numpy=None):
+    """
+    Group forecast slots into per-day min/max/mean temperature and the most
+    common condition and icon
+
+    Days are split at local midnight of the forecast city, using its UTC
+    offset, not the server's timezone.
+
+    Args:
+        items: OpenWeatherMap forecast 'list' entries
+        tz_offset: City UTC offset in seconds (forecast 'city.timezone')
+        days: Number of days to return
+        use_numpy: Force (True) or disable (False) the NumPy path; by default
+            it is used for inputs of at least FORECAST_NUMPY_THRESHOLD slots
+
+    Returns:
+        List of daily summaries ordered by date
+    """
+    if use_numpy is None:
+        use_numpy = np is not None and len(items) >= NUMPY_THRESHOLD
+    if use_numpy and items:
+        return _aggregate_numpy(items, tz_offset, days)
+
+    # day index -> [min, max, sum, count, condition counts, icon counts]
+    by_day = {}
+
+    for item in items:
+        day_index = (item['dt'] + tz_offset) // SECONDS_PER_DAY
+        temp = item['main']['temp']
+        weather = item['weather'][0]
+
+        acc = by_day.get(day_index)
+        if acc is None:
+            acc = by_day[day_index] = [temp, temp, 0.0, 0, {}, {}]
+        elif temp < acc[0]:
+            acc[0] = temp
+        elif temp > acc[1]:
+            acc[1] = temp
+        acc[2] += temp
+        acc[3] += 1
+
+        conditions = acc[4]
+        conditions[weather['main']] = conditions.get(weather['main'], 0) + 1
+        icons = acc[5]
+        icons[weather['icon']] = icons.get(weather['icon'], 0) + 1
+
+    return [
+        _day_summary(day_index, acc[0], acc[1], acc[2] / acc[3], _mode(acc[4]), _mode(acc[5]))
+        for day_index, acc in sorted(by_day.items())[:days]
+    ]
+
+
+def _category_modes(values, day_codes, day_count):
+    """Per-day most common value, ties going to the alphabetically first"""
+    names, codes = np.unique(np.asarray(values), return_inverse=True)
+    table = np.zeros((day_count, len(names)), dtype=np.int64)
+    np.add.at(table, (day_codes, codes), 1)
+    # np.unique sorts names, so argmax picks the alphabetically first on ties
+    return names[table.argmax(axis=1)]
+
+
+def _aggregate_numpy(items, tz_offset, days):
+    count = len(items)
+    timestamps = np.fromiter((item['dt'] for item in items), dtype=np.int64, count=count)
+    temps = np.fromiter((item['main']['temp'] for item in items), dtype=np.float64, count=count)
+
+    day_indexes, day_codes = np.unique((timestamps + tz_offset) // SECONDS_PER_DAY, return_inverse=True)
+    day_count = len(day_indexes)
+
+    mins = np.full(day_count, np.inf)
+    np.minimum.at(mins, day_codes, temps)
+    maxs = np.full(day_count, -np.inf)
+    np.maximum.at(maxs, day_codes, temps)
+    means = np.bincount(day_codes, weights=temps, minlength=day_count) / np.bincount(day_codes, minlength=day_count)
+
+    conditions = _category_modes([item['weather'][0]['main'] for item in items], day_codes, day_count)
+    icons = _category_modes([item['weather'][0]['icon'] for item in items], day_codes, day_count)
+
+    return [
+        _day_summary(day_indexes[i], mins[i], maxs[i], means[i], str(conditions[i]), str(icons[i]))
+        for i in range(min(days, day_count))
+    ]
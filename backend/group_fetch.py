@@ -0,0 +1,239 @@
+"""
+Group Fetch Module
+Bulk current-weather fetching through OpenWeatherMap's /group endpoint,
+with a persisted city name -> city ID map
+"""
+import os
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from threading import Lock
+
+import requests
+
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_city(name):
+    """Case- and whitespace-insensitive form of a city query"""
+    return ' '.join(name.lower().split())
+
+
+class CityIdMap:
+    """
+    Maps free-text city queries to OpenWeatherMap city IDs.
+
+    IDs are learnt from ordinary /weather responses and saved to a JSON file
+    (CITY_ID_MAP_PATH) so they survive restarts.
+    """
+
+    def __init__(self, path=None):
+        default_path = Path(__file__).parent / 'cache' / 'city_ids.json'
+        self.path = Path(path or os.getenv('CITY_ID_MAP_PATH', default_path))
+        self.lock = Lock()
+        self.dirty = False
+        self.ids = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return {k: int(v) for k, v in json.load(f).items()}
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def get(self, name):
+        with self.lock:
+            return self.ids.get(normalize_city(name))
+
+    def set(self, name, city_id):
+        key = normalize_city(name)
+        with self.lock:
+            if self.ids.get(key) != city_id:
+                self.ids[key] = city_id
+                self.dirty = True
+
+    def save(self):
+        """Write the map to disk if it changed"""
+        with self.lock:
+            if not self.dirty:
+                return
+            snapshot = dict(self.ids)
+            self.dirty = False
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Per-process name, so workers saving at once do not share a file
+            tmp_path = self.path.with_name(f'{self.path.name}.{os.getpid()}.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning('Could not save city ID map to %s: %s', self.path, e)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class GroupFetcher:
+    """
+    Fetches current weather for many cities with as few calls as possible.
+
+    Cities whose ID is known are fetched 20 at a time from /group; the rest
+    are fetched one by one from /weather?q=, which also teaches the map
+    their ID for next time. Anything a group call fails to return falls
+    back to a single call. If the plan does not allow /group, it is
+    switched off and every city is fetched singly.
+    """
+
+    GROUP_SIZE = 20  # OpenWeatherMap limit for /group
+    UNSUPPORTED_STATUSES = frozenset({401, 403, 404})
+
+    def __init__(self, client, api_key, base_url, id_map=None, rate_limiter=None, workers=None):
+        self.client = client
+        self.api_key = api_key
+        self.base_url = base_url
+        self.id_map = id_map or CityIdMap()
+        self.rate_limiter = rate_limiter
+        self.workers = workers or int(os.getenv('BATCH_MAX_CONCURRENCY', 8))
+        self.enabled = os.getenv('OWM_GROUP_FETCH', 'true').lower() in ('1', 'true', 'yes')
+
+        self.lock = Lock()
+        self.group_requests = 0
+        self.single_requests = 0
+        self.cities_via_group = 0
+
+    def _get(self, endpoint, params):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        params = dict(params, appid=self.api_key, units='metric')
+        return self.client.get(f'{self.base_url}/{endpoint}', params=params)
+
+    def fetch_one(self, query):
+        """
+        Fetch current weather for one city by name and remember its ID
+
+        Returns:
+            Raw /weather response
+
+        Raises:
+            ValueError if the city is not found, Exception on other errors
+        """
+        with self.lock:
+            self.single_requests += 1
+
+        try:
+            response = self._get('weather', {'q': query})
+        except requests.exceptions.RequestException as e:
+            raise Exception(f'Network error: {str(e)}')
+
+        if response.status_code == 404:
+            raise ValueError(f'City "{query}" not found')
+        if response.status_code >= 400:
+            raise Exception(f'API error: {response.status_code}')
+
+        data = response.json()
+        if 'id' in data:
+            self.id_map.set(query, data['id'])
+        return data
+
+    def _fetch_group(self, city_ids):
+        """
+        Fetch up to GROUP_SIZE cities by ID in one call
+
+        Returns:
+            Dictionary of city ID -> raw weather entry
+        """
+        with self.lock:
+            self.group_requests += 1
+
+        response = self._get('group', {'id': ','.join(str(i) for i in city_ids)})
+        if response.status_code in self.UNSUPPORTED_STATUSES:
+            self.enabled = False
+            logger.warning('OpenWeatherMap /group unavailable (%s), fetching cities singly',
+                           response.status_code)
+        response.raise_for_status()
+
+        entries = {entry['id']: entry for entry in response.json().get('list', [])}
+        with self.lock:
+            self.cities_via_group += len(entries)
+        return entries
+
+    def fetch_many(self, queries):
+        """
+        Fetch current weather for several cities
+
+        Args:
+            queries: City names (OpenWeatherMap q= form)
+
+        Returns:
+            Dictionary of query -> raw weather entry, or the exception
+            (ValueError for unknown cities) raised for that query
+        """
+        results = {}
+        queries_by_id = {}
+        singles = []
+
+        for query in dict.fromkeys(queries):
+            city_id = self.id_map.get(query) if self.enabled else None
+            if city_id is None:
+                singles.append(query)
+            else:
+                queries_by_id.setdefault(city_id, []).append(query)
+
+        city_ids = list(queries_by_id)
+        groups = [city_ids[i:i + self.GROUP_SIZE] for i in range(0, len(city_ids), self.GROUP_SIZE)]
+
+        def run_group(ids):
+            try:
+                return ids, self._fetch_group(ids)
+            except Exception as e:
+                logger.warning('Group fetch of %d cities failed: %s', len(ids), e)
+                return ids, {}
+
+        def run_single(query):
+            try:
+                return query, self.fetch_one(query)
+            except Exception as e:
+                return query, e
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            group_futures = [pool.submit(run_group, ids) for ids in groups]
+            single_futures = [pool.submit(run_single, query) for query in singles]
+
+            fallbacks = []
+            for future in group_futures:
+                ids, entries = future.result()
+                for city_id in ids:
+                    entry = entries.get(city_id)
+                    for query in queries_by_id[city_id]:
+                        if entry is None:
+                            fallbacks.append(query)
+                        else:
+                            results[query] = entry
+
+            # Whatever a group call missed is fetched by name
+            single_futures += [pool.submit(run_single, query) for query in fallbacks]
+            for future in single_futures:
+                query, outcome = future.result()
+                results[query] = outcome
+
+        self.id_map.save()
+        return results
+
+    def stats(self):
+        """
+        Get bulk fetch statistics
+
+        Returns:
+            Dictionary with group/single request counts and known city IDs
+        """
+        with self.lock:
+            return {
+                'enabled': self.enabled,
+                'group_requests': self.group_requests,
+                'single_requests': self.single_requests,
+                'cities_via_group': self.cities_via_group,
+                'known_city_ids': len(self.id_map)
+            }
@@ -0,0 +1,340 @@
+"""
+History Store Module
+Compact columnar store of weather snapshots per city, with time-range
+queries and downsampling for the /history endpoint
+"""
+import os
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from threading import Lock
+
+
+TIME_COLUMN = ('time', 'q')  # epoch seconds, int64
+VALUE_COLUMNS = (
+    ('temp', 'f'),
+    ('feels_like', 'f'),
+    ('humidity', 'f'),
+    ('pressure', 'f'),
+    ('wind_speed', 'f')
+)
+
+# Bucket widths in seconds; 'raw' returns the stored samples
+RESOLUTIONS = OrderedDict([('raw', 0), ('hour', 3600), ('day', 86400), ('week', 7 * 86400)])
+
+# Accepted query times: the Unix epoch to the end of year 9999
+MIN_TIME = 0
+MAX_TIME = 253402300799
+
+
+class HistoryQueryError(Exception):
+    """Raised for an invalid time range or resolution"""
+
+
+def parse_time(value):
+    """
+    Parse an ISO 8601 date/time (UTC unless it has an offset) or epoch seconds
+
+    Raises:
+        HistoryQueryError if the value is neither, or falls outside
+        MIN_TIME..MAX_TIME
+    """
+    try:
+        epoch = float(value)
+    except ValueError:
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            raise HistoryQueryError(f'Invalid time: {value}')
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        epoch = parsed.timestamp()
+
+    # Also rejects nan and inf, which float() accepts
+    if not MIN_TIME <= epoch <= MAX_TIME:
+        raise HistoryQueryError(f'Time out of range: {value}')
+    return epoch
+
+
+def parse_range(start=None, end=None):
+    """
+    Parse optional 'from'/'to' query values
+
+    Returns:
+        (start, end) epoch seconds; 'to' defaults to now and 'from' to
+        HISTORY_DEFAULT_DAYS before it
+    """
+    end = parse_time(end) if end else time.time()
+    if start:
+        return parse_time(start), end
+    return end - float(os.getenv('HISTORY_DEFAULT_DAYS', 7)) * 86400, end
+
+
+def format_time(epoch):
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(epoch))
+
+
+def snapshot_values(data):
+    """
+    Column values from an OpenWeatherMap /weather response
+
+    Returns:
+        (epoch seconds, dictionary of column -> value)
+    """
+    main = data['main']
+    values = {
+        'temp': main['temp'],
+        'feels_like': main.get('feels_like', main['temp']),
+        'humidity': main['humidity'],
+        'pressure': main['pressure'],
+        'wind_speed': data.get('wind', {}).get('speed', 0)
+    }
+    return int(data.get('dt') or time.time()), values
+
+
+def _month(epoch):
+    """'YYYY-MM' partition of an epoch time"""
+    return time.strftime('%Y-%m', time.gmtime(epoch))
+
+
+class _Chunk:
+    """
+    One city-month of samples: a sorted time column and one typed array
+    per value column, each stored in its own append-only file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.columns = {name: array(code) for name, code in (TIME_COLUMN,) + VALUE_COLUMNS}
+        self.repaired = False
+
+    def _file(self, name):
+        return self.path / f'{name}.{self.columns[name].typecode}'
+
+    def __len__(self):
+        return len(self.columns['time'])
+
+    def load(self):
+        """Read rows appended (possibly by another process) since the last load"""
+        times = self.columns['time']
+        try:
+            rows = self._file('time').stat().st_size // times.itemsize
+        except FileNotFoundError:
+            return
+        have = len(times)
+        if rows <= have:
+            return
+
+        # The time column is written last, so every value column has these rows
+        for name, column in self.columns.items():
+            with open(self._file(name), 'rb') as f:
+                f.seek(have * column.itemsize)
+                column.fromfile(f, rows - have)
+
+    def repair(self):
+        """Drop partial rows left by an interrupted append"""
+        self.repaired = True
+        rows = len(self)
+        for name, column in self.columns.items():
+            path = self._file(name)
+            if path.exists() and path.stat().st_size > rows * column.itemsize:
+                os.truncate(path, rows * column.itemsize)
+
+    def append(self, rows):
+        """
+        Append (epoch, values) rows newer than the last stored sample
+
+        Returns:
+            Number of rows written
+        """
+        times = self.columns['time']
+        last = times[-1] if times else None
+        fresh = []
+        for epoch, values in sorted(rows, key=lambda row: row[0]):
+            if last is None or epoch > last:
+                fresh.append((epoch, values))
+                last = epoch
+        if not fresh:
+            return 0
+
+        if not self.repaired:
+            self.repair()
+        self.path.mkdir(parents=True, exist_ok=True)
+        for name, code in VALUE_COLUMNS + (TIME_COLUMN,):
+            if name == 'time':
+                new = array(code, [epoch for epoch, _ in fresh])
+            else:
+                new = array(code, [values[name] for _, values in fresh])
+            with open(self._file(name), 'ab') as f:
+                new.tofile(f)
+            self.columns[name].extend(new)
+        return len(fresh)
+
+
+class HistoryStore:
+    """
+    Per-city time series of snapshot observations on local disk.
+
+    Samples live under HISTORY_STORE_PATH/<city key>/<YYYY-MM>/, with each
+    column (time, temp, feels_like, humidity, pressure, wind_speed) in its
+    own file of packed 4- or 8-byte values. The snapshot consumer appends;
+    the API reads. Chunks are kept in memory (up to HISTORY_CACHE_CHUNKS)
+    and only the rows appended since the last query are read back, so a
+    range query is a couple of binary searches plus min/max/sum over array
+    slices rather than a DynamoDB scan.
+
+    Samples are append-only per month: a sample not newer than the last one
+    stored for its city and month (e.g. a redelivered message) is skipped.
+    """
+
+    def __init__(self, path=None, cache_chunks=None, max_points=None):
+        default_path = Path(__file__).parent / 'history'
+        self.path = Path(path or os.getenv('HISTORY_STORE_PATH', default_path))
+        self.cache_chunks = cache_chunks or int(os.getenv('HISTORY_CACHE_CHUNKS', 256))
+        self.max_points = max_points or int(os.getenv('HISTORY_MAX_POINTS', 2000))
+        self.chunks = OrderedDict()
+        self.lock = Lock()
+
+        self.appended = 0
+        self.skipped = 0
+        self.queries = 0
+
+    def _chunk(self, city, month):
+        """Cached chunk for a city-month, brought up to date with the disk"""
+        key = (city, month)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = _Chunk(self.path / city / month)
+            self.chunks[key] = chunk
+            while len(self.chunks) > self.cache_chunks:
+                self.chunks.popitem(last=False)
+        else:
+            self.chunks.move_to_end(key)
+        chunk.load()
+        return chunk
+
+    def append(self, city, data):
+        """
+        Store one observation for a city
+
+        Args:
+            city: Canonical city key
+            data: OpenWeatherMap /weather response
+        """
+        epoch, values = snapshot_values(data)
+        month = _month(epoch)
+        with self.lock:
+            chunk = self._chunk(city, month)
+            written = chunk.append([(epoch, values)])
+            self.appended += written
+            self.skipped += 1 - written
+
+    def _select(self, city, start, end):
+        """Concatenate the samples in [start, end) across monthly chunks"""
+        columns = {name: array(code) for name, code in (TIME_COLUMN,) + VALUE_COLUMNS}
+        try:
+            months = sorted(os.listdir(self.path / city))
+        except FileNotFoundError:
+            return columns
+
+        first, last = _month(start), _month(max(start, end - 1))
+        for month in months:
+            if not first <= month <= last:
+                continue
+            chunk = self._chunk(city, month)
+            times = chunk.columns['time']
+            lo = bisect_left(times, start)
+            hi = bisect_left(times, end, lo)
+            if lo < hi:
+                for name, column in chunk.columns.items():
+                    columns[name].extend(column[lo:hi])
+        return columns
+
+    def query(self, city, start, end, resolution='auto'):
+        """
+        Samples for a city between two times, optionally downsampled
+
+        Args:
+            city: Canonical city key
+            start: Range start, epoch seconds (inclusive)
+            end: Range end, epoch seconds (exclusive)
+            resolution: 'raw', 'hour', 'day', 'week', or 'auto' for the
+                finest one that fits in HISTORY_MAX_POINTS points
+
+        Returns:
+            (resolution, points); aggregated points carry min/max/mean per
+            column and the number of samples behind them
+
+        Raises:
+            HistoryQueryError for an invalid range or resolution, or a
+            range too long for the resolution
+        """
+        if end <= start:
+            raise HistoryQueryError('"from" must be before "to"')
+        if resolution != 'auto' and resolution not in RESOLUTIONS:
+            raise HistoryQueryError(
+                f'Unknown resolution: {resolution} (use auto, {", ".join(RESOLUTIONS)})'
+            )
+
+        with self.lock:
+            self.queries += 1
+            columns = self._select(city, start, end)
+
+        times = columns['time']
+        if resolution == 'auto':
+            # At most one point per sample, and at most one per bucket
+            resolution = next(
+                (name for name, step in RESOLUTIONS.items()
+                 if min(len(times), (end - start) // (step or 1) + 1) <= self.max_points),
+                next(reversed(RESOLUTIONS))
+            )
+        step = RESOLUTIONS[resolution]
+
+        if not step:
+            points = [
+                dict({'time': format_time(times[i])},
+                     **{name: round(columns[name][i], 2) for name, _ in VALUE_COLUMNS})
+                for i in range(len(times))
+            ]
+        else:
+            points = self._downsample(columns, step)
+
+        if len(points) > self.max_points:
+            raise HistoryQueryError(
+                f'{len(points)} points exceed {self.max_points}; use a coarser resolution or a shorter range'
+            )
+        return resolution, points
+
+    def _downsample(self, columns, step):
+        """Aggregate sorted samples into buckets of 'step' seconds"""
+        times = columns['time']
+        # Samples are sorted, so each bucket is one contiguous slice
+        points = []
+        lo = 0
+        while lo < len(times):
+            bucket = times[lo] - times[lo] % step
+            hi = bisect_left(times, bucket + step, lo)
+            count = hi - lo
+            point = {'time': format_time(bucket), 'samples': count}
+            for name, _ in VALUE_COLUMNS:
+                values = columns[name][lo:hi]
+                point[name] = {
+                    'min': round(min(values), 2),
+                    'max': round(max(values), 2),
+                    'mean': round(sum(values) / count, 2)
+                }
+            points.append(point)
+            lo = hi
+        return points
+
+    def stats(self):
+        with self.lock:
+            return {
+                'cached_chunks': len(self.chunks),
+                'appended': self.appended,
+                'skipped': self.skipped,
+                'queries': self.queries
+            }
@@ -0,0 +1,121 @@
+"""
+HTTP Cache Module
+Pre-serialized, pre-compressed API responses with ETag and Cache-Control
+headers, and conditional GET helpers
+"""
+import os
+import json
+import gzip
+import time
+import hashlib
+from collections import namedtuple
+
+from metrics import stage_timer
+
+
+GZIP_MIN_BYTES = int(os.getenv('HTTP_GZIP_MIN_BYTES', 512))
+GZIP_LEVEL = int(os.getenv('HTTP_GZIP_LEVEL', 6))
+
+
+class RenderedResponse(namedtuple('RenderedResponse', 'body gzip_body etag expires')):
+    """
+    A JSON response body ready to send.
+
+    'gzip_body' is None for bodies under HTTP_GZIP_MIN_BYTES; 'expires' is
+    the epoch time the underlying cache entry stops being fresh.
+    """
+
+    __slots__ = ()
+
+    @property
+    def gzip_etag(self):
+        """ETag of the gzip body; a different representation needs its own"""
+        return self.etag[:-1] + '-gz"'
+
+    @property
+    def size(self):
+        return len(self.body) + len(self.gzip_body or b'')
+
+
+@stage_timer('serialization')
+def render_json(data, expires):
+    """
+    Serialize a response once, together with its gzip form and ETag
+
+    Keys are sorted so the same data always yields the same bytes (and
+    ETag), in every worker.
+
+    Returns:
+        RenderedResponse
+    """
+    body = json.dumps(data, sort_keys=True, separators=(',', ':')).encode()
+    gzip_body = None
+    if len(body) >= GZIP_MIN_BYTES:
+        # mtime=0 keeps the compressed bytes deterministic too
+        gzip_body = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+    return RenderedResponse(body, gzip_body, etag, expires)
+
+
+def cache_control(expires, now=None):
+    """Cache-Control value for a response fresh until 'expires'"""
+    max_age = int(expires - (now or time.time()))
+    if max_age <= 0:
+        return 'no-cache'
+    return f'public, max-age={max_age}'
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Whether an If-None-Match header matches an ETag
+
+    Weak validators (W/"...") match their strong counterpart, as required
+    for If-None-Match.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def accepts_gzip(accept_encoding):
+    """Whether an Accept-Encoding header allows gzip"""
+    for coding in (accept_encoding or '').split(','):
+        name, _, params = coding.strip().partition(';')
+        if name.strip().lower() in ('gzip', '*'):
+            # 'gzip;q=0' explicitly refuses it
+            return params.replace(' ', '').lower() not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+def response_headers(rendered, if_none_match=None, accept_encoding=None):
+    """
+    Status, body and headers for a rendered response
+
+    Returns:
+        (status, body, headers) with the gzip body when the client accepts
+        it, or status 304 and an empty body when If-None-Match matches the
+        ETag of the representation that would be sent
+    """
+    use_gzip = rendered.gzip_body is not None and accepts_gzip(accept_encoding)
+    etag = rendered.gzip_etag if use_gzip else rendered.etag
+    headers = {
+        'ETag': etag,
+        'Cache-Control': cache_control(rendered.expires),
+        'Vary': 'Accept-Encoding'
+    }
+    if etag_matches(if_none_match, etag):
+        return 304, b'', headers
+
+    headers['Content-Type'] = 'application/json'
+    if use_gzip:
+        headers['Content-Encoding'] = 'gzip'
+        return 200, rendered.gzip_body, headers
+    return 200, rendered.body, headers
@@ -0,0 +1,285 @@
+"""
+HTTP Client Module
+Pooled keep-alive HTTP client for OpenWeatherMap calls with retries and
+latency metrics
+"""
+import os
+import time
+import random
+import asyncio
+from collections import deque
+from threading import Lock
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from circuit_breaker import CircuitBreaker
+from metrics import UPSTREAM_SECONDS, stage_timer
+
+
+class UpstreamClient:
+    """
+    Shared HTTP client backed by a pooled requests.Session.
+
+    Connections are kept alive and reused across calls, so cache misses do
+    not pay a new TCP+TLS handshake. 5xx responses, 429s that carry
+    Retry-After and connection failures are retried with full-jitter
+    exponential backoff, honouring Retry-After. Read timeouts are not
+    retried, and no call (retries and waits included) runs past
+    UPSTREAM_DEADLINE_SECONDS. Every call goes through a circuit breaker
+    that starts rejecting calls with CircuitOpenError once too many of
+    them fail.
+    """
+
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+    def __init__(self, pool_size=None, connect_timeout=None, read_timeout=None,
+                 max_retries=None, backoff_base=None, backoff_max=None, deadline=None, breaker=None):
+        self.pool_size = pool_size or int(os.getenv('UPSTREAM_POOL_SIZE', 20))
+        self.connect_timeout = connect_timeout or float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', 3.05))
+        self.read_timeout = read_timeout or float(os.getenv('UPSTREAM_READ_TIMEOUT', 10))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('UPSTREAM_MAX_RETRIES', 2))
+        self.backoff_base = backoff_base or float(os.getenv('UPSTREAM_BACKOFF_BASE', 0.2))
+        self.backoff_max = backoff_max or float(os.getenv('UPSTREAM_BACKOFF_MAX', 5))
+        self.deadline = deadline or float(os.getenv('UPSTREAM_DEADLINE_SECONDS', 10))
+        self.breaker = breaker or CircuitBreaker('openweathermap')
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.lock = Lock()
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.status_counts = {}
+        self.latencies = deque(maxlen=1000)
+
+    def get(self, url, params=None):
+        """
+        Send a GET request, retrying transient failures
+
+        Args:
+            url: Request URL
+            params: Query parameters
+
+        Returns:
+            requests.Response of the last attempt (callers still check status)
+
+        Raises:
+            CircuitOpenError if the circuit breaker is open,
+            requests.exceptions.RequestException if every attempt failed
+            to get a response
+        """
+        probe = self.breaker.before_call()
+        failed = True
+        try:
+            with stage_timer('upstream_fetch'):
+                response = self._get_with_retries(url, params)
+            failed = response.status_code in self.RETRY_STATUSES
+            return response
+        finally:
+            self.breaker.record(failed, probe)
+
+    def _get_with_retries(self, url, params):
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            connect_timeout, read_timeout = self._timeouts(deadline)
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, timeout=(connect_timeout, read_timeout))
+            except requests.exceptions.ReadTimeout:
+                self._record(time.perf_counter() - start, 'error', url)
+                raise
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self._record(time.perf_counter() - start, 'error', url)
+                delay = self._retry_delay(attempt, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            self._record(time.perf_counter() - start, response.status_code, url)
+
+            if self._retryable(response):
+                delay = self._retry_delay(attempt, deadline, response.headers.get('Retry-After'))
+                if delay is not None:
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+
+            return response
+
+    def _timeouts(self, deadline):
+        """(connect, read) timeouts for an attempt, cut short by the call's deadline"""
+        remaining = max(deadline - time.monotonic(), 0.001)
+        return min(self.connect_timeout, remaining), min(self.read_timeout, remaining)
+
+    def _retryable(self, response):
+        if response.status_code == 429:
+            # Without Retry-After a retry would only spend more of the API quota
+            return bool(response.headers.get('Retry-After'))
+        return response.status_code in self.RETRY_STATUSES
+
+    def _retry_delay(self, attempt, deadline, retry_after=None):
+        """
+        Seconds to wait before the next attempt
+
+        Returns:
+            The delay, or None once max_retries is used up or the wait
+            would run past the deadline
+        """
+        if attempt >= self.max_retries:
+            return None
+
+        delay = None
+        if retry_after:
+            try:
+                delay = min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        if delay is None:
+            # Full jitter keeps retrying clients from synchronizing
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if time.monotonic() + delay >= deadline:
+            return None
+
+        with self.lock:
+            self.retries += 1
+        return delay
+
+    def _record(self, latency, status, url):
+        # Endpoint is the last path segment: weather, forecast, group
+        UPSTREAM_SECONDS.labels(url.rsplit('/', 1)[-1], status).observe(latency)
+        with self.lock:
+            self.requests += 1
+            if status == 'error':
+                self.errors += 1
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            self.latencies.append(latency)
+
+    def stats(self):
+        """
+        Get upstream request statistics
+
+        Returns:
+            Dictionary with request/retry/error counts, status codes and
+            latency percentiles (ms) over the last 1000 attempts
+        """
+        with self.lock:
+            latencies = sorted(self.latencies)
+            stats = {
+                'requests': self.requests,
+                'retries': self.retries,
+                'errors': self.errors,
+                'status_codes': {str(k): v for k, v in self.status_counts.items()}
+            }
+
+        if latencies:
+            def percentile(p):
+                return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1)
+
+            stats['latency_ms'] = {
+                'avg': round(sum(latencies) / len(latencies) * 1000, 1),
+                'p50': percentile(0.50),
+                'p95': percentile(0.95),
+                'p99': percentile(0.99),
+                'max': round(latencies[-1] * 1000, 1)
+            }
+        return stats
+
+
+class AsyncUpstreamClient(UpstreamClient):
+    """
+    Non-blocking variant of UpstreamClient for the asyncio serving mode.
+
+    Uses a pooled httpx.AsyncClient with the same timeouts, deadline,
+    retry policy and metrics. httpx is only imported when this client is created.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        import httpx
+
+        self.httpx = httpx
+        self.session.close()
+        self.session = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.pool_size, max_keepalive_connections=self.pool_size
+            ),
+            timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+        )
+
+    async def get(self, url, params=None):
+        """
+        Send a GET request without blocking the event loop
+
+        Returns:
+            httpx.Response of the last attempt
+
+        Raises:
+            CircuitOpenError if the circuit breaker is open,
+            httpx.TransportError if every attempt failed to get a response
+        """
+        probe = self.breaker.before_call()
+        failed = True
+        try:
+            with stage_timer('upstream_fetch'):
+                response = await self._get_with_retries(url, params)
+            failed = response.status_code in self.RETRY_STATUSES
+            return response
+        finally:
+            self.breaker.record(failed, probe)
+
+    async def _get_with_retries(self, url, params):
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            connect_timeout, read_timeout = self._timeouts(deadline)
+            start = time.perf_counter()
+            try:
+                response = await self.session.get(
+                    url, params=params, timeout=self.httpx.Timeout(read_timeout, connect=connect_timeout)
+                )
+            except self.httpx.ReadTimeout:
+                self._record(time.perf_counter() - start, 'error', url)
+                raise
+            except self.httpx.TransportError:
+                self._record(time.perf_counter() - start, 'error', url)
+                delay = self._retry_delay(attempt, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            self._record(time.perf_counter() - start, response.status_code, url)
+
+            if self._retryable(response):
+                delay = self._retry_delay(attempt, deadline, response.headers.get('Retry-After'))
+                if delay is not None:
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+
+            return response
+
+    async def close(self):
+        await self.session.aclose()
+
+
+_shared_client = None
+_shared_client_lock = Lock()
+
+
+def get_client():
+    """Return the process-wide UpstreamClient, creating it on first use"""
+    global _shared_client
+    if _shared_client is None:
+        with _shared_client_lock:
+            if _shared_client is None:
+                _shared_client = UpstreamClient()
+    return _shared_client
@@ -0,0 +1,314 @@
+"""
+Metrics Module
+Counters, gauges and histograms exposed in the Prometheus text format,
+without a client library dependency
+"""
+import time
+import logging
+import threading
+from bisect import bisect_left
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; request and upstream latencies
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Seconds; in-process stages such as cache lookups run in microseconds
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class _Timer:
+    """Context manager and decorator that observes elapsed seconds"""
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.start)
+
+    def __call__(self, fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            # A fresh timer per call: the decorated function may run on many threads
+            with _Timer(self.child):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+class _Metric:
+    """
+    A named metric with optional labels.
+
+    Without labelnames the metric itself records values; with them,
+    labels(*values) returns the child series for one label combination.
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.children = {}
+        if registry is not False:
+            (registry or REGISTRY).register(self)
+
+    def labels(self, *values):
+        if len(values) != len(self.labelnames):
+            raise ValueError(f'{self.name} takes labels {self.labelnames}')
+        values = tuple(str(v) for v in values)
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, self._child())
+        return child
+
+    def _default(self):
+        if self.labelnames:
+            raise ValueError(f'{self.name} needs labels {self.labelnames}')
+        return self.labels()
+
+    def samples(self):
+        """(suffix, label names, label values, value) for every series"""
+        with self.lock:
+            children = sorted(self.children.items())
+        for values, child in children:
+            yield from child.samples(self.labelnames, values)
+
+
+class _Value:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def samples(self, names, values):
+        yield '', names, values, self.value
+
+
+class _GaugeValue(_Value):
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        with self.lock:
+            self.value = float(value)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _child(self):
+        return _GaugeValue()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def dec(self, amount=1):
+        self._default().dec(amount)
+
+    def set(self, value):
+        self._default().set(value)
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+    def samples(self, names, values):
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            yield '_bucket', names + ('le',), values + (_format_value(float(bound)),), cumulative
+        yield '_sum', names, values, total
+        yield '_count', names, values, cumulative
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+class MetricFamily:
+    """
+    Metric read at scrape time from existing stats, e.g. cache counters
+
+    add(value, *label_values) adds one series.
+    """
+
+    def __init__(self, name, kind, documentation, labelnames=()):
+        self.name = name
+        self.kind = kind
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.series = []
+
+    def add(self, value, *values):
+        self.series.append((tuple(str(v) for v in values), value))
+        return self
+
+    def samples(self):
+        for values, value in self.series:
+            yield '', self.labelnames, values, value
+
+
+class Registry:
+    """
+    Set of metrics plus collector callables that return MetricFamily
+    lists when scraped
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f'Metric {metric.name} already registered')
+            self.metrics[metric.name] = metric
+
+    def register_collector(self, collector):
+        with self.lock:
+            self.collectors.append(collector)
+
+    def collect(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+            collectors = list(self.collectors)
+        yield from metrics
+        for collector in collectors:
+            try:
+                yield from collector()
+            except Exception as e:
+                # One failing source must not break the whole scrape
+                logger.warning('Metrics collector failed: %s', e)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.collect():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for suffix, names, values, value in metric.samples():
+                lines.append(f'{metric.name}{suffix}{_format_labels(names, values)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def start_http_server(port, registry=REGISTRY, host='0.0.0.0'):
+    """
+    Serve /metrics from a daemon thread, for processes without an HTTP API
+
+    Returns:
+        The running ThreadingHTTPServer
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
+
+
+# Shared by the API processes; consumer metrics live in snapshot_consumer.py
+STAGE_SECONDS = Histogram(
+    'weather_stage_duration_seconds',
+    'Time spent per request stage (cache_lookup, upstream_fetch, transform, serialization)',
+    ('stage',),
+    buckets=STAGE_BUCKETS
+)
+UPSTREAM_SECONDS = Histogram(
+    'owm_request_duration_seconds',
+    'OpenWeatherMap request attempt latency by endpoint and status code',
+    ('endpoint', 'status')
+)
+
+
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'API request latency by route', ('route',))
+REQUESTS = Counter('http_requests_total', 'API requests by route, method and status', ('route', 'method', 'status'))
+IN_FLIGHT = Gauge('http_requests_in_flight', 'API requests being handled, by route', ('route',))
+
+
+def stage_timer(stage):
+    """Time a block or function as one request stage: with stage_timer('transform'): ..."""
+    return STAGE_SECONDS.labels(stage).time()
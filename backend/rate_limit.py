@@ -0,0 +1,86 @@
+"""
+Rate Limit Module
+Thread-safe token bucket for keeping OpenWeatherMap calls within the plan's
+per-minute allowance
+"""
+import time
+from threading import Lock
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at 'rate' tokens per second.
+
+    Up to 'capacity' tokens can accumulate, which allows short bursts while
+    the long-run rate stays at 'rate'.
+    """
+
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError('Token bucket rate must be positive')
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = Lock()
+        self.waited = 0.0
+
+    @classmethod
+    def per_minute(cls, calls, burst=None):
+        """Create a bucket allowing 'calls' per minute"""
+        return cls(calls / 60.0, burst)
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens=1):
+        """
+        Take tokens if they are available right now
+
+        Returns:
+            True if the tokens were taken
+        """
+        with self.lock:
+            self._refill(time.monotonic())
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    def release(self, tokens=1):
+        """Return tokens that were taken but not used"""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens + tokens)
+
+    def acquire(self, tokens=1, timeout=None):
+        """
+        Take tokens, waiting until they are available
+
+        Args:
+            tokens: Number of tokens needed
+            timeout: Maximum seconds to wait (None = wait as long as needed)
+
+        Returns:
+            True if the tokens were taken, False on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return True
+                wait = (tokens - self.tokens) / self.rate
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+
+            with self.lock:
+                self.waited += wait
+            time.sleep(wait)
@@ -0,0 +1,241 @@
+"""
+Refresh Scheduler Module
+Tracks which cities are requested most and refreshes their cache entries
+before they expire, within an upstream call budget
+"""
+import os
+import time
+import hashlib
+import logging
+import threading
+
+from rate_limit import TokenBucket
+
+
+logger = logging.getLogger(__name__)
+
+
+class PopularityTracker:
+    """
+    Approximate, decaying request counts per key.
+
+    Counts live in a count-min sketch (depth rows of width counters, with
+    conservative update), so memory stays fixed however many distinct
+    cities are requested. Every half_life seconds all counts halve, so the
+    ranking follows current traffic. The 'capacity' keys with the highest
+    estimates are kept as candidates, with the refresh callable from their
+    latest request.
+    """
+
+    def __init__(self, width=2048, depth=4, capacity=256, half_life=600):
+        self.width = width
+        self.depth = depth
+        self.capacity = capacity
+        self.half_life = half_life
+        self.rows = [[0.0] * width for _ in range(depth)]
+        self.candidates = {}  # key -> [estimate, refresh]
+        self.floor = 0.0  # lowest candidate estimate (a lower bound between scans)
+        self.decayed_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def record(self, key, refresh=None):
+        """
+        Count one request for key
+
+        Returns:
+            The key's estimated (decayed) request count
+        """
+        with self.lock:
+            self._decay(time.monotonic())
+
+            cells = list(zip(self.rows, self._indexes(key)))
+            estimate = min(row[i] for row, i in cells) + 1
+            for row, i in cells:
+                if row[i] < estimate:
+                    row[i] = estimate
+
+            candidate = self.candidates.get(key)
+            if candidate is not None:
+                candidate[0] = estimate
+                candidate[1] = refresh
+            elif len(self.candidates) < self.capacity:
+                self.candidates[key] = [estimate, refresh]
+                self.floor = min(self.floor, estimate) if len(self.candidates) > 1 else estimate
+            elif estimate > self.floor:
+                weakest = min(self.candidates, key=lambda k: self.candidates[k][0])
+                if estimate > self.candidates[weakest][0]:
+                    del self.candidates[weakest]
+                    self.candidates[key] = [estimate, refresh]
+                self.floor = min(c[0] for c in self.candidates.values())
+            return estimate
+
+    def _indexes(self, key):
+        """One counter per row, from independent slices of a single digest"""
+        # hash() of (seed, key) tuples is too correlated across rows
+        digest = hashlib.blake2b(key.encode(), digest_size=4 * self.depth).digest()
+        return [int.from_bytes(digest[4 * i:4 * i + 4], 'little') % self.width for i in range(self.depth)]
+
+    def _decay(self, now):
+        elapsed = now - self.decayed_at
+        if self.half_life <= 0 or elapsed < self.half_life:
+            return
+        factor = 0.5 ** (elapsed / self.half_life)
+        for row in self.rows:
+            row[:] = [count * factor for count in row]
+        for candidate in self.candidates.values():
+            candidate[0] *= factor
+        self.floor *= factor
+        self.decayed_at = now
+
+    def top(self, k):
+        """
+        The k most requested keys
+
+        Returns:
+            List of (key, estimate, refresh), most requested first
+        """
+        with self.lock:
+            ranked = sorted(self.candidates.items(), key=lambda item: item[1][0], reverse=True)[:k]
+            return [(key, estimate, refresh) for key, (estimate, refresh) in ranked]
+
+    def __len__(self):
+        return len(self.candidates)
+
+
+class RefreshScheduler:
+    """
+    Keeps the REFRESH_TOP_K most requested cache keys fresh.
+
+    Every REFRESH_INTERVAL_SECONDS the top keys whose entries expire within
+    REFRESH_LEAD_SECONDS (or are no longer cached) are handed, most popular
+    first, to the cache's background refresher, as long as the
+    REFRESH_CALLS_PER_MINUTE budget allows. Unlike refresh-ahead in
+    WeatherCache, a key does not need to be requested near its expiry.
+
+    A refresh counts as having avoided a miss when the key is requested
+    after the entry it replaced would have expired; misses avoided per
+    upstream call is what the budget buys.
+    """
+
+    def __init__(self, cache, top_k=None, calls_per_minute=None, interval=None, lead=None, tracker=None):
+        self.cache = cache
+        self.top_k = top_k if top_k is not None else int(os.getenv('REFRESH_TOP_K', 0))
+        if calls_per_minute is None:
+            calls_per_minute = float(os.getenv('REFRESH_CALLS_PER_MINUTE', 30))
+        self.interval = interval if interval is not None else float(os.getenv('REFRESH_INTERVAL_SECONDS', 5))
+        self.lead = lead if lead is not None else float(os.getenv('REFRESH_LEAD_SECONDS', 60))
+        # A tick may spend everything that accrued since the last one
+        self.rate_limiter = TokenBucket.per_minute(calls_per_minute, max(1.0, calls_per_minute * self.interval / 60))
+        self.tracker = tracker or PopularityTracker(
+            capacity=max(self.top_k * 4, 64),
+            half_life=float(os.getenv('REFRESH_HALF_LIFE_SECONDS', 600))
+        )
+
+        self.lock = threading.Lock()
+        self.replaced = {}  # key -> soft expiry of the entry a refresh replaced
+        self.lookups = 0
+        self.scheduled = 0
+        self.refreshed = 0
+        self.failed = 0
+        self.over_budget = 0
+        self.misses_avoided = 0
+
+        self._stopped = threading.Event()
+        self.started = False
+
+    def record(self, key, refresh):
+        """Count a request for key; refresh() re-fetches and re-caches it"""
+        self.tracker.record(key, refresh)
+
+        with self.lock:
+            self.lookups += 1
+            replaced_expiry = self.replaced.get(key)
+            if replaced_expiry is not None and time.time() >= replaced_expiry:
+                # Without the refresh this request would have found the entry expired
+                del self.replaced[key]
+                self.misses_avoided += 1
+
+            # The thread is only started once there is traffic to follow
+            if not self.started:
+                threading.Thread(target=self._run, name='refresh-scheduler', daemon=True).start()
+                self.started = True
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.tick()
+            except Exception as e:
+                logger.warning('Refresh scheduler tick failed: %s', e)
+
+    def tick(self):
+        """
+        Schedule refreshes for popular keys that are about to expire
+
+        Returns:
+            Number of refreshes scheduled
+        """
+        now = time.time()
+        scheduled = 0
+        for key, _, refresh in self.tracker.top(self.top_k):
+            if refresh is None:
+                continue
+            expiry = self.cache.expires_at(key)
+            if expiry is not None and expiry - now > self.lead:
+                continue
+            if not self.rate_limiter.try_acquire():
+                # Out of budget for this tick; the most popular keys went first
+                with self.lock:
+                    self.over_budget += 1
+                break
+            if self.cache.refresher.schedule(key, self._refresh_job(key, refresh, expiry)):
+                scheduled += 1
+            else:
+                # Already being refreshed, so no upstream call was spent
+                self.rate_limiter.release()
+
+        with self.lock:
+            self.scheduled += scheduled
+            # Forget refreshes nobody came back for
+            for key in [k for k, expiry in self.replaced.items() if now >= expiry + self.cache.ttl]:
+                del self.replaced[key]
+        return scheduled
+
+    def _refresh_job(self, key, refresh, expiry):
+        def run():
+            try:
+                refresh()
+            except Exception:
+                with self.lock:
+                    self.failed += 1
+                raise
+            with self.lock:
+                self.refreshed += 1
+                if expiry is not None:
+                    self.replaced[key] = expiry
+        return run
+
+    def close(self):
+        self._stopped.set()
+
+    def stats(self):
+        """
+        Get scheduler statistics
+
+        Returns:
+            Dictionary with tracked keys, refreshes (upstream calls) by
+            outcome, misses avoided, and the hit ratio they added
+        """
+        with self.lock:
+            calls = self.refreshed + self.failed
+            return {
+                'top_k': self.top_k,
+                'tracked_keys': len(self.tracker),
+                'lookups': self.lookups,
+                'scheduled': self.scheduled,
+                'refreshed': self.refreshed,
+                'failed': self.failed,
+                'over_budget': self.over_budget,
+                'misses_avoided': self.misses_avoided,
+                'hit_ratio_gained': round(self.misses_avoided / self.lookups, 4) if self.lookups else 0.0,
+                'misses_avoided_per_call': round(self.misses_avoided / calls, 4) if calls else 0.0
+            }
@@ -0,0 +1,125 @@
+"""
+Single Flight Module
+Collapses concurrent calls for the same key into one upstream execution
+"""
+import asyncio
+from threading import Event, Lock
+
+
+class _Call:
+    """In-flight call shared by every caller of the same key"""
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Per-key in-flight deduplication.
+
+    The first caller for a key (the originator) runs the function; callers
+    arriving while it runs wait and receive the same result or exception.
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = Lock()
+        self.originated = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """
+        Run fn once for all concurrent callers of key
+
+        Args:
+            key: Deduplication key (e.g. the cache key)
+            fn: Zero-argument callable performing the fetch
+
+        Returns:
+            Whatever fn returned for the originating call
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            if call is None:
+                call = _Call()
+                self.calls[key] = call
+                self.originated += 1
+                is_originator = True
+            else:
+                self.coalesced += 1
+                is_originator = False
+
+        if not is_originator:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+    def stats(self):
+        """Return originated/coalesced fetch counters"""
+        with self.lock:
+            return {
+                'originated': self.originated,
+                'coalesced': self.coalesced,
+                'in_flight': len(self.calls)
+            }
+
+
+class AsyncSingleFlight:
+    """
+    Per-key in-flight deduplication for coroutines.
+
+    Must be used from a single event loop; waiters await the originator's
+    task instead of blocking a thread.
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.originated = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        """
+        Await fn() once for all concurrent callers of key
+
+        Args:
+            key: Deduplication key (e.g. the cache key)
+            fn: Zero-argument coroutine function performing the fetch
+
+        Returns:
+            Whatever fn returned for the originating call
+        """
+        task = self.calls.get(key)
+        if task is not None:
+            self.coalesced += 1
+            # shield() so a cancelled waiter does not cancel the shared fetch
+            return await asyncio.shield(task)
+
+        self.originated += 1
+        task = asyncio.ensure_future(fn())
+        self.calls[key] = task
+        task.add_done_callback(lambda _: self.calls.pop(key, None))
+        return await asyncio.shield(task)
+
+    def stats(self):
+        """Return originated/coalesced fetch counters"""
+        return {
+            'originated': self.originated,
+            'coalesced': self.coalesced,
+            'in_flight': len(self.calls)
+        }
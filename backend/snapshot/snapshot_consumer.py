@@ -1,66 +1,147 @@
 import boto3
 import json
 import os
+import sys
 import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from dotenv import load_dotenv
 from decimal import Decimal
 
+# Shared backend modules live one directory up
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from alerts import AlertIndex, AlertRules, metrics_from_owm
+from city_index import CityIndex, fallback_key
+from history_store import HistoryStore
+from metrics import STAGE_BUCKETS, Counter, Gauge, Histogram, MetricFamily, REGISTRY, start_http_server
+from snapshot_writer import SnapshotWriter
+
 load_dotenv()
 
 AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
-SQS_QUEUE_URL = "https://sqs.us-east-1.amazonaws.com/912753427807/trying-sqs"
-BUCKET = "weather-bucket-for-verisk-internship"
-dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
-table = dynamodb.Table("WeatherSnapshots")
+SQS_QUEUE_URL = os.getenv("SQS_QUEUE_URL", "https://sqs.us-east-1.amazonaws.com/912753427807/trying-sqs")
+# Point at a local stand-in (e.g. devtools/fake_sqs.py) instead of AWS
+SQS_ENDPOINT_URL = os.getenv("SQS_ENDPOINT_URL") or None
+
+SQS_MAX_BATCH = 10  # SQS limit for receive/delete/visibility batches
+LONG_POLL_SECONDS = 20
+CONSUMER_WORKERS = int(os.getenv("CONSUMER_WORKERS", 8))
+VISIBILITY_TIMEOUT = int(os.getenv("CONSUMER_VISIBILITY_TIMEOUT", 60))
+IDLE_SLEEP_SECONDS = float(os.getenv("CONSUMER_IDLE_SLEEP_SECONDS", 2))
+# Serve Prometheus metrics on this port (0 = off)
+METRICS_PORT = int(os.getenv("CONSUMER_METRICS_PORT", 0))
+
+sqs = boto3.client("sqs", region_name=AWS_REGION, endpoint_url=SQS_ENDPOINT_URL)
+writer = SnapshotWriter(region=AWS_REGION)
+# Local time series behind the API's /history endpoint
+history = HistoryStore()
+cities = CityIndex()
+# Same rules as the API (thresholds and ALERT_RULES_FILE from the environment)
+alerts = AlertIndex(AlertRules.from_env())
+
+MESSAGES = Counter(
+    "snapshot_consumer_messages_total",
+    "Messages by outcome (received, buffered, skipped, failed, deleted)",
+    ("outcome",)
+)
+PROCESS_SECONDS = Histogram(
+    "snapshot_consumer_process_duration_seconds", "Time to process one message", buckets=STAGE_BUCKETS
+)
+LAG_SECONDS = Histogram(
+    "snapshot_consumer_lag_seconds",
+    "Time from the producer fetching a snapshot to the consumer processing it",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+)
+LAST_LAG = Gauge("snapshot_consumer_last_lag_seconds", "Lag of the most recently processed message")
 
-HIGH_TEMP_THRESHOLD = float(os.getenv("HIGH_TEMP_THRESHOLD", 35))
-LOW_TEMP_THRESHOLD = float(os.getenv("LOW_TEMP_THRESHOLD", 5))
 
-sqs = boto3.client("sqs", region_name=AWS_REGION)
-s3 = boto3.client("s3")
+def collect_metrics():
+    """Snapshot write counters and queue depth, read at scrape time"""
+    writes = MetricFamily("snapshot_consumer_writes_total", "counter", "Snapshot store writes", ("kind",))
+    for kind, value in writer.stats().items():
+        writes.add(value, kind)
+    families = [writes]
+
+    try:
+        attributes = sqs.get_queue_attributes(
+            QueueUrl=SQS_QUEUE_URL,
+            AttributeNames=["ApproximateNumberOfMessages", "ApproximateNumberOfMessagesNotVisible"]
+        )["Attributes"]
+    except Exception as e:
+        print(f"[Warning] Could not read queue depth: {e}")
+    else:
+        depth = MetricFamily("snapshot_consumer_queue_messages", "gauge", "Messages on the queue", ("state",))
+        depth.add(int(attributes.get("ApproximateNumberOfMessages", 0)), "visible")
+        depth.add(int(attributes.get("ApproximateNumberOfMessagesNotVisible", 0)), "in_flight")
+        families.append(depth)
+    return families
 
-def upload_to_s3(city_name, data, timestamp):
-    key = f"weather_data/{city_name}/{timestamp}.json"
-    s3.put_object(
-        Bucket=BUCKET,
-        Key=key,
-        Body=json.dumps(data),
-        ContentType="application/json"
-    )
-    print(f"[Info] Uploaded data for {city_name} to S3")
 
+REGISTRY.register_collector(collect_metrics)
 
-def store_in_dynamodb(city, timestamp, data):
+
+def build_item(city, timestamp, data, idempotency_key, alert="NORMAL"):
     temp = data["main"]["temp"]
     humidity = data["main"]["humidity"]
     pressure = data["main"]["pressure"]
     weather_main = data["weather"][0]["main"]
 
-    if temp > HIGH_TEMP_THRESHOLD:
-        alert = "HOT"
-    elif temp < LOW_TEMP_THRESHOLD:
-        alert = "COLD"
-    else:
-        alert = "NORMAL"
-
-    table.put_item(
-        Item={
-            "city": city,                    
-            "timestamp": str(timestamp),       # DynamoDB expects string
-            "temp": Decimal(str(temp)),        # Convert float to Decimal
-            "humidity": Decimal(str(humidity)),
-            "pressure": Decimal(str(pressure)),
-            "weather_main": weather_main,
-            "alert_level": alert
-        }
-    )
+    return {
+        "city": city,
+        "timestamp": str(timestamp),       # DynamoDB expects string
+        "temp": Decimal(str(temp)),        # Convert float to Decimal
+        "humidity": Decimal(str(humidity)),
+        "pressure": Decimal(str(pressure)),
+        "weather_main": weather_main,
+        "alert_level": alert,
+        "idempotency_key": idempotency_key
+    }
+
+def canonical_key(city_query):
+    """City key the API resolves this name to, for history and per-city alert rules"""
+    match = cities.resolve(city_query)
+    return match.key if match else fallback_key(city_query)
+
+
+def append_history(key, city_query, data):
+    try:
+        history.append(key, data)
+    except (OSError, KeyError, TypeError, ValueError) as e:
+        print(f"[Warning] Could not append history for {city_query}: {e}")
+
+
+def report_alerts(key, city_query, metrics):
+    """Print alerts that this observation raised or cleared"""
+    for event in alerts.update(key, city_query, metrics):
+        if event["event"] == "raised":
+            print(f"[ALERT] {city_query}: {event['message']} ({event['metric']} {event['value']})")
+        else:
+            print(f"[Info] Alert cleared for {city_query}: {event['rule']} ({event['metric']} {event['value']})")
 
-    print(f"[Info] Stored snapshot in DynamoDB for {city} @ {timestamp}")
 
+def record_lag(body):
+    """Observe how long ago the producer fetched this snapshot"""
+    try:
+        fetched_at = datetime.fromisoformat(body["timestamp"])
+    except (KeyError, TypeError, ValueError):
+        return
+    lag = max(0.0, (datetime.utcnow() - fetched_at).total_seconds())
+    LAG_SECONDS.observe(lag)
+    LAST_LAG.set(lag)
+
+
+@PROCESS_SECONDS.time()
 def process_message(message):
     """
-    Process a single SQS message: validate, upload to S3, store in DynamoDB, and log alerts.
+    Process a single SQS message: validate, log alerts and buffer the
+    snapshot for the next DynamoDB/S3 flush.
+
+    Returns:
+        True if the snapshot was buffered (acknowledge after the flush),
+        False if the message was skipped (acknowledge now)
     """
     try:
         # Parse message
@@ -69,65 +150,261 @@ def process_message(message):
         # Validate required keys
         if "city_key" not in body or "city_query" not in body or "data" not in body:
             print(f"[Warning] Skipping incomplete message: {body}")
-            return
+            return False
 
         city_key = body["city_key"]
         city_query = body["city_query"]
         data = body["data"]
-
-        # Extract temperature for alerts
-        temp = data.get("main", {}).get("temp")
-        if temp is not None:
-            if temp > HIGH_TEMP_THRESHOLD:
-                print(f"[ALERT] {city_query} is hot: {temp}°C")
-            elif temp < LOW_TEMP_THRESHOLD:
-                print(f"[ALERT] {city_query} is cold: {temp}°C")
+        record_lag(body)
 
         # Timestamp for S3 and DynamoDB
         timestamp = datetime.utcnow().strftime("%Y-%m-%d-%H")
 
-        # Upload JSON to S3
-        try:
-            upload_to_s3(city_key, data, timestamp)
-        except Exception as e:
-            print(f"[Warning] Failed to upload to S3 for {city_key}: {e}")
+        # Same observation -> same key, however often the message is delivered
+        idempotency_key = f"{city_key}:{data.get('dt') or body.get('timestamp')}"
 
-        # Store in DynamoDB
+        key = canonical_key(city_query)
         try:
-            store_in_dynamodb(city_key, timestamp, data)
-        except Exception as e:
-            print(f"[Warning] Failed to store in DynamoDB for {city_key}: {e}")
+            metrics = metrics_from_owm(data)
+            fired = alerts.rules.evaluate(metrics, key)
+            item = build_item(city_key, timestamp, data, idempotency_key, fired[0].level if fired else "NORMAL")
+        except (KeyError, IndexError, TypeError) as e:
+            print(f"[Warning] Skipping snapshot with missing fields for {city_key}: {e}")
+            return False
+
+        record = {
+            "idempotency_key": idempotency_key,
+            "city": city_key,
+            "timestamp": timestamp,
+            "data": data
+        }
+        writer.add(message, idempotency_key, item, record, timestamp)
+        append_history(key, city_query, data)
+        report_alerts(key, city_query, metrics)
+        return True
 
     except json.JSONDecodeError as e:
         print(f"[Warning] Malformed message skipped: {message.get('Body')}")
     except Exception as e:
         print(f"[Error] Unexpected error processing message: {e}")
+    return False
+
+
+def chunks(items, size=SQS_MAX_BATCH):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class VisibilityExtender:
+    """
+    Keeps received messages hidden while workers are still processing them.
+
+    A background thread pushes the visibility timeout forward for any
+    message that is within half a timeout of becoming visible again, so a
+    slow message is not redelivered to another consumer mid-flight.
+    """
+
+    def __init__(self, queue_url=SQS_QUEUE_URL, timeout=VISIBILITY_TIMEOUT):
+        self.queue_url = queue_url
+        self.timeout = timeout
+        self.pending = {}  # receipt handle -> time it becomes visible again
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.extended = 0
 
+    def add(self, messages):
+        visible_at = time.time() + self.timeout
+        with self.lock:
+            for message in messages:
+                self.pending[message["ReceiptHandle"]] = visible_at
 
+    def remove(self, message):
+        with self.lock:
+            self.pending.pop(message["ReceiptHandle"], None)
 
-def main():
-    while True:
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def _run(self):
+        while not self.stopped.wait(max(self.timeout / 4, 1)):
+            now = time.time()
+            with self.lock:
+                due = [r for r, visible_at in self.pending.items() if visible_at - now < self.timeout / 2]
+
+            for batch in chunks(due):
+                entries = [
+                    {"Id": str(i), "ReceiptHandle": receipt, "VisibilityTimeout": self.timeout}
+                    for i, receipt in enumerate(batch)
+                ]
+                try:
+                    response = sqs.change_message_visibility_batch(QueueUrl=self.queue_url, Entries=entries)
+                except Exception as e:
+                    print(f"[Warning] Failed to extend visibility: {e}")
+                    continue
+
+                failed = {f["Id"] for f in response.get("Failed", [])}
+                with self.lock:
+                    for entry in entries:
+                        if entry["Id"] not in failed and entry["ReceiptHandle"] in self.pending:
+                            self.pending[entry["ReceiptHandle"]] = now + self.timeout
+                            self.extended += 1
+
+
+def receive_messages(wait_seconds):
+    """
+    Receive up to max(10, CONSUMER_WORKERS) messages
+
+    Only the first call may long-poll; follow-up calls to fill the worker
+    pool return immediately.
+    """
+    target = max(SQS_MAX_BATCH, CONSUMER_WORKERS)
+    messages = []
+    while len(messages) < target:
         response = sqs.receive_message(
             QueueUrl=SQS_QUEUE_URL,
-            MaxNumberOfMessages=5,
-            WaitTimeSeconds=20
+            MaxNumberOfMessages=min(SQS_MAX_BATCH, target - len(messages)),
+            WaitTimeSeconds=wait_seconds if not messages else 0,
+            VisibilityTimeout=VISIBILITY_TIMEOUT
         )
+        received = response.get("Messages", [])
+        messages.extend(received)
+        if len(received) < SQS_MAX_BATCH:
+            break
+    return messages
 
-        messages = response.get("Messages", [])
-        for message in messages:
-            try:
-                process_message(message)
 
-                # Delete message after processing
-                sqs.delete_message(
-                    QueueUrl=SQS_QUEUE_URL,
-                    ReceiptHandle=message["ReceiptHandle"]
-                )
+def delete_messages(messages):
+    """Acknowledge processed messages, ten per request"""
+    deleted = 0
+    for batch in chunks(messages):
+        entries = [
+            {"Id": str(i), "ReceiptHandle": message["ReceiptHandle"]}
+            for i, message in enumerate(batch)
+        ]
+        try:
+            response = sqs.delete_message_batch(QueueUrl=SQS_QUEUE_URL, Entries=entries)
+        except Exception as e:
+            print(f"[Error] Failed to delete {len(entries)} messages: {e}")
+            continue
+        deleted += len(response.get("Successful", []))
+        MESSAGES.labels("deleted").inc(len(response.get("Successful", [])))
+        for failure in response.get("Failed", []):
+            print(f"[Warning] Failed to delete message {failure['Id']}: {failure.get('Code')}")
+    return deleted
+
+
+def flush_snapshots(extender):
+    """Flush buffered snapshots and acknowledge the messages now stored"""
+    stored, failed = writer.flush()
+    MESSAGES.labels("failed").inc(len(failed))
+    for message in stored + failed:
+        # Failed messages become visible again and are redelivered
+        extender.remove(message)
+    return delete_messages(stored), len(failed)
+
+
+def consume_once(executor, extender, wait_seconds):
+    """
+    Receive one round of messages and process them concurrently
+
+    Skipped messages are deleted straight away; buffered snapshots are
+    deleted once a flush has stored them.
+
+    Returns:
+        (received, failed, deleted) message counts
+    """
+    messages = receive_messages(wait_seconds)
+    failed = 0
+    deleted = 0
+
+    if messages:
+        MESSAGES.labels("received").inc(len(messages))
+        extender.add(messages)
+        futures = {executor.submit(process_message, message): message for message in messages}
+        skipped = []
+
+        for future in as_completed(futures):
+            message = futures[future]
+            try:
+                buffered = future.result()
             except Exception as e:
+                # Left on the queue; SQS redelivers it after the visibility timeout
+                failed += 1
+                MESSAGES.labels("failed").inc()
+                extender.remove(message)
                 print(f"[Error] Processing failed: {e}")
+                continue
+            if not buffered:
+                extender.remove(message)
+                skipped.append(message)
+            MESSAGES.labels("buffered" if buffered else "skipped").inc()
+
+        deleted += delete_messages(skipped)
+
+    if writer.due():
+        flushed, flush_failed = flush_snapshots(extender)
+        deleted += flushed
+        failed += flush_failed
+
+    return len(messages), failed, deleted
+
 
-        time.sleep(2)
+def main(drain=False):
+    """
+    Consume snapshot messages until interrupted
+
+    Args:
+        drain: Exit once the queue is empty instead of waiting for more
+    """
+    extender = VisibilityExtender()
+    extender.start()
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT)
+        print(f"[Info] Serving metrics on port {METRICS_PORT}")
+    backlog = False
+    totals = {"received": 0, "failed": 0, "deleted": 0}
+    started = time.time()
+
+    try:
+        with ThreadPoolExecutor(max_workers=CONSUMER_WORKERS) as executor:
+            while True:
+                # Poll straight away while a backlog remains, long-poll otherwise
+                received, failed, deleted = consume_once(
+                    executor, extender, 0 if backlog or drain else LONG_POLL_SECONDS
+                )
+                totals["received"] += received
+                totals["failed"] += failed
+                totals["deleted"] += deleted
+
+                if received:
+                    print(f"[Info] Processed {received} messages ({failed} failed, {deleted} deleted)")
+                backlog = received >= SQS_MAX_BATCH
+
+                if not received:
+                    if drain:
+                        break
+                    time.sleep(IDLE_SLEEP_SECONDS)
+    finally:
+        # Store whatever is still buffered before exiting
+        deleted, failed = flush_snapshots(extender)
+        totals["deleted"] += deleted
+        totals["failed"] += failed
+        extender.stop()
+        elapsed = time.time() - started
+        print(
+            f"[Info] Consumer stopped: {totals['received']} received, {totals['failed']} failed, "
+            f"{totals['deleted']} deleted, {extender.extended} visibility extensions in {elapsed:.1f}s"
+        )
+        print(f"[Info] Snapshot writes: {writer.stats()}")
+        print(f"[Info] History store: {history.stats()}")
+        print(f"[Info] Alerts: {alerts.stats()}")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Weather snapshot SQS consumer")
+    parser.add_argument("--drain", action="store_true", help="exit once the queue is empty")
+    args = parser.parse_args()
+    main(drain=args.drain)
@@ -1,61 +1,190 @@
 import boto3
-import requests
+import csv
 import json
 import os
+import re
+import sys
+import time
+import argparse
 from datetime import datetime
 from dotenv import load_dotenv
 
+# Shared backend modules live one directory up
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from group_fetch import GroupFetcher
+from http_client import get_client
+from rate_limit import TokenBucket
+
 load_dotenv()
 
 API_KEY = os.getenv("OPENWEATHER_API_KEY")
 AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
-SQS_QUEUE_URL = "https://sqs.us-east-1.amazonaws.com/912753427807/trying-sqs"
+SQS_QUEUE_URL = os.getenv("SQS_QUEUE_URL", "https://sqs.us-east-1.amazonaws.com/912753427807/trying-sqs")
+SQS_ENDPOINT_URL = os.getenv("SQS_ENDPOINT_URL") or None
+OWM_BASE_URL = os.getenv("OPENWEATHER_BASE_URL", "https://api.openweathermap.org/data/2.5").rstrip("/")
 
+# Used when no cities file is configured
 CITIES = {
     "kathmandu": "Kathmandu,NP",
     "london": "London,GB",
     "newyork": "New York,US",
 }
 
-sqs = boto3.client("sqs", region_name=AWS_REGION)
-
-def fetch_weather(city_query):
-    try:
-        response = requests.get(
-            f"https://api.openweathermap.org/data/2.5/weather",
-            params={
-                "q": city_query,
-                "appid": API_KEY,
-                "units": "metric"
-            },
-            timeout=10
-        )
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        print(f"[Error] Failed to fetch weather for {city_query}: {e}")
-        return None
-
-def push_to_sqs(city_key, city_query, data):
-    message = {
+SNAPSHOT_CITIES_FILE = os.getenv("SNAPSHOT_CITIES_FILE")
+PRODUCER_WORKERS = int(os.getenv("PRODUCER_WORKERS", 16))
+# Match the OpenWeatherMap plan (the free plan allows 60 calls/minute)
+OWM_CALLS_PER_MINUTE = float(os.getenv("OWM_CALLS_PER_MINUTE", 60))
+OWM_BURST = float(os.getenv("OWM_BURST", 10))
+SQS_MAX_BATCH = 10  # SQS limit for send_message_batch
+SEND_RETRIES = 2
+
+sqs = boto3.client("sqs", region_name=AWS_REGION, endpoint_url=SQS_ENDPOINT_URL)
+client = get_client()
+
+
+def city_key_for(name):
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def load_cities(path):
+    """
+    Load the cities to snapshot from a file
+
+    CSV files need a 'name' column and may have 'country_code' (or
+    'country') and 'key' columns. JavaScript files such as
+    frontend/cities.js are scanned for { name: "...", ... } entries.
+
+    Returns:
+        Dictionary of city key -> OpenWeatherMap query
+    """
+    cities = {}
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".js"):
+            entries = [{"name": name} for name in re.findall(r'name:\s*"([^"]+)"', f.read())]
+        else:
+            entries = list(csv.DictReader(f))
+
+    for entry in entries:
+        name = (entry.get("name") or "").strip()
+        if not name:
+            continue
+        country = (entry.get("country_code") or entry.get("country") or "").strip()
+        key = (entry.get("key") or "").strip() or city_key_for(name)
+        # First entry wins when two cities share a key
+        cities.setdefault(key, f"{name},{country}" if country else name)
+    return cities
+
+
+def build_message(city_key, city_query, data):
+    return {
         "city_key": city_key,
         "city_query": city_query,
         "timestamp": datetime.utcnow().isoformat(),
         "data": data
     }
 
-    sqs.send_message(
-        QueueUrl=SQS_QUEUE_URL,
-        MessageBody=json.dumps(message)
-    )
 
-    print(f"[Info] Sent weather data for {city_query} to SQS")
+def send_batch(messages):
+    """
+    Send up to 10 messages with one send_message_batch call
+
+    Entries the queue rejects are resent up to SEND_RETRIES times.
+
+    Returns:
+        (sent, failed) message counts
+    """
+    entries = {str(i): json.dumps(message) for i, message in enumerate(messages)}
+    sent = 0
+
+    for attempt in range(SEND_RETRIES + 1):
+        try:
+            response = sqs.send_message_batch(
+                QueueUrl=SQS_QUEUE_URL,
+                Entries=[{"Id": entry_id, "MessageBody": body} for entry_id, body in entries.items()]
+            )
+        except Exception as e:
+            print(f"[Error] Failed to send batch of {len(entries)} messages: {e}")
+            continue
+
+        sent += len(response.get("Successful", []))
+        failed = response.get("Failed", [])
+        for failure in failed:
+            print(f"[Warning] SQS rejected message {failure['Id']}: {failure.get('Code')}")
+        # Sender faults (e.g. a message that is too large) will not succeed on retry
+        entries = {
+            f["Id"]: entries[f["Id"]] for f in failed if not f.get("SenderFault")
+        }
+        if not entries:
+            break
+
+    return sent, len(messages) - sent
+
+
+def run(cities):
+    """
+    Fetch every city under the rate limit and queue the results
+
+    Cities with a known OpenWeatherMap ID are fetched 20 per /group call;
+    the others are fetched by name, which records their ID for next run.
+
+    Returns:
+        Dictionary of per-run statistics
+    """
+    bucket = TokenBucket.per_minute(OWM_CALLS_PER_MINUTE, OWM_BURST)
+    fetcher = GroupFetcher(client, API_KEY, OWM_BASE_URL, rate_limiter=bucket, workers=PRODUCER_WORKERS)
+    stats = {"cities": len(cities), "fetched": 0, "fetch_failed": 0, "sent": 0, "send_failed": 0, "batches": 0}
+    started = time.time()
+
+    outcomes = fetcher.fetch_many(list(cities.values()))
+
+    pending = []
+    for city_key, city_query in cities.items():
+        data = outcomes[city_query]
+        if isinstance(data, Exception):
+            print(f"[Error] Failed to fetch weather for {city_query}: {data}")
+            stats["fetch_failed"] += 1
+            continue
+        stats["fetched"] += 1
+        pending.append(build_message(city_key, city_query, data))
+
+    for start in range(0, len(pending), SQS_MAX_BATCH):
+        sent, failed = send_batch(pending[start:start + SQS_MAX_BATCH])
+        stats["sent"] += sent
+        stats["send_failed"] += failed
+        stats["batches"] += 1
+
+    elapsed = time.time() - started
+    group_stats = fetcher.stats()
+    stats["elapsed_seconds"] = round(elapsed, 2)
+    stats["cities_per_second"] = round(stats["fetched"] / elapsed, 2) if elapsed else 0.0
+    stats["upstream_calls"] = group_stats["group_requests"] + group_stats["single_requests"]
+    stats["cities_via_group"] = group_stats["cities_via_group"]
+    stats["rate_limit_wait_seconds"] = round(bucket.waited, 2)
+    stats["upstream"] = client.stats()
+    return stats
+
 
 def main():
-    for city_key, city_query in CITIES.items():
-        data = fetch_weather(city_query)
-        if data:
-            push_to_sqs(city_key, city_query, data)
+    parser = argparse.ArgumentParser(description="Weather snapshot producer")
+    parser.add_argument("--cities", default=SNAPSHOT_CITIES_FILE, help="CSV or cities.js file with the cities to snapshot")
+    parser.add_argument("--json", action="store_true", help="print run statistics as JSON")
+    args = parser.parse_args()
+
+    cities = load_cities(args.cities) if args.cities else CITIES
+    print(f"[Info] Snapshotting {len(cities)} cities at up to {OWM_CALLS_PER_MINUTE:g} calls/minute")
+    stats = run(cities)
+
+    if args.json:
+        print(json.dumps(stats, indent=2))
+    else:
+        print(
+            f"[Info] Sent {stats['sent']}/{stats['cities']} cities in {stats['batches']} batches "
+            f"({stats['fetch_failed']} fetch failures, {stats['send_failed']} send failures) "
+            f"with {stats['upstream_calls']} API calls in {stats['elapsed_seconds']}s, "
+            f"{stats['cities_per_second']} cities/s"
+        )
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,208 @@
+"""
+Snapshot Writer
+Buffers weather snapshots and writes them to DynamoDB and S3 in batches
+"""
+import json
+import os
+import time
+import uuid
+import random
+import threading
+from collections import OrderedDict
+
+import boto3
+
+
+DYNAMODB_MAX_BATCH = 25  # batch_write_item limit
+
+
+class SnapshotWriteError(Exception):
+    """Raised when a batch could not be written after all retries"""
+
+
+class RecentKeys:
+    """Bounded, insertion-ordered set of idempotency keys"""
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.keys = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def add(self, key):
+        self.keys[key] = None
+        self.keys.move_to_end(key)
+        if len(self.keys) > self.capacity:
+            self.keys.popitem(last=False)
+
+
+class SnapshotWriter:
+    """
+    Collects snapshots from consumer workers and flushes them in bulk.
+
+    DynamoDB items go out through batch_write_item, 25 per request, with
+    unprocessed items retried using jittered backoff. S3 records are grouped
+    into one newline-delimited JSON object per hour per flush instead of one
+    object per city.
+
+    Every snapshot carries an idempotency key. Items are keyed by
+    (city, hour) so a redelivered message overwrites rather than duplicates
+    its row, and keys already written to a sink are remembered so a retry
+    after a partial failure only writes what is missing. The SQS messages
+    behind a snapshot are returned by flush() once both sinks have it, and
+    only then should they be deleted.
+    """
+
+    def __init__(self, bucket=None, table_name=None, region=None, max_records=None,
+                 max_bytes=None, interval=None, max_retries=None):
+        self.bucket = bucket or os.getenv("WEATHER_BUCKET_NAME", "weather-bucket-for-verisk-internship")
+        self.table_name = table_name or os.getenv("DYNAMODB_TABLE_NAME", "WeatherSnapshots")
+        self.max_records = max_records or int(os.getenv("SNAPSHOT_FLUSH_MAX_RECORDS", 500))
+        self.max_bytes = max_bytes or int(os.getenv("SNAPSHOT_FLUSH_MAX_BYTES", 5 * 1024 * 1024))
+        self.interval = interval or float(os.getenv("SNAPSHOT_FLUSH_INTERVAL_SECONDS", 30))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("SNAPSHOT_WRITE_RETRIES", 5))
+
+        region = region or os.getenv("AWS_REGION", "us-east-1")
+        self.dynamodb = boto3.resource("dynamodb", region_name=region)
+        self.s3 = boto3.client("s3", region_name=region)
+
+        self.lock = threading.Lock()
+        self.records = {}  # idempotency key -> (item, line, hour)
+        self.messages = []  # (idempotency key, SQS message)
+        self.buffered_bytes = 0
+        self.oldest = None
+        self.written = {"dynamodb": RecentKeys(), "s3": RecentKeys()}
+
+        self.items_written = 0
+        self.objects_written = 0
+        self.write_retries = 0
+        self.flush_errors = 0
+
+    def add(self, message, key, item, record, hour):
+        """
+        Buffer one snapshot (called from worker threads)
+
+        Args:
+            message: SQS message to acknowledge once the snapshot is stored
+            key: Idempotency key
+            item: DynamoDB item
+            record: JSON-serializable S3 record
+            hour: Hour partition (YYYY-MM-DD-HH)
+        """
+        line = json.dumps(record)
+        with self.lock:
+            if key not in self.records:
+                self.buffered_bytes += len(line) + 1
+            # A duplicate in the same flush replaces the earlier copy
+            self.records[key] = (item, line, hour)
+            self.messages.append((key, message))
+            if self.oldest is None:
+                self.oldest = time.time()
+
+    def due(self):
+        """Whether the buffer has reached its size or age threshold"""
+        with self.lock:
+            if not self.records:
+                return False
+            return (
+                len(self.records) >= self.max_records
+                or self.buffered_bytes >= self.max_bytes
+                or time.time() - self.oldest >= self.interval
+            )
+
+    def flush(self):
+        """
+        Write everything buffered to DynamoDB and S3
+
+        Returns:
+            (stored, failed) lists of SQS messages; failed ones should be
+            left on the queue so they are redelivered
+        """
+        with self.lock:
+            records, self.records = self.records, {}
+            messages, self.messages = self.messages, []
+            self.buffered_bytes = 0
+            self.oldest = None
+
+        if not records:
+            return [m for _, m in messages], []
+
+        try:
+            self._write_dynamodb(records)
+            self._write_s3(records)
+        except Exception as e:
+            self.flush_errors += 1
+            print(f"[Error] Snapshot flush failed: {e}")
+
+        stored, failed = [], []
+        for key, message in messages:
+            if key in self.written["dynamodb"] and key in self.written["s3"]:
+                stored.append(message)
+            else:
+                failed.append(message)
+
+        print(f"[Info] Flushed {len(records)} snapshots ({len(failed)} messages left for redelivery)")
+        return stored, failed
+
+    def _write_dynamodb(self, records):
+        # Items are keyed by (city, timestamp): two observations of a city in
+        # the same hour are one row, and batch_write_item rejects a batch that
+        # puts the same key twice. The latest observation wins.
+        pending = {}
+        for key, (item, _, _) in records.items():
+            if key in self.written["dynamodb"]:
+                continue
+            item_key = (item["city"], item["timestamp"])
+            keys = pending.pop(item_key, ([], None))[0]
+            pending[item_key] = (keys + [key], item)
+        pending = list(pending.values())
+
+        for start in range(0, len(pending), DYNAMODB_MAX_BATCH):
+            batch = pending[start:start + DYNAMODB_MAX_BATCH]
+            requests = [{"PutRequest": {"Item": item}} for _, item in batch]
+            attempt = 0
+
+            while requests:
+                response = self.dynamodb.batch_write_item(RequestItems={self.table_name: requests})
+                requests = response.get("UnprocessedItems", {}).get(self.table_name, [])
+                if not requests:
+                    break
+                if attempt >= self.max_retries:
+                    raise SnapshotWriteError(f"{len(requests)} DynamoDB items still unprocessed")
+                # Unprocessed items mean throttling; back off before resending them
+                self.write_retries += 1
+                time.sleep(random.uniform(0, min(5, 0.1 * 2 ** attempt)))
+                attempt += 1
+
+            for keys, _ in batch:
+                for key in keys:
+                    self.written["dynamodb"].add(key)
+            self.items_written += len(batch)
+
+    def _write_s3(self, records):
+        by_hour = {}
+        for key, (_, line, hour) in records.items():
+            if key not in self.written["s3"]:
+                by_hour.setdefault(hour, []).append((key, line))
+
+        for hour, lines in sorted(by_hour.items()):
+            object_key = f"weather_data/hourly/{hour}/{int(time.time())}-{uuid.uuid4().hex[:8]}.ndjson"
+            self.s3.put_object(
+                Bucket=self.bucket,
+                Key=object_key,
+                Body="\n".join(line for _, line in lines) + "\n",
+                ContentType="application/x-ndjson"
+            )
+            for key, _ in lines:
+                self.written["s3"].add(key)
+            self.objects_written += 1
+            print(f"[Info] Uploaded {len(lines)} snapshots to s3://{self.bucket}/{object_key}")
+
+    def stats(self):
+        return {
+            "items_written": self.items_written,
+            "objects_written": self.objects_written,
+            "write_retries": self.write_retries,
+            "flush_errors": self.flush_errors
+        }
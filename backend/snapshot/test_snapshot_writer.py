@@ -0,0 +1,67 @@
+"""
+Snapshot Writer Tests
+Run with: python -m pytest snapshot/test_snapshot_writer.py
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from snapshot_writer import SnapshotWriter
+
+
+class FakeDynamoDB:
+    """batch_write_item that rejects duplicate keys in one batch, as DynamoDB does"""
+
+    def __init__(self):
+        self.rows = {}
+
+    def batch_write_item(self, RequestItems):
+        for requests in RequestItems.values():
+            keys = [(r["PutRequest"]["Item"]["city"], r["PutRequest"]["Item"]["timestamp"]) for r in requests]
+            if len(keys) != len(set(keys)):
+                raise ValueError("ValidationException: Provided list of item keys contains duplicates")
+            for request, key in zip(requests, keys):
+                self.rows[key] = request["PutRequest"]["Item"]
+        return {"UnprocessedItems": {}}
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, ContentType):
+        self.objects[Key] = Body
+
+
+class SnapshotWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.writer = SnapshotWriter(region="us-east-1", max_retries=0)
+        self.writer.dynamodb = FakeDynamoDB()
+        self.writer.s3 = FakeS3()
+
+    def add(self, message, dt, temperature):
+        key = f"london-gb:{dt}"
+        item = {"city": "london-gb", "timestamp": "2024-01-01-10", "temperature": str(temperature),
+                "idempotency_key": key}
+        self.writer.add(message, key, item, dict(item), "2024-01-01-10")
+
+    def test_same_hour_observations_are_one_item(self):
+        self.add("m1", 1704103200, 10)
+        self.add("m2", 1704104400, 12)
+
+        stored, failed = self.writer.flush()
+
+        self.assertEqual(stored, ["m1", "m2"])
+        self.assertEqual(failed, [])
+        # The later observation wins
+        self.assertEqual(self.writer.dynamodb.rows[("london-gb", "2024-01-01-10")]["temperature"], "12")
+        self.assertEqual(self.writer.stats()["items_written"], 1)
+        # S3 keeps both observations
+        (body,) = self.writer.s3.objects.values()
+        self.assertEqual(len(body.splitlines()), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
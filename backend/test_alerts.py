@@ -0,0 +1,138 @@
+"""
+Alerts Tests
+Run with: python -m pytest test_alerts.py
+"""
+import json
+
+import pytest
+
+from alerts import AlertIndex, AlertRules, AlertSubscription, format_event, metrics_from_owm
+
+
+@pytest.fixture
+def index(monkeypatch):
+    """Alerts above 30°C, below 0°C and above 17.2 m/s wind"""
+    monkeypatch.delenv('HIGH_HUMIDITY_THRESHOLD', raising=False)
+    monkeypatch.delenv('ALERT_RULES_FILE', raising=False)
+    monkeypatch.setenv('HIGH_WIND_THRESHOLD', '17.2')
+    return AlertIndex(AlertRules.from_env(high_temp=30, low_temp=0))
+
+
+def observe(index, city, temperature, wind_speed=1):
+    return index.update(city, city.title(), {'temperature': temperature, 'wind_speed': wind_speed})
+
+
+def test_alert_is_raised_once(index):
+    events = observe(index, 'dubai', 40)
+
+    assert [(e['event'], e['rule'], e['level']) for e in events] == [('raised', 'high_temp', 'HOT')]
+    assert observe(index, 'dubai', 41) == []
+    assert index.current()[0]['value'] == 41
+
+
+def test_alert_is_cleared_when_rule_stops_firing(index):
+    observe(index, 'dubai', 40)
+
+    events = observe(index, 'dubai', 25)
+
+    assert [(e['event'], e['rule']) for e in events] == [('cleared', 'high_temp')]
+    assert events[0]['value'] == 25
+    assert 'until' in events[0]
+    assert index.current() == []
+
+
+def test_one_observation_can_raise_and_clear(index):
+    observe(index, 'oslo', -5)
+
+    events = observe(index, 'oslo', 5, wind_speed=20)
+
+    assert [(e['event'], e['rule']) for e in events] == [('raised', 'high_wind'), ('cleared', 'low_temp')]
+    stats = index.stats()
+    assert (stats['raised'], stats['cleared'], stats['active']) == (2, 1, 1)
+
+
+def test_per_city_rule_overrides_general_rule(tmp_path, monkeypatch):
+    rules_file = tmp_path / 'rules.json'
+    rules_file.write_text(json.dumps([
+        {'name': 'high_temp', 'metric': 'temperature', 'above': 45, 'cities': ['dubai']}
+    ]))
+    monkeypatch.setenv('ALERT_RULES_FILE', str(rules_file))
+    index = AlertIndex(AlertRules.from_env(high_temp=30, low_temp=0))
+
+    assert observe(index, 'dubai', 40) == []
+    assert [e['rule'] for e in observe(index, 'phoenix', 40)] == ['high_temp']
+
+
+def test_current_filters_by_city(index):
+    observe(index, 'dubai', 40)
+    observe(index, 'oslo', -5)
+
+    assert [a['city'] for a in index.current({'oslo'})] == ['oslo']
+    assert [a['event'] for a in index.snapshot()] == ['active', 'active']
+
+
+def test_subscribers_get_only_their_cities(index):
+    everything = index.subscribe(AlertSubscription())
+    oslo_only = index.subscribe(AlertSubscription(cities={'oslo'}))
+
+    observe(index, 'dubai', 40)
+    observe(index, 'oslo', -5)
+
+    assert [everything.get_nowait()['city'] for _ in range(2)] == ['dubai', 'oslo']
+    assert oslo_only.get_nowait()['city'] == 'oslo'
+    assert oslo_only.get_nowait() is None
+
+
+def test_unchanged_alerts_are_not_delivered(index):
+    subscription = index.subscribe(AlertSubscription())
+    observe(index, 'dubai', 40)
+    subscription.get_nowait()
+
+    observe(index, 'dubai', 41)
+
+    assert subscription.get_nowait() is None
+
+
+def test_subscriber_that_falls_behind_is_dropped(index):
+    subscription = index.subscribe(AlertSubscription(max_pending=1))
+
+    observe(index, 'dubai', 40)
+    observe(index, 'oslo', -5)
+
+    assert subscription.closed
+    assert index.stats()['subscribers'] == 0
+    assert index.stats()['dropped_subscribers'] == 1
+
+
+def test_failing_subscriber_does_not_block_others(index):
+    def broken_wake():
+        raise RuntimeError('event loop is closed')
+
+    broken = index.subscribe(AlertSubscription(wake=broken_wake))
+    healthy = index.subscribe(AlertSubscription())
+
+    observe(index, 'dubai', 40)
+
+    assert broken.closed
+    assert healthy.get_nowait()['city'] == 'dubai'
+
+
+def test_format_event_is_a_server_sent_event():
+    event = {'event': 'raised', 'city': 'dubai', 'rule': 'high_temp'}
+
+    frame = format_event(event)
+
+    event_line, data_line, blank, end = frame.split('\n')
+    assert event_line == 'event: raised'
+    assert json.loads(data_line[len('data: '):]) == event
+    assert (blank, end) == ('', '')
+
+
+def test_metrics_from_owm():
+    data = {'main': {'temp': 21.5, 'humidity': 40}, 'wind': {'speed': 3}}
+
+    metrics = metrics_from_owm(data)
+
+    assert metrics['temperature'] == 21.5
+    assert metrics['wind_speed'] == 3
+    assert metrics['feels_like'] is None
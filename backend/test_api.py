@@ -3,16 +3,20 @@ OpenWeatherMap API Test Script
 Tests the API key and shows detailed responses
 """
 import os
-import requests
 import json
 from datetime import datetime
 from dotenv import load_dotenv
 
+from http_client import get_client
+
 # Load environment variables
 load_dotenv()
 
 API_KEY = os.getenv('OPENWEATHER_API_KEY')
-BASE_URL = 'https://api.openweathermap.org/data/2.5'
+BASE_URL = os.getenv('OPENWEATHER_BASE_URL', 'https://api.openweathermap.org/data/2.5')
+
+# Reuse one pooled session across all test requests
+client = get_client()
 
 def print_section(title):
     """Print a section header"""
@@ -40,7 +44,7 @@ def test_api_key_status():
     print("\nSending request...\n")
     
     try:
-        response = requests.get(url, params=params, timeout=10)
+        response = client.get(url, params=params)
         
         print(f"Status Code: {response.status_code}")
         print(f"Status: {'✅ SUCCESS' if response.status_code == 200 else '❌ FAILED'}")
@@ -74,7 +78,7 @@ def test_weather_request(city):
     }
     
     try:
-        response = requests.get(url, params=params, timeout=10)
+        response = client.get(url, params=params)
         
         print(f"Request URL: {response.url}")
         print(f"Status Code: {response.status_code}")
@@ -121,7 +125,7 @@ def test_forecast_request(city):
     }
     
     try:
-        response = requests.get(url, params=params, timeout=10)
+        response = client.get(url, params=params)
         
         print(f"Request URL: {response.url}")
         print(f"Status Code: {response.status_code}")
@@ -0,0 +1,106 @@
+"""
+Async Weather Service Tests
+Run with: python -m pytest test_async_weather_service.py
+"""
+import json
+import time
+import asyncio
+import threading
+
+import pytest
+
+from devtools.fake_redis import FakeRedisServer
+from devtools.mock_owm import MockOWMServer
+
+
+@pytest.fixture
+def redis_server():
+    server = FakeRedisServer(port=0)
+    server.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def owm_server():
+    server = MockOWMServer(port=0)
+    server.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def service(redis_server, owm_server, monkeypatch, tmp_path):
+    monkeypatch.setenv('CACHE_BACKEND', 'redis')
+    monkeypatch.setenv('REDIS_URL', f'redis://127.0.0.1:{redis_server.server_address[1]}/0')
+    monkeypatch.setenv('OPENWEATHER_BASE_URL', owm_server.base_url())
+    monkeypatch.setenv('UPSTREAM_MAX_RETRIES', '0')
+    monkeypatch.setenv('CITY_INDEX_PATH', str(tmp_path / 'city_index.sqlite3'))
+    monkeypatch.setenv('CITY_ID_MAP_PATH', str(tmp_path / 'city_ids.json'))
+    monkeypatch.setenv('HISTORY_STORE_PATH', str(tmp_path / 'history'))
+
+    from async_weather_service import AsyncWeatherService
+    service = AsyncWeatherService('test-key')
+    yield service
+    service.cache.close()
+
+
+def record_backend_threads(backend):
+    """Wrap the backend's store calls to note which thread made each one"""
+    threads = []
+    for name in ('get', 'set'):
+        def call(*args, _original=getattr(backend, name), **kwargs):
+            threads.append(threading.current_thread())
+            return _original(*args, **kwargs)
+        setattr(backend, name, call)
+    return threads
+
+
+def run(service, coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await service.close()
+    return asyncio.run(main())
+
+
+def test_shared_cache_reads_and_writes_run_off_the_event_loop(service, redis_server):
+    assert service.blocking_lookups
+    threads = record_backend_threads(service.cache.backend)
+
+    async def fetch():
+        weather = await service.get_current_weather_async('London')
+        forecast = await service.get_forecast_async('Paris')
+        return weather, forecast
+
+    weather, forecast = run(service, fetch())
+
+    assert weather['city'] == 'London'
+    assert forecast['forecast']
+    assert 'weather:weather_london-gb' in redis_server.store.data
+    assert 'weather:forecast_paris-fr' in redis_server.store.data
+    assert threads
+    # asyncio.run() drives the event loop on the main thread
+    assert threading.main_thread() not in threads
+
+
+def test_stale_fallback_runs_off_the_event_loop(service, owm_server):
+    now = time.time()
+    stale = {'city': 'London', 'temperature': 11.0}
+    service.cache.backend.set('weather_london-gb', json.dumps({
+        'value': stale,
+        'soft_expiry': now - 120,
+        'stale_expiry': now - 60,
+        'hard_expiry': now + 600
+    }), 600)
+    owm_server.error_rate = 1.0
+    threads = record_backend_threads(service.cache.backend)
+
+    weather = run(service, service.get_current_weather_async('London'))
+
+    assert weather == dict(stale, stale=True)
+    assert threads
+    assert threading.main_thread() not in threads
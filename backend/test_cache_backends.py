@@ -0,0 +1,160 @@
+"""
+Cache Backends Tests
+Run with: python -m pytest test_cache_backends.py
+"""
+import pytest
+
+import cache_layer
+import cache_backends
+from cache_backends import CacheBackendError, RedisCacheBackend, SharedWeatherCache, SQLiteCacheBackend
+from devtools.fake_redis import FakeRedisServer
+
+
+class FlakyBackend:
+    """Wraps a backend and raises CacheBackendError while down is set"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.down = False
+        self.calls = 0
+
+    def __getattr__(self, name):
+        method = getattr(self.backend, name)
+
+        def call(*args):
+            self.calls += 1
+            if self.down:
+                raise CacheBackendError('connection refused')
+            return method(*args)
+        return call
+
+
+@pytest.fixture
+def settings(monkeypatch, clock):
+    """Fake clock for both modules; fresh for 60s, kept 300s more for get_stale()"""
+    monkeypatch.setattr(cache_layer, 'time', clock)
+    monkeypatch.setattr(cache_backends, 'time', clock)
+    monkeypatch.setenv('CACHE_TTL_SECONDS', '60')
+    monkeypatch.setenv('CACHE_STALE_TTL_SECONDS', '0')
+    monkeypatch.setenv('CACHE_STALE_IF_ERROR_SECONDS', '300')
+    monkeypatch.setenv('CACHE_BACKEND_RETRY_SECONDS', '30')
+
+
+@pytest.fixture
+def sqlite_path(tmp_path):
+    return tmp_path / 'weather_cache.sqlite3'
+
+
+def make_shared(backend):
+    return SharedWeatherCache(backend, sweep_interval=0)
+
+
+def test_workers_share_entries_through_sqlite(settings, sqlite_path):
+    writer = make_shared(SQLiteCacheBackend(sqlite_path))
+    reader = make_shared(SQLiteCacheBackend(sqlite_path))
+
+    writer.set('london', {'temp': 12})
+
+    assert reader.get('london') == {'temp': 12}
+    assert reader.stats()['hits'] == 1
+
+
+def test_expired_shared_entry_is_a_miss_but_served_stale(settings, sqlite_path, clock):
+    cache = make_shared(SQLiteCacheBackend(sqlite_path))
+    cache.set('london', {'temp': 12})
+
+    clock.advance(61)
+
+    assert cache.get('london') is None
+    assert cache.get_stale('london') == {'temp': 12}
+
+
+def test_backend_error_falls_back_to_local_copy(settings, sqlite_path):
+    backend = FlakyBackend(SQLiteCacheBackend(sqlite_path))
+    cache = make_shared(backend)
+    cache.set('london', {'temp': 12})
+
+    backend.down = True
+
+    assert cache.get('london') == {'temp': 12}
+    assert cache.get('london') == {'temp': 12}
+    stats = cache.stats()
+    assert stats['available'] is False
+    assert stats['errors'] == 1
+    assert stats['fallback_reads'] == 1
+
+
+def test_backend_is_not_called_while_marked_down(settings, sqlite_path, clock):
+    backend = FlakyBackend(SQLiteCacheBackend(sqlite_path))
+    cache = make_shared(backend)
+    backend.down = True
+    cache.get('london')
+    calls = backend.calls
+
+    clock.advance(29)
+    cache.set('paris', {'temp': 15})
+    cache.get('paris')
+
+    assert backend.calls == calls
+    assert cache.get('paris') == {'temp': 15}
+
+
+def test_backend_is_retried_after_retry_interval(settings, sqlite_path, clock):
+    backend = FlakyBackend(SQLiteCacheBackend(sqlite_path))
+    cache = make_shared(backend)
+    backend.down = True
+    cache.get('london')
+
+    backend.down = False
+    clock.advance(30)
+    cache.set('london', {'temp': 12})
+
+    other = make_shared(SQLiteCacheBackend(sqlite_path))
+    assert other.get('london') == {'temp': 12}
+    assert cache.stats()['available'] is True
+
+
+def test_remove_expired_sweeps_backend_rows(settings, sqlite_path, clock):
+    backend = SQLiteCacheBackend(sqlite_path)
+    cache = make_shared(backend)
+    cache.set('london', {'temp': 12})
+    clock.advance(200)
+    cache.set('paris', {'temp': 15})
+
+    clock.advance(200)
+    cache.remove_expired()
+
+    rows = backend._connection().execute('SELECT key FROM cache').fetchall()
+    assert rows == [('paris',)]
+    assert cache.local.stats()['entries'] == 1
+
+
+@pytest.fixture
+def redis_server():
+    server = FakeRedisServer(port=0)
+    server.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_redis_backend_round_trip_and_clear(redis_server):
+    url = f'redis://127.0.0.1:{redis_server.server_address[1]}/0'
+    backend = RedisCacheBackend(url)
+    other = RedisCacheBackend(url, prefix='other:')
+    backend.set('london', 'cached', 60)
+    other.set('london', 'kept', 60)
+
+    assert backend.get('london') == 'cached'
+
+    backend.clear()
+
+    assert backend.get('london') is None
+    assert other.get('london') == 'kept'
+
+
+def test_unreachable_redis_raises_backend_error():
+    backend = RedisCacheBackend('redis://127.0.0.1:1/0', timeout=0.2)
+
+    with pytest.raises(CacheBackendError):
+        backend.get('london')
@@ -0,0 +1,358 @@
+"""
+Cache Layer Tests
+Run with: python -m pytest test_cache_layer.py
+"""
+import threading
+
+import pytest
+
+import cache_layer
+from cache_layer import NegativeCache, ShardedWeatherCache, WeatherCache, estimate_size
+from http_cache import render_json
+
+
+@pytest.fixture
+def make_cache(monkeypatch, clock):
+    """
+    Build WeatherCaches on a fake clock: fresh for 60s, served stale for
+    30s more, and kept for get_stale() until 300s past the soft TTL
+    """
+    monkeypatch.setattr(cache_layer, 'time', clock)
+    monkeypatch.setenv('CACHE_TTL_SECONDS', '60')
+    monkeypatch.setenv('CACHE_STALE_TTL_SECONDS', '30')
+    monkeypatch.setenv('CACHE_STALE_IF_ERROR_SECONDS', '300')
+    monkeypatch.setenv('CACHE_REFRESH_AHEAD_SECONDS', '0')
+
+    def make(**kwargs):
+        kwargs.setdefault('sweep_interval', 0)
+        return WeatherCache(**kwargs)
+
+    return make
+
+
+def recording_refresh():
+    """A refresh callback that only records that it ran"""
+    ran = threading.Event()
+    return ran, ran.set
+
+
+def test_fresh_entry_is_a_hit(make_cache, clock):
+    cache = make_cache()
+    cache.set('london', {'temp': 12})
+
+    clock.advance(59)
+
+    assert cache.get('london') == {'temp': 12}
+    assert cache.stats()['hits'] == 1
+
+
+def test_stale_entry_needs_a_refresh_callback(make_cache, clock):
+    cache = make_cache()
+    cache.set('london', {'temp': 12})
+
+    clock.advance(70)
+
+    assert cache.get('london') is None
+    assert cache.stats()['misses'] == 1
+
+
+def test_stale_entry_is_served_and_refreshed_in_background(make_cache, clock):
+    cache = make_cache()
+    cache.set('london', {'temp': 12})
+    ran, refresh = recording_refresh()
+
+    clock.advance(70)
+
+    assert cache.get('london', refresh) == {'temp': 12}
+    assert ran.wait(5)
+    assert cache.stats()['stale_hits'] == 1
+
+
+def test_fresh_hit_does_not_refresh(make_cache, clock):
+    cache = make_cache()
+    cache.set('london', {'temp': 12})
+    ran, refresh = recording_refresh()
+
+    assert cache.get('london', refresh) == {'temp': 12}
+    assert not ran.wait(0.2)
+
+
+def test_past_stale_window_is_a_miss(make_cache, clock):
+    cache = make_cache()
+    cache.set('london', {'temp': 12})
+    ran, refresh = recording_refresh()
+
+    clock.advance(90)
+
+    assert cache.get('london', refresh) is None
+    assert not ran.is_set()
+
+
+def test_get_stale_serves_until_hard_expiry(make_cache, clock):
+    cache = make_cache()
+    cache.set('london', {'temp': 12})
+
+    clock.advance(359)
+    assert cache.get_stale('london') == {'temp': 12}
+
+    clock.advance(1)
+    assert cache.get_stale('london') is None
+    assert cache.stats()['stale_if_error_hits'] == 1
+
+
+def test_get_past_hard_expiry_drops_entry(make_cache, clock):
+    cache = make_cache()
+    cache.set('london', {'temp': 12})
+
+    clock.advance(360)
+
+    assert cache.get('london') is None
+    stats = cache.stats()
+    assert stats['entries'] == 0
+    assert stats['bytes'] == 0
+    assert stats['expirations'] == 1
+
+
+def test_remove_expired_sweeps_only_hard_expired(make_cache, clock):
+    cache = make_cache()
+    cache.set('london', {'temp': 12})
+    clock.advance(200)
+    cache.set('paris', {'temp': 15})
+
+    clock.advance(200)
+    cache.remove_expired()
+
+    assert cache.get_stale('london') is None
+    assert cache.get_stale('paris') == {'temp': 15}
+    assert cache.stats()['expirations'] == 1
+
+
+def test_hot_key_is_refreshed_ahead_of_expiry(make_cache, clock, monkeypatch):
+    monkeypatch.setenv('CACHE_REFRESH_AHEAD_SECONDS', '10')
+    monkeypatch.setenv('CACHE_HOT_THRESHOLD', '2')
+    cache = make_cache()
+    cache.set('london', {'temp': 12})
+    ran, refresh = recording_refresh()
+
+    cache.get('london', refresh)
+    clock.advance(55)
+    cache.get('london', refresh)
+
+    assert ran.wait(5)
+
+
+def test_lru_evicts_least_recently_used(make_cache):
+    cache = make_cache(max_entries=2, policy='lru')
+    cache.set('london', 1)
+    cache.set('paris', 2)
+    cache.get('london')
+
+    cache.set('berlin', 3)
+
+    assert cache.get('paris') is None
+    assert cache.get('london') == 1
+    assert cache.get('berlin') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_lfu_evicts_least_frequently_used(make_cache):
+    cache = make_cache(max_entries=2, policy='lfu')
+    cache.set('london', 1)
+    cache.set('paris', 2)
+    cache.get('london')
+    cache.get('london')
+    cache.get('paris')
+
+    cache.set('berlin', 3)
+
+    assert cache.get('paris') is None
+    assert cache.get('london') == 1
+
+
+def test_lfu_keeps_frequency_when_key_is_refreshed(make_cache):
+    cache = make_cache(max_entries=2, policy='lfu')
+    cache.set('london', 1)
+    cache.get('london')
+    cache.get('london')
+    cache.set('paris', 2)
+    cache.set('london', 10)
+
+    cache.set('berlin', 3)
+
+    assert cache.get('paris') is None
+    assert cache.get('london') == 10
+
+
+def test_unknown_policy_is_rejected(make_cache):
+    with pytest.raises(ValueError):
+        make_cache(policy='fifo')
+
+
+def test_bytes_track_entry_sizes(make_cache):
+    cache = make_cache()
+    values = {'london': {'temp': 12}, 'paris': {'temp': 15, 'city': 'Paris'}}
+    for key, value in values.items():
+        cache.set(key, value)
+
+    assert cache.stats()['bytes'] == sum(estimate_size(v) for v in values.values())
+
+    cache.set('london', {'temp': 12.5})
+    assert cache.stats()['bytes'] == estimate_size({'temp': 12.5}) + estimate_size(values['paris'])
+
+    cache.clear()
+    assert cache.stats()['bytes'] == 0
+
+
+def test_max_bytes_evicts_to_fit(make_cache):
+    value = {'data': 'x' * 40}
+    size = estimate_size(value)
+    cache = make_cache(max_bytes=size * 2, policy='lru')
+    cache.set('london', value)
+    cache.set('paris', value)
+
+    cache.set('berlin', value)
+
+    stats = cache.stats()
+    assert stats['entries'] == 2
+    assert stats['bytes'] <= size * 2
+    assert stats['evictions'] == 1
+    assert cache.get('london') is None
+
+
+def test_value_larger_than_max_bytes_is_not_cached(make_cache):
+    cache = make_cache(max_bytes=100)
+    cache.set('london', {'temp': 12})
+
+    cache.set('paris', {'data': 'x' * 200})
+
+    assert cache.get('paris') is None
+    assert cache.get('london') == {'temp': 12}
+    assert cache.stats()['evictions'] == 0
+
+
+def test_rendered_response_counts_toward_bytes(make_cache):
+    cache = make_cache()
+    value = {'temp': 12}
+    cache.set('london', value)
+
+    first = cache.rendered('london', value, render_json)
+    again = cache.rendered('london', value, render_json)
+
+    assert again is first
+    stats = cache.stats()
+    assert stats['bytes'] == estimate_size(value) + first.size
+    assert (stats['renders'], stats['render_hits']) == (1, 1)
+
+    cache.set('london', {'temp': 13})
+    assert cache.stats()['bytes'] == estimate_size({'temp': 13})
+
+
+@pytest.fixture
+def make_sharded(make_cache):
+    """Build ShardedWeatherCaches on the same fake clock and TTLs as make_cache"""
+    def make(**kwargs):
+        kwargs.setdefault('sweep_interval', 0)
+        return ShardedWeatherCache(**kwargs)
+
+    return make
+
+
+def test_key_always_maps_to_one_shard(make_sharded):
+    cache = make_sharded(shards=4)
+    cache.set('london', {'temp': 12})
+
+    holders = [shard for shard in cache.shards if shard.expires_at('london') is not None]
+
+    assert holders == [cache._shard('london')]
+    assert cache.get('london') == {'temp': 12}
+
+
+def test_keys_spread_across_shards(make_sharded):
+    cache = make_sharded(shards=4)
+    for i in range(200):
+        cache.set(f'city-{i}', i)
+
+    counts = [shard.stats()['entries'] for shard in cache.shards]
+
+    assert sum(counts) == 200
+    assert all(count > 0 for count in counts)
+
+
+def test_capacity_is_split_across_shards(make_sharded):
+    cache = make_sharded(shards=4, max_entries=10, max_bytes=1000)
+
+    assert [shard.max_entries for shard in cache.shards] == [3] * 4
+    assert [shard.max_bytes for shard in cache.shards] == [250] * 4
+
+
+def test_sharded_stats_sum_shards(make_sharded):
+    cache = make_sharded(shards=4)
+    cache.set('london', 1)
+    cache.set('paris', 2)
+    cache.get('london')
+    cache.get('berlin')
+
+    stats = cache.stats()
+
+    assert stats['shards'] == 4
+    assert (stats['entries'], stats['hits'], stats['misses']) == (2, 1, 1)
+    assert stats['hit_ratio'] == 0.5
+
+
+def test_sharded_stale_reads_share_one_refresher(make_sharded, clock):
+    cache = make_sharded(shards=4)
+    cache.set('london', 1)
+    cache.set('paris', 2)
+
+    assert all(shard.refresher is cache.refresher for shard in cache.shards)
+
+    clock.advance(70)
+    ran, refresh = recording_refresh()
+    assert cache.get('london', refresh) == 1
+    assert ran.wait(5)
+    assert cache.get_stale('paris') == 2
+
+
+def test_sharded_restore_reshards_exported_entries(make_sharded):
+    source = make_sharded(shards=2)
+    for i in range(20):
+        source.set(f'city-{i}', i)
+
+    target = make_sharded(shards=8)
+
+    assert target.restore(source.export()) == 20
+    assert all(target.get(f'city-{i}') == i for i in range(20))
+
+
+def test_negative_cache_expires_entries(monkeypatch, clock):
+    monkeypatch.setattr(cache_layer, 'time', clock)
+    not_found = NegativeCache(ttl=300)
+    not_found.add('atlantis')
+
+    clock.advance(299)
+    assert 'atlantis' in not_found
+    assert 'london' not in not_found
+
+    clock.advance(1)
+    assert 'atlantis' not in not_found
+    assert not_found.stats() == {'entries': 0, 'hits': 1}
+
+
+def test_negative_cache_drops_oldest_beyond_max_entries():
+    not_found = NegativeCache(ttl=300, max_entries=2)
+    for name in ('atlantis', 'el dorado', 'shangri-la'):
+        not_found.add(name)
+
+    assert 'atlantis' not in not_found
+    assert 'el dorado' in not_found
+    assert 'shangri-la' in not_found
+
+
+def test_negative_cache_discard():
+    not_found = NegativeCache(ttl=300)
+    not_found.add('atlantis')
+
+    not_found.discard('atlantis')
+    not_found.discard('atlantis')
+
+    assert 'atlantis' not in not_found
@@ -0,0 +1,109 @@
+"""
+Circuit Breaker Tests
+Run with: python -m pytest test_circuit_breaker.py
+"""
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+@pytest.fixture
+def breaker(monkeypatch, clock):
+    """Opens at 50% failures over 4+ calls in 30s, for 10s, with 2 probe calls"""
+    monkeypatch.setattr(circuit_breaker, 'time', clock)
+    return CircuitBreaker('test', failure_ratio=0.5, min_calls=4, window=30,
+                          open_seconds=10, half_open_calls=2)
+
+
+def call(breaker, failed):
+    probe = breaker.before_call()
+    breaker.record(failed, probe)
+    return probe
+
+
+def trip(breaker):
+    for failed in (True, True, False, True):
+        call(breaker, failed)
+
+
+def test_stays_closed_below_min_calls(breaker):
+    for _ in range(3):
+        call(breaker, True)
+
+    assert breaker.stats()['state'] == CircuitBreaker.CLOSED
+
+
+def test_stays_closed_below_failure_ratio(breaker):
+    for failed in (True, False, False, False, False):
+        call(breaker, failed)
+
+    assert breaker.stats()['state'] == CircuitBreaker.CLOSED
+
+
+def test_opens_at_failure_ratio_and_rejects(breaker):
+    trip(breaker)
+
+    with pytest.raises(CircuitOpenError) as excinfo:
+        breaker.before_call()
+
+    assert excinfo.value.retry_in == pytest.approx(10)
+    stats = breaker.stats()
+    assert stats['state'] == CircuitBreaker.OPEN
+    assert (stats['rejected'], stats['times_opened']) == (1, 1)
+
+
+def test_old_failures_leave_the_window(breaker, clock):
+    for _ in range(3):
+        call(breaker, True)
+
+    clock.advance(31)
+    call(breaker, True)
+
+    assert breaker.stats()['window_calls'] == 1
+    assert breaker.stats()['state'] == CircuitBreaker.CLOSED
+
+
+def test_half_open_limits_probe_calls(breaker, clock):
+    trip(breaker)
+    clock.advance(10)
+
+    assert breaker.before_call() is True
+    assert breaker.before_call() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.stats()['state'] == CircuitBreaker.HALF_OPEN
+
+
+def test_successful_probes_close_circuit(breaker, clock):
+    trip(breaker)
+    clock.advance(10)
+
+    assert call(breaker, False) is True
+    assert breaker.stats()['state'] == CircuitBreaker.HALF_OPEN
+    assert call(breaker, False) is True
+
+    assert breaker.stats()['state'] == CircuitBreaker.CLOSED
+    assert breaker.before_call() is False
+
+
+def test_failed_probe_reopens_circuit(breaker, clock):
+    trip(breaker)
+    clock.advance(10)
+
+    call(breaker, True)
+
+    stats = breaker.stats()
+    assert stats['state'] == CircuitBreaker.OPEN
+    assert stats['retry_in'] == 10
+    assert stats['times_opened'] == 2
+
+
+def test_calls_started_before_opening_are_ignored(breaker):
+    started = breaker.before_call()
+    trip(breaker)
+
+    breaker.record(False, started)
+
+    assert breaker.stats()['window_calls'] == 0
+    assert breaker.stats()['state'] == CircuitBreaker.OPEN
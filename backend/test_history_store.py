@@ -0,0 +1,32 @@
+"""
+History Store Tests
+Run with: python -m pytest test_history_store.py
+"""
+import pytest
+
+from history_store import MAX_TIME, HistoryQueryError, parse_range, parse_time
+
+
+def test_parse_time_accepts_epoch_and_iso():
+    assert parse_time('1704067200') == 1704067200
+    assert parse_time('2024-01-01T00:00:00Z') == 1704067200
+    # Naive times are UTC
+    assert parse_time('2024-01-01') == 1704067200
+    assert parse_time('2024-01-01T01:00:00+01:00') == 1704067200
+
+
+@pytest.mark.parametrize('value', ['nan', 'inf', '-inf', '1e400', '-1e20', str(MAX_TIME + 1), '0001-01-01'])
+def test_parse_time_rejects_out_of_range_values(value):
+    with pytest.raises(HistoryQueryError):
+        parse_time(value)
+
+
+def test_parse_time_rejects_garbage():
+    with pytest.raises(HistoryQueryError):
+        parse_time('yesterday')
+
+
+def test_parse_range_defaults(monkeypatch):
+    monkeypatch.setenv('HISTORY_DEFAULT_DAYS', '2')
+    start, end = parse_range(None, '1704067200')
+    assert (start, end) == (1704067200 - 2 * 86400, 1704067200)
@@ -0,0 +1,113 @@
+"""
+HTTP Cache Tests
+Run with: python -m pytest test_http_cache.py
+"""
+import gzip
+import json
+import time
+
+import pytest
+
+from http_cache import GZIP_MIN_BYTES, accepts_gzip, cache_control, etag_matches, render_json, response_headers
+
+
+@pytest.fixture
+def small():
+    return render_json({'city': 'London', 'temp': 12}, time.time() + 60)
+
+
+@pytest.fixture
+def large():
+    return render_json({'city': 'London', 'forecast': ['sunny'] * GZIP_MIN_BYTES}, time.time() + 60)
+
+
+def test_render_is_deterministic():
+    first = render_json({'b': 1, 'a': [1, 2]}, 0)
+    second = render_json({'a': [1, 2], 'b': 1}, 0)
+
+    assert first.body == second.body
+    assert first.etag == second.etag
+
+
+def test_different_data_gets_a_different_etag():
+    assert render_json({'temp': 12}, 0).etag != render_json({'temp': 13}, 0).etag
+
+
+def test_only_large_bodies_are_compressed(small, large):
+    assert small.gzip_body is None
+    assert gzip.decompress(large.gzip_body) == large.body
+
+
+def test_full_response(small):
+    status, body, headers = response_headers(small)
+
+    assert status == 200
+    assert json.loads(body) == {'city': 'London', 'temp': 12}
+    assert headers['ETag'] == small.etag
+    assert headers['Vary'] == 'Accept-Encoding'
+    assert headers['Content-Type'] == 'application/json'
+    assert 'Content-Encoding' not in headers
+
+
+def test_matching_etag_is_not_modified(small):
+    status, body, headers = response_headers(small, if_none_match=small.etag)
+
+    assert (status, body) == (304, b'')
+    assert headers['ETag'] == small.etag
+    assert 'Content-Type' not in headers
+
+
+def test_gzip_representation_has_its_own_etag(large):
+    status, body, headers = response_headers(large, accept_encoding='gzip, deflate')
+
+    assert status == 200
+    assert body == large.gzip_body
+    assert headers['Content-Encoding'] == 'gzip'
+    assert headers['ETag'] == large.gzip_etag == large.etag[:-1] + '-gz"'
+
+
+def test_etag_only_revalidates_its_own_representation(large):
+    assert response_headers(large, large.gzip_etag, 'gzip')[0] == 304
+    assert response_headers(large, large.etag, 'gzip')[0] == 200
+    assert response_headers(large, large.gzip_etag, None)[0] == 200
+    assert response_headers(large, large.etag, None)[0] == 304
+
+
+def test_small_body_keeps_identity_etag_for_gzip_clients(small):
+    status, body, headers = response_headers(small, small.etag, 'gzip')
+
+    assert status == 304
+    assert headers['ETag'] == small.etag
+
+
+@pytest.mark.parametrize('header, matches', [
+    (None, False),
+    ('', False),
+    ('*', True),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"xyz", "abc"', True),
+    ('"abc-gz"', False)
+])
+def test_etag_matches(header, matches):
+    assert etag_matches(header, '"abc"') is matches
+
+
+@pytest.mark.parametrize('header, allowed', [
+    (None, False),
+    ('identity', False),
+    ('gzip', True),
+    ('deflate, GZIP', True),
+    ('*', True),
+    ('gzip;q=0', False),
+    ('gzip; q=0.0', False),
+    ('gzip;q=0.5', True)
+])
+def test_accepts_gzip(header, allowed):
+    assert accepts_gzip(header) is allowed
+
+
+def test_cache_control():
+    assert cache_control(1060, now=1000) == 'public, max-age=60'
+    assert cache_control(1000, now=1000) == 'no-cache'
+    assert cache_control(900, now=1000) == 'no-cache'
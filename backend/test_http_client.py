@@ -0,0 +1,133 @@
+"""
+HTTP Client Tests
+Run with: python -m pytest test_http_client.py
+"""
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from http_client import AsyncUpstreamClient, UpstreamClient
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.calls += 1
+        time.sleep(self.server.delay)
+        self.send_response(self.server.status)
+        for name, value in self.server.headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    """Answers every GET with one status and set of headers, after a delay"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.status = 200
+        self.headers = {}
+        self.delay = 0.0
+        self.calls = 0
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/data/2.5/weather'
+
+
+@pytest.fixture
+def upstream():
+    server = StubServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def client(cls=UpstreamClient, **kwargs):
+    options = dict(max_retries=2, backoff_base=0.001, read_timeout=1, deadline=5)
+    options.update(kwargs)
+    return cls(**options)
+
+
+def get_async(client, url):
+    async def main():
+        try:
+            return await client.get(url)
+        finally:
+            await client.close()
+    return asyncio.run(main())
+
+
+def test_5xx_is_retried(upstream):
+    upstream.status = 503
+    assert client().get(upstream.url).status_code == 503
+    assert upstream.calls == 3
+
+
+def test_429_without_retry_after_is_not_retried(upstream):
+    upstream.status = 429
+    assert client().get(upstream.url).status_code == 429
+    assert upstream.calls == 1
+
+
+def test_429_with_retry_after_is_retried(upstream):
+    upstream.status = 429
+    upstream.headers = {'Retry-After': '0'}
+    assert client().get(upstream.url).status_code == 429
+    assert upstream.calls == 3
+
+
+def test_read_timeout_is_not_retried(upstream):
+    upstream.delay = 0.5
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        client(read_timeout=0.1).get(upstream.url)
+    assert upstream.calls == 1
+
+
+def test_no_retry_past_the_deadline(upstream):
+    upstream.status = 503
+    upstream.headers = {'Retry-After': '1'}
+    start = time.monotonic()
+    assert client(deadline=0.5).get(upstream.url).status_code == 503
+    assert time.monotonic() - start < 0.5
+    assert upstream.calls == 1
+
+
+def test_deadline_caps_the_read_timeout(upstream):
+    upstream.delay = 0.5
+    start = time.monotonic()
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        client(read_timeout=5, deadline=0.2).get(upstream.url)
+    assert time.monotonic() - start < 0.45
+
+
+def test_async_client_follows_the_same_policy(upstream):
+    upstream.status = 429
+    assert get_async(client(AsyncUpstreamClient), upstream.url).status_code == 429
+    assert upstream.calls == 1
+
+    upstream.status = 503
+    assert get_async(client(AsyncUpstreamClient), upstream.url).status_code == 503
+    assert upstream.calls == 4
+
+
+def test_async_read_timeout_is_not_retried(upstream):
+    import httpx
+
+    upstream.delay = 0.5
+    with pytest.raises(httpx.ReadTimeout):
+        get_async(client(AsyncUpstreamClient, read_timeout=0.1), upstream.url)
+    assert upstream.calls == 1
@@ -0,0 +1,184 @@
+"""
+Refresh Scheduler Tests
+Run with: python -m pytest test_refresh_scheduler.py
+"""
+import pytest
+
+import rate_limit
+import refresh_scheduler
+from refresh_scheduler import PopularityTracker, RefreshScheduler
+
+
+class StubRefresher:
+    """Keeps scheduled jobs instead of running them; 'pending' keys are refused"""
+
+    def __init__(self):
+        self.jobs = {}
+        self.pending = set()
+
+    def schedule(self, key, job):
+        if key in self.pending:
+            return False
+        self.pending.add(key)
+        self.jobs[key] = job
+        return True
+
+
+class StubCache:
+    """Only the parts of WeatherCache the scheduler uses"""
+
+    ttl = 60
+
+    def __init__(self):
+        self.expiry = {}
+        self.refresher = StubRefresher()
+
+    def expires_at(self, key):
+        return self.expiry.get(key)
+
+
+@pytest.fixture(autouse=True)
+def fake_time(monkeypatch, clock):
+    monkeypatch.setattr(refresh_scheduler, 'time', clock)
+    monkeypatch.setattr(rate_limit, 'time', clock)
+
+
+@pytest.fixture
+def cache():
+    return StubCache()
+
+
+@pytest.fixture
+def make_scheduler(cache):
+    schedulers = []
+
+    def make(calls_per_minute=60):
+        scheduler = RefreshScheduler(cache, top_k=10, calls_per_minute=calls_per_minute,
+                                     interval=60, lead=60, tracker=PopularityTracker(half_life=600))
+        schedulers.append(scheduler)
+        return scheduler
+
+    yield make
+    for scheduler in schedulers:
+        scheduler.close()
+
+
+def request(scheduler, key, times=1):
+    for _ in range(times):
+        scheduler.record(key, lambda: None)
+
+
+def test_tracker_ranks_most_requested_first():
+    tracker = PopularityTracker()
+    for key, count in (('paris', 3), ('london', 5), ('berlin', 1)):
+        for _ in range(count):
+            tracker.record(key)
+
+    assert [(key, estimate) for key, estimate, _ in tracker.top(2)] == [('london', 5), ('paris', 3)]
+
+
+def test_tracker_keeps_latest_refresh_callable():
+    tracker = PopularityTracker()
+    first, latest = object(), object()
+    tracker.record('london', first)
+    tracker.record('london', latest)
+
+    assert tracker.top(1)[0][2] is latest
+
+
+def test_tracker_never_undercounts():
+    tracker = PopularityTracker(width=16, depth=2, capacity=8)
+    counts = {f'city-{i}': i % 5 + 1 for i in range(100)}
+    for key, count in counts.items():
+        for _ in range(count):
+            tracker.record(key)
+
+    for key, count in counts.items():
+        assert tracker.record(key) - 1 >= count
+
+
+def test_tracker_keeps_only_the_hottest_candidates():
+    tracker = PopularityTracker(capacity=2)
+    for _ in range(10):
+        tracker.record('london')
+    for i in range(50):
+        tracker.record(f'city-{i}')
+
+    assert len(tracker) == 2
+    assert tracker.top(1)[0][0] == 'london'
+
+
+def test_tracker_counts_decay_by_half_life(clock):
+    tracker = PopularityTracker(half_life=600)
+    for _ in range(8):
+        tracker.record('london')
+
+    clock.advance(600)
+
+    assert tracker.record('london') == 5
+    assert tracker.top(1)[0][1] == 5
+
+
+def test_tick_refreshes_only_keys_near_expiry(make_scheduler, cache, clock):
+    scheduler = make_scheduler()
+    cache.expiry = {'london': clock.now + 300, 'paris': clock.now + 30}
+    for key in ('london', 'paris', 'berlin'):
+        request(scheduler, key)
+
+    assert scheduler.tick() == 2
+    assert set(cache.refresher.jobs) == {'paris', 'berlin'}
+
+
+def test_tick_stays_within_budget(make_scheduler, cache, clock):
+    scheduler = make_scheduler(calls_per_minute=2)
+    for count, key in enumerate(('london', 'paris', 'berlin', 'madrid')):
+        request(scheduler, key, times=10 - count)
+
+    assert scheduler.tick() == 2
+    assert set(cache.refresher.jobs) == {'london', 'paris'}
+    assert scheduler.stats()['over_budget'] == 1
+
+    clock.advance(30)
+    assert scheduler.tick() == 1
+    assert 'berlin' in cache.refresher.jobs
+
+
+def test_pending_refresh_does_not_spend_budget(make_scheduler, cache):
+    scheduler = make_scheduler(calls_per_minute=2)
+    request(scheduler, 'london', times=3)
+    request(scheduler, 'paris', times=2)
+    request(scheduler, 'berlin')
+    cache.refresher.pending.add('london')
+
+    assert scheduler.tick() == 2
+    assert set(cache.refresher.jobs) == {'paris', 'berlin'}
+    assert scheduler.stats()['over_budget'] == 0
+
+
+def test_request_after_old_expiry_counts_as_miss_avoided(make_scheduler, cache, clock):
+    scheduler = make_scheduler()
+    cache.expiry = {'london': clock.now + 30}
+    request(scheduler, 'london')
+    scheduler.tick()
+
+    cache.refresher.jobs['london']()
+    clock.advance(31)
+    request(scheduler, 'london')
+
+    stats = scheduler.stats()
+    assert (stats['refreshed'], stats['misses_avoided']) == (1, 1)
+    assert stats['misses_avoided_per_call'] == 1.0
+
+
+def test_failed_refresh_is_counted(make_scheduler, cache):
+    scheduler = make_scheduler()
+
+    def refresh():
+        raise ConnectionError('upstream down')
+
+    scheduler.record('london', refresh)
+    scheduler.tick()
+
+    with pytest.raises(ConnectionError):
+        cache.refresher.jobs['london']()
+    assert scheduler.stats()['failed'] == 1
@@ -0,0 +1,127 @@
+"""
+Single Flight Tests
+Run with: python -m pytest test_single_flight.py
+"""
+import time
+import asyncio
+import threading
+
+import pytest
+
+from single_flight import AsyncSingleFlight, SingleFlight
+
+
+def run_concurrently(flight, key, fn, callers):
+    """Call flight.do(key, fn) from several threads at once"""
+    results = [None] * callers
+    errors = [None] * callers
+
+    def call(i):
+        try:
+            results[i] = flight.do(key, fn)
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results, errors
+
+
+def blocking_fetch(release, result=None, error=None):
+    """fn for SingleFlight.do that waits for release, then counts as one upstream call"""
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        if error is not None:
+            raise error
+        return result
+    return fetch, calls
+
+
+def release_when_waiting(flight, count, release):
+    """Set release once count callers are waiting on the originator"""
+    def watch():
+        # Waiters are counted before they block, so the counter tells when all arrived
+        for _ in range(500):
+            if flight.stats()['coalesced'] >= count:
+                break
+            time.sleep(0.01)
+        release.set()
+    threading.Thread(target=watch, daemon=True).start()
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    release = threading.Event()
+    fetch, calls = blocking_fetch(release, result={'temp': 20})
+
+    release_when_waiting(flight, 7, release)
+    results, errors = run_concurrently(flight, 'weather_london-gb', fetch, 8)
+
+    assert len(calls) == 1
+    assert results == [{'temp': 20}] * 8
+    assert errors == [None] * 8
+    assert flight.stats() == {'originated': 1, 'coalesced': 7, 'in_flight': 0}
+
+
+def test_waiters_receive_the_originators_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+    fetch, calls = blocking_fetch(release, error=ValueError('City "nowhere" not found'))
+
+    release_when_waiting(flight, 3, release)
+    results, errors = run_concurrently(flight, 'weather_nowhere', fetch, 4)
+
+    assert len(calls) == 1
+    assert all(isinstance(e, ValueError) for e in errors)
+
+
+def test_keys_are_independent_and_calls_do_not_outlive_the_flight():
+    flight = SingleFlight()
+    assert flight.do('a', lambda: 1) == 1
+    assert flight.do('b', lambda: 2) == 2
+    # The finished call is forgotten, so the next caller fetches again
+    assert flight.do('a', lambda: 3) == 3
+    assert flight.stats() == {'originated': 3, 'coalesced': 0, 'in_flight': 0}
+
+
+def test_async_concurrent_callers_share_one_call():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {'temp': 20}
+
+    async def main():
+        return await asyncio.gather(*(flight.do('weather_london-gb', fetch) for _ in range(8)))
+
+    assert asyncio.run(main()) == [{'temp': 20}] * 8
+    assert len(calls) == 1
+    assert flight.stats() == {'originated': 1, 'coalesced': 7, 'in_flight': 0}
+
+
+def test_async_cancelled_waiter_does_not_cancel_the_fetch():
+    flight = AsyncSingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return 'done'
+
+    async def main():
+        originator = asyncio.ensure_future(flight.do('k', fetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flight.do('k', fetch))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return await originator
+
+    assert asyncio.run(main()) == 'done'
@@ -0,0 +1,114 @@
+"""
+Logging Utility Tests
+Run with: python -m pytest test_utils.py
+"""
+import queue
+import logging
+
+import pytest
+
+import utils
+from utils import BatchingQueueListener, LazyQueueHandler
+
+
+class ListHandler(logging.Handler):
+    def __init__(self, level=logging.NOTSET):
+        super().__init__(level)
+        self.lines = []
+        self.flushes = 0
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+    def flush(self):
+        self.flushes += 1
+
+
+@pytest.fixture
+def queued_logger():
+    handler = ListHandler()
+    log_queue = queue.SimpleQueue()
+    listener = BatchingQueueListener(log_queue, handler, batch_size=50)
+    logger = logging.getLogger('test_utils.queued')
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(LazyQueueHandler(log_queue))
+    yield logger, listener, handler
+    logger.handlers.clear()
+
+
+def test_message_is_rendered_at_the_call_site(queued_logger):
+    logger, listener, handler = queued_logger
+    cities = ['London']
+    logger.info('Fetching %s', cities)
+    cities.append('Paris')
+
+    listener.start()
+    listener.stop()
+
+    assert handler.lines == ["Fetching ['London']"]
+
+
+def test_records_are_written_in_batches_and_flushed_on_stop(queued_logger):
+    logger, listener, handler = queued_logger
+    for i in range(120):
+        logger.info('record %d', i)
+
+    listener.start()
+    listener.stop()
+
+    assert handler.lines == [f'record {i}' for i in range(120)]
+    # One flush per batch of up to 50 (the stop marker may end up in its own)
+    assert handler.flushes <= 4
+
+
+def test_handler_levels_are_respected():
+    info, errors = ListHandler(), ListHandler(logging.ERROR)
+    log_queue = queue.SimpleQueue()
+    listener = BatchingQueueListener(log_queue, info, errors)
+    handler = LazyQueueHandler(log_queue)
+    handler.handle(logging.makeLogRecord({'msg': 'fine', 'levelno': logging.INFO}))
+    handler.handle(logging.makeLogRecord({'msg': 'broken', 'levelno': logging.ERROR}))
+
+    listener.start()
+    listener.stop()
+
+    assert info.lines == ['fine', 'broken']
+    assert errors.lines == ['broken']
+
+
+@pytest.fixture
+def root_logger(monkeypatch, tmp_path):
+    # setup_logging() writes under the module's directory
+    monkeypatch.setattr(utils, '__file__', str(tmp_path / 'utils.py'))
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield root
+    utils.stop_logging()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def test_setup_logging_again_replaces_the_previous_setup(root_logger, monkeypatch, tmp_path):
+    monkeypatch.setenv('LOG_ASYNC', 'true')
+    utils.setup_logging()
+    first = utils._log_listener
+    utils.setup_logging()
+    assert utils._log_listener is not first
+    assert [type(h) for h in root_logger.handlers] == [LazyQueueHandler]
+
+    logging.getLogger('test_utils').info('after async setup')
+    monkeypatch.setenv('LOG_ASYNC', 'false')
+    utils.setup_logging()
+    # The listener of the async setup is stopped, its queue drained
+    assert utils._log_listener is None
+    assert LazyQueueHandler not in [type(h) for h in root_logger.handlers]
+
+    logging.getLogger('test_utils').info('after sync setup')
+    log_text = (tmp_path / 'logs' / 'app.log').read_text(encoding='utf-8')
+    assert 'after async setup' in log_text
+    assert 'after sync setup' in log_text
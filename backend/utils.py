@@ -3,27 +3,299 @@ Utility Functions
 Helper functions for logging and other utilities
 """
 import os
+import json
+import queue
+import atexit
 import logging
-from datetime import datetime
+from collections import deque
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, RotatingFileHandler
 from pathlib import Path
+from threading import Lock, Thread
+
+
+TEXT_LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class JsonLineFormatter(logging.Formatter):
+    """Formats each record as one JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        city = getattr(record, 'city', None)
+        if city is not None:
+            entry['city'] = city
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _BatchFlushMixin:
+    """
+    Handler mixin that skips the per-record flush while a batch is written.
+
+    BatchingQueueListener sets 'batching' around each batch and flushes once
+    at the end, so a burst of records costs one write syscall, not one each.
+    """
+
+    batching = False
+
+    def flush(self):
+        if not self.batching:
+            super().flush()
+
+
+class BatchRotatingFileHandler(_BatchFlushMixin, RotatingFileHandler):
+    pass
+
+
+class BatchStreamHandler(_BatchFlushMixin, logging.StreamHandler):
+    pass
+
+
+class BatchingQueueListener:
+    """
+    Writes queued log records to handlers from a background thread.
+
+    The thread blocks for the first record, then takes whatever else is
+    already queued (up to batch_size) before flushing the handlers. Each
+    handler only gets records at or above its own level.
+    """
+
+    _STOP = object()
+
+    def __init__(self, log_queue, *handlers, batch_size=256):
+        self.queue = log_queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self._thread = None
+
+    def start(self):
+        self._thread = Thread(target=self._run, name='log-listener', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Write out every record queued so far and stop the thread"""
+        if self._thread is not None:
+            self.queue.put(self._STOP)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for handler in self.handlers:
+                handler.batching = True
+            try:
+                for record in batch:
+                    if record is self._STOP:
+                        stopping = True
+                    else:
+                        self.handle(record)
+            finally:
+                for handler in self.handlers:
+                    handler.batching = False
+                    handler.flush()
+
+    def handle(self, record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener thread.
+
+    Only the message is rendered in the calling thread, so mutable objects
+    in record.args are logged as they were at the call site. The stock
+    QueueHandler also formats the whole line (and drops exc_info) so the
+    record can be pickled; our queue never leaves the process, so
+    timestamps, JSON and tracebacks are formatted by the listener instead.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class RecentLogBuffer(logging.Handler):
+    """
+    Keeps the most recent log records in memory for /logs queries.
+
+    Records are stored as small dicts in a bounded deque, so filtered
+    queries never touch the log file.
+    """
+
+    def __init__(self, capacity=None):
+        super().__init__()
+        self.records = deque(maxlen=capacity or int(os.getenv('LOG_BUFFER_SIZE', 5000)))
+        self.buffer_lock = Lock()
+
+    def emit(self, record):
+        try:
+            entry = {
+                'time': record.created,
+                'levelno': record.levelno,
+                'city': getattr(record, 'city', None),
+                'message': record.getMessage(),
+                'line': self.format(record)
+            }
+        except Exception:
+            self.handleError(record)
+            return
+        with self.buffer_lock:
+            self.records.append(entry)
+
+    def query(self, level=None, since=None, city=None, limit=100):
+        """
+        Filter buffered records, newest first
+
+        Args:
+            level: Minimum level name or number (e.g. 'ERROR')
+            since: Only records at or after this epoch time
+            city: Only records for this city (case-insensitive)
+            limit: Maximum number of lines to return
+
+        Returns:
+            List of formatted log lines
+        """
+        min_level = logging.getLevelName(level.upper()) if isinstance(level, str) else level
+        if min_level is not None and not isinstance(min_level, int):
+            raise ValueError(f'Unknown log level: {level}')
+        city = city.lower() if city else None
+
+        with self.buffer_lock:
+            records = list(self.records)
+
+        lines = []
+        for entry in reversed(records):
+            if since is not None and entry['time'] < since:
+                # Records are in time order, nothing older can match
+                break
+            if min_level is not None and entry['levelno'] < min_level:
+                continue
+            if city is not None:
+                if entry['city'] is not None:
+                    if entry['city'].lower() != city:
+                        continue
+                elif city not in entry['message'].lower():
+                    continue
+            lines.append(entry['line'])
+            if len(lines) >= limit:
+                break
+        return lines
+
+
+_log_buffer = RecentLogBuffer()
+_log_listener = None
 
 
 def setup_logging():
+    """
+    Configure the root logger
 
+    With LOG_ASYNC enabled (the default) request threads only render the
+    message and enqueue the record; a background listener formats it and
+    writes the file, the console and the /logs buffer in batches.
+    LOG_FORMAT=json writes one JSON object per line instead of plain text.
+    """
+    global _log_listener
+    
     logs_dir = Path(__file__).parent / 'logs'
     logs_dir.mkdir(exist_ok=True)
     
     log_file = logs_dir / 'app.log'
     
-    # Configure logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file),
-            logging.StreamHandler()  # Also log to console
-        ]
+    if os.getenv('LOG_FORMAT', 'text').lower() == 'json':
+        formatter = JsonLineFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_LOG_FORMAT)
+    
+    # Rotate by size so the log (and /logs reads) stay bounded
+    file_handler = BatchRotatingFileHandler(
+        log_file,
+        maxBytes=int(os.getenv('LOG_MAX_BYTES', 5 * 1024 * 1024)),
+        backupCount=int(os.getenv('LOG_BACKUP_COUNT', 5)),
+        encoding='utf-8'
+    )
+    console_handler = BatchStreamHandler()  # Also log to console
+    handlers = [file_handler, console_handler, _log_buffer]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    
+    level = os.getenv('LOG_LEVEL', 'INFO').upper()
+    
+    # Called again, the new handlers replace the previous ones (force=True)
+    if _log_listener is not None:
+        stop_logging()
+    
+    if os.getenv('LOG_ASYNC', 'true').lower() not in ('1', 'true', 'yes'):
+        logging.basicConfig(level=level, handlers=handlers, force=True)
+        return
+    
+    log_queue = queue.SimpleQueue()
+    _log_listener = BatchingQueueListener(
+        log_queue, *handlers, batch_size=int(os.getenv('LOG_BATCH_SIZE', 256))
     )
+    _log_listener.start()
+    
+    logging.basicConfig(level=level, handlers=[LazyQueueHandler(log_queue)], force=True)
+
+
+@atexit.register
+def stop_logging():
+    """Write out any queued records and stop the background listener"""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+
+def tail_lines(path, count, block_size=8192):
+    """
+    Read the last lines of a file by seeking backwards from the end
+
+    Only the blocks holding those lines are read, however large the file.
+
+    Args:
+        path: File path
+        count: Number of lines wanted
+        block_size: Bytes read per backwards step
+
+    Returns:
+        Up to count lines, oldest first, without line endings
+    """
+    if count <= 0:
+        return []
+    
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b''
+        
+        # One extra newline is needed to be sure the first line is complete
+        while position > 0 and data.count(b'\n') <= count:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    
+    lines = data.decode('utf-8', errors='replace').splitlines()
+    return lines[-count:]
 
 
 def get_recent_logs(count=10):
@@ -35,17 +307,36 @@ def get_recent_logs(count=10):
         return []
     
     try:
-        with open(log_file, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-            # Get last 'count' lines
-            recent_lines = lines[-count:] if len(lines) > count else lines
-            # Reverse to show newest first
-            return [line.strip() for line in reversed(recent_lines)]
+        # Reverse to show newest first
+        return [line.strip() for line in reversed(tail_lines(log_file, count))]
     except Exception as e:
         logging.error(f'Error reading log file: {str(e)}')
         return []
 
 
+def query_logs(level=None, since=None, city=None, limit=100):
+    """
+    Query recent log records held in memory
+
+    Covers the last LOG_BUFFER_SIZE records logged by this process.
+
+    Args:
+        level: Minimum level name (e.g. 'ERROR')
+        since: ISO timestamp or epoch seconds
+        city: City name
+        limit: Maximum number of lines
+
+    Returns:
+        List of formatted log lines, newest first
+    """
+    if since is not None:
+        try:
+            since = float(since)
+        except ValueError:
+            since = datetime.fromisoformat(since).timestamp()
+    return _log_buffer.query(level=level, since=since, city=city, limit=limit)
+
+
 def format_timestamp(timestamp):
     try:
         dt = datetime.fromisoformat(timestamp)
@@ -2,15 +2,31 @@
 Weather Service Module
 Handles communication with OpenWeatherMap API and data processing
 """
+import os
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from cache_layer import WeatherCache
+from alerts import AlertIndex, AlertRules, metrics_from_owm
+from cache_layer import NegativeCache, create_cache
+from cache_warmup import CachePreloader, CacheSnapshot
+from circuit_breaker import CircuitOpenError
+from city_index import CityIndex, fallback_key
+from forecast_aggregation import aggregate_daily
+from group_fetch import GroupFetcher
+from history_store import HistoryStore, format_time
+from http_cache import render_json
+from http_client import get_client
+from metrics import MetricFamily, STAGE_SECONDS, stage_timer
+from refresh_scheduler import RefreshScheduler
+from single_flight import SingleFlight
 
 
 class WeatherService:
     """Service class for weather data operations"""
     
     BASE_URL = 'https://api.openweathermap.org/data/2.5'
+    DERIVED_SLOTS = 8
     
     def __init__(self, api_key, high_temp_threshold=35, low_temp_threshold=5):
         """
@@ -25,25 +41,303 @@ class WeatherService:
             raise ValueError('OpenWeatherMap API key is required')
         
         self.api_key = api_key
+        # e.g. a local mock (devtools/mock_owm.py) for load tests
+        self.base_url = os.getenv('OPENWEATHER_BASE_URL', self.BASE_URL).rstrip('/')
         self.high_temp_threshold = high_temp_threshold
         self.low_temp_threshold = low_temp_threshold
-        self.cache = WeatherCache()
+        self.alert_rules = AlertRules.from_env(high_temp_threshold, low_temp_threshold)
+        # Alerts active per city, updated whenever current weather is fetched
+        self.alerts = AlertIndex(self.alert_rules)
+        self.cache = create_cache()
+        self.cities = CityIndex()
+        self.not_found = NegativeCache()
+        self.history = HistoryStore()
+        self.flight = SingleFlight()
+        self.client = get_client()
+        self.batch_concurrency = int(os.getenv('BATCH_MAX_CONCURRENCY', 8))
+        # Batch misses go through /group, 20 cities per call, once IDs are known
+        self.group_fetcher = GroupFetcher(
+            self.client, api_key, self.base_url, workers=self.batch_concurrency
+        )
+        # Runs the current-weather fetch alongside a forecast fetch
+        self.companion_pool = ThreadPoolExecutor(
+            max_workers=self.client.pool_size, thread_name_prefix='forecast-current'
+        )
+        # Set up by warm_up()
+        self.snapshot = None
+        self.preloader = None
+        # Keeps the REFRESH_TOP_K most requested cities fresh in the background
+        self.scheduler = None
+        if int(os.getenv('REFRESH_TOP_K', 0)) > 0:
+            self.scheduler = RefreshScheduler(self.cache)
     
-    def _check_temperature_alert(self, temp):
+    def warm_up(self):
         """
-        Check if temperature triggers an alert
+        Restore the cache snapshot, then start periodic snapshots and the
+        preload of CACHE_PRELOAD_CITIES / CACHE_PRELOAD_TOP_N in the
+        background
+        
+        Returns:
+            Number of cache entries restored
+        """
+        restored = 0
+        if os.getenv('CACHE_SNAPSHOT_ENABLED', 'true').lower() in ('1', 'true', 'yes'):
+            self.snapshot = CacheSnapshot(self.cache)
+            restored = self.snapshot.load()
+            self.snapshot.start()
+        
+        self.preloader = CachePreloader(self)
+        self.preloader.start()
+        return restored
+    
+    def ready(self):
+        """Whether the startup preload has finished (or timed out)"""
+        return self.preloader is None or self.preloader.ready()
+    
+    def shutdown(self):
+        """Stop scheduled refreshes and write a final cache snapshot"""
+        if self.scheduler is not None:
+            self.scheduler.close()
+        if self.snapshot is not None:
+            self.snapshot.close()
+    
+    def _cache_get(self, cache_key, refresh=None):
+        """
+        Cache lookup, timed as the cache_lookup stage
+        
+        Lookups made for clients pass refresh; those are the ones counted
+        towards a key's popularity.
+        """
+        if refresh is not None and self.scheduler is not None:
+            self.scheduler.record(cache_key, refresh)
+        with stage_timer('cache_lookup'):
+            return self.cache.get(cache_key, refresh=refresh)
+    
+    def _check_alerts(self, metrics, key=None):
+        """
+        Evaluate the alert rules for one observation
+        
+        Args:
+            metrics: Dictionary of metric -> value (see alerts.metrics_from_owm)
+            key: Canonical city key, for per-city thresholds
+            
+        Returns:
+            Dictionary with 'alert' (first alert message or None) and
+            'alerts' (names of all rules that fired)
+        """
+        fired = self.alert_rules.evaluate(metrics, key)
+        return {
+            'alert': fired[0].message if fired else None,
+            'alerts': [rule.name for rule in fired]
+        }
+    
+    @STAGE_SECONDS.labels('transform').time()
+    def _process_current_weather(self, data, key=None):
+        """
+        Convert an OpenWeatherMap /weather response into our format
+        
+        Args:
+            data: Parsed JSON response
+            key: Canonical city key, for per-city alert thresholds
+            
+        Returns:
+            Dictionary with weather data
+        """
+        return dict({
+            'city': data['name'],
+            'country': data['sys']['country'],
+            'temperature': round(data['main']['temp'], 1),
+            'feels_like': round(data['main']['feels_like'], 1),
+            'humidity': data['main']['humidity'],
+            'condition': data['weather'][0]['main'],
+            'description': data['weather'][0]['description'],
+            'icon': data['weather'][0]['icon'],
+            'wind_speed': round(data['wind']['speed'], 1),
+            'pressure': data['main']['pressure'],
+            'timestamp': datetime.utcnow().isoformat()
+        }, **self._check_alerts(metrics_from_owm(data), key))
+    
+    def _store_current_weather(self, cache_key, data):
+        """
+        Process, cache and index a fresh /weather response
+        
+        Returns:
+            Dictionary with weather data
+        """
+        key = cache_key.partition('_')[2]
+        weather_data = self._process_current_weather(data, key)
+        self.cache.set(cache_key, weather_data)
+        self.alerts.update(key, weather_data['city'], metrics_from_owm(data))
+        return weather_data
+    
+    @STAGE_SECONDS.labels('transform').time()
+    def _process_forecast(self, data):
+        """
+        Convert an OpenWeatherMap /forecast response into a 5-day summary
+        
+        The result is what gets cached; current conditions are kept in
+        their own weather_ entry and joined in by _compose_forecast.
+        
+        Args:
+            data: Parsed JSON response
+            
+        Returns:
+            Dictionary with daily forecast data and the next few raw slots
+        """
+        # Group 3-hour slots into days in the city's own timezone
+        forecast_array = aggregate_daily(data['list'], data['city'].get('timezone', 0), days=5)
+        
+        return {
+            'city': data['city']['name'],
+            'country': data['city']['country'],
+            'forecast': forecast_array,
+            'slots': [
+                {
+                    'dt': item['dt'],
+                    'temp': item['main']['temp'],
+                    'feels_like': item['main'].get('feels_like', item['main']['temp']),
+                    'humidity': item['main'].get('humidity'),
+                    'pressure': item['main'].get('pressure'),
+                    'condition': item['weather'][0]['main'],
+                    'description': item['weather'][0].get('description', ''),
+                    'icon': item['weather'][0]['icon'],
+                    'wind_speed': item.get('wind', {}).get('speed', 0)
+                }
+                # Only the next 24h are ever close enough to "now" to be used
+                for item in data['list'][:self.DERIVED_SLOTS]
+            ],
+            'timestamp': datetime.utcnow().isoformat()
+        }
+    
+    @STAGE_SECONDS.labels('transform').time()
+    def _derive_current_weather(self, forecast_entry, key=None):
+        """
+        Build current conditions from the forecast slot nearest to now
+        
+        Args:
+            forecast_entry: Cached forecast entry from _process_forecast
+            key: Canonical city key, for per-city alert thresholds
+            
+        Returns:
+            Dictionary with weather data, marked 'derived'
+        """
+        now = time.time()
+        slot = min(forecast_entry['slots'], key=lambda s: abs(s['dt'] - now))
+        
+        metrics = {
+            'temperature': slot['temp'],
+            'feels_like': slot['feels_like'],
+            'humidity': slot['humidity'],
+            'pressure': slot['pressure'],
+            'wind_speed': slot['wind_speed']
+        }
+        return dict({
+            'city': forecast_entry['city'],
+            'country': forecast_entry['country'],
+            'temperature': round(slot['temp'], 1),
+            'feels_like': round(slot['feels_like'], 1),
+            'humidity': slot['humidity'],
+            'condition': slot['condition'],
+            'description': slot['description'],
+            'icon': slot['icon'],
+            'wind_speed': round(slot['wind_speed'], 1),
+            'pressure': slot['pressure'],
+            'timestamp': datetime.utcfromtimestamp(slot['dt']).isoformat(),
+            'derived': True
+        }, **self._check_alerts(metrics, key))
+    
+    def _compose_forecast(self, forecast_entry, current_weather):
+        """Join a cached forecast entry with current conditions"""
+        forecast = {
+            'city': forecast_entry['city'],
+            'country': forecast_entry['country'],
+            'current': current_weather,
+            'forecast': forecast_entry['forecast'],
+            'timestamp': forecast_entry['timestamp']
+        }
+        if forecast_entry.get('stale'):
+            forecast['stale'] = True
+        return forecast
+    
+    def _resolve_city(self, city):
+        """
+        Map user input to a canonical cache key and an upstream query
+        
+        'London', 'london ', 'London,GB' and 'Londres' all resolve to the
+        key 'london-gb'. Cities missing from the index are passed upstream
+        as typed, unless CITY_INDEX_STRICT is set.
         
         Args:
-            temp: Temperature in Celsius
+            city: City name as given by the client
             
         Returns:
-            Alert message or None
+            (key, query) tuple
+            
+        Raises:
+            ValueError if the city is known not to exist
+        """
+        match = self.cities.resolve(city)
+        if match is not None:
+            key, query = match.key, match.query
+        elif self.cities.strict:
+            raise ValueError(f'City "{city}" not found')
+        else:
+            key, query = fallback_key(city), city.strip()
+        
+        if not key or key in self.not_found:
+            raise ValueError(f'City "{city}" not found')
+        return key, query
+    
+    def _mark_not_found(self, cache_key):
+        """Cache a 404 so the same bad name is not sent upstream again"""
+        self.not_found.add(cache_key.partition('_')[2])
+    
+    def _serve_stale(self, cache_key, error):
+        """
+        Fall back to an expired cache entry while the upstream is failing
+        
+        Args:
+            cache_key: Cache key that could not be fetched
+            error: Exception to raise if nothing usable is cached
+            
+        Returns:
+            The expired entry, marked 'stale'
+        """
+        stale_data = self.cache.get_stale(cache_key)
+        if not stale_data:
+            raise error
+        return dict(stale_data, stale=True)
+    
+    def _render_current(self, key, weather_data):
+        """Serialized /weather response, rendered once per cache entry"""
+        return self.cache.rendered(f'weather_{key}', weather_data, render_json)
+    
+    def _render_forecast(self, key, forecast_entry, current_weather):
         """
-        if temp > self.high_temp_threshold:
-            return 'High temperature warning!'
-        elif temp < self.low_temp_threshold:
-            return 'Low temperature warning!'
-        return None
+        Serialized /forecast response, rendered once per forecast entry
+        and current conditions
+        
+        The stored rendering is keyed by the current conditions' ETag, and
+        expires with whichever part expires first.
+        """
+        current = self._render_current(key, current_weather)
+        return self.cache.rendered(
+            f'forecast_{key}',
+            forecast_entry,
+            lambda entry, expires: render_json(
+                self._compose_forecast(entry, current_weather), min(expires, current.expires)
+            ),
+            variant=current.etag
+        )
+    
+    def _current_for_forecast(self, city, forecast_entry, derive_current):
+        """Current conditions to show with a forecast"""
+        if derive_current:
+            # A real observation is still preferred when one is cached
+            key, _ = self._resolve_city(city)
+            cached_data = self._cache_get(f'weather_{key}')
+            return cached_data or self._derive_current_weather(forecast_entry, key)
+        return self.get_current_weather(city)
     
     def get_current_weather(self, city):
         """
@@ -55,14 +349,46 @@ class WeatherService:
         Returns:
             Dictionary with weather data
         """
+        return self._current_weather(*self._resolve_city(city))
+    
+    def get_current_weather_response(self, city):
+        """
+        Get current weather for a city along with its serialized response
+        
+        Returns:
+            (weather data, http_cache.RenderedResponse)
+        """
+        key, query = self._resolve_city(city)
+        weather_data = self._current_weather(key, query)
+        return weather_data, self._render_current(key, weather_data)
+    
+    def _current_weather(self, key, query):
         # Check cache first
-        cache_key = f'weather_{city.lower()}'
-        cached_data = self.cache.get(cache_key)
+        cache_key = f'weather_{key}'
+        cached_data = self._cache_get(
+            cache_key, refresh=lambda: self._refresh_current_weather(query, cache_key)
+        )
         if cached_data:
             return cached_data
         
-        # Fetch from API
-        url = f'{self.BASE_URL}/weather'
+        # Concurrent misses for the same key share one upstream fetch
+        return self.flight.do(cache_key, lambda: self._fetch_current_weather(query, cache_key))
+    
+    def _refresh_current_weather(self, city, cache_key):
+        """Re-fetch a cached entry in the background (stale-while-revalidate)"""
+        return self.flight.do(
+            cache_key, lambda: self._fetch_current_weather(city, cache_key, revalidate=True)
+        )
+    
+    def _fetch_current_weather(self, city, cache_key, revalidate=False):
+        """Fetch current weather from the API and cache it"""
+        # A flight that just finished may have filled the cache
+        if not revalidate:
+            cached_data = self._cache_get(cache_key)
+            if cached_data:
+                return cached_data
+        
+        url = f'{self.base_url}/weather'
         params = {
             'q': city,
             'appid': self.api_key,
@@ -70,57 +396,104 @@ class WeatherService:
         }
         
         try:
-            response = requests.get(url, params=params, timeout=10)
+            response = self.client.get(url, params=params)
             response.raise_for_status()
             data = response.json()
             
-            # Process the data
-            weather_data = {
-                'city': data['name'],
-                'country': data['sys']['country'],
-                'temperature': round(data['main']['temp'], 1),
-                'feels_like': round(data['main']['feels_like'], 1),
-                'humidity': data['main']['humidity'],
-                'condition': data['weather'][0]['main'],
-                'description': data['weather'][0]['description'],
-                'icon': data['weather'][0]['icon'],
-                'wind_speed': round(data['wind']['speed'], 1),
-                'pressure': data['main']['pressure'],
-                'timestamp': datetime.utcnow().isoformat(),
-                'alert': self._check_temperature_alert(data['main']['temp'])
-            }
-            
-            # Cache the result
-            self.cache.set(cache_key, weather_data)
-            
-            return weather_data
+            # Cache the result and update the city's active alerts
+            return self._store_current_weather(cache_key, data)
             
+        except CircuitOpenError as e:
+            error = e
+        
         except requests.exceptions.HTTPError as e:
             if e.response.status_code == 404:
+                self._mark_not_found(cache_key)
                 raise ValueError(f'City "{city}" not found')
-            raise Exception(f'API error: {e.response.status_code}')
+            error = Exception(f'API error: {e.response.status_code}')
         
         except requests.exceptions.RequestException as e:
-            raise Exception(f'Network error: {str(e)}')
+            error = Exception(f'Network error: {str(e)}')
+        
+        # A background refresh leaves the stale entry in place for next time
+        if revalidate:
+            raise error
+        return self._serve_stale(cache_key, error)
     
-    def get_forecast(self, city):
+    def get_forecast(self, city, derive_current=False):
         """
         Get 5-day forecast for a city
         
         Args:
             city: City name
+            derive_current: Take current conditions from the nearest
+                forecast slot instead of fetching /weather when they are
+                not already cached
             
         Returns:
             Dictionary with current weather and forecast data
         """
+        _, forecast_entry, current_weather = self._forecast_parts(city, derive_current)
+        return self._compose_forecast(forecast_entry, current_weather)
+    
+    def get_forecast_response(self, city, derive_current=False):
+        """
+        Get 5-day forecast for a city along with its serialized response
+        
+        Returns:
+            (forecast data, http_cache.RenderedResponse)
+        """
+        key, forecast_entry, current_weather = self._forecast_parts(city, derive_current)
+        return (
+            self._compose_forecast(forecast_entry, current_weather),
+            self._render_forecast(key, forecast_entry, current_weather)
+        )
+    
+    def _forecast_parts(self, city, derive_current):
+        """
+        Cached or freshly fetched forecast entry and current conditions
+        
+        Returns:
+            (key, forecast entry, current weather)
+        """
         # Check cache first
-        cache_key = f'forecast_{city.lower()}'
-        cached_data = self.cache.get(cache_key)
-        if cached_data:
-            return cached_data
+        key, query = self._resolve_city(city)
+        cache_key = f'forecast_{key}'
+        forecast_entry = self._cache_get(
+            cache_key, refresh=lambda: self._refresh_forecast(query, cache_key)
+        )
+        if forecast_entry:
+            current_weather = self._current_for_forecast(city, forecast_entry, derive_current)
+            return key, forecast_entry, current_weather
+        
+        # Fetch /weather and /forecast concurrently rather than back to back
+        pending_current = None
+        if not derive_current:
+            pending_current = self.companion_pool.submit(self.get_current_weather, city)
+        
+        forecast_entry = self.flight.do(cache_key, lambda: self._fetch_forecast(query, cache_key))
+        
+        if pending_current is not None:
+            current_weather = pending_current.result()
+        else:
+            current_weather = self._current_for_forecast(city, forecast_entry, derive_current)
+        
+        return key, forecast_entry, current_weather
+    
+    def _refresh_forecast(self, city, cache_key):
+        """Re-fetch a cached entry in the background (stale-while-revalidate)"""
+        return self.flight.do(
+            cache_key, lambda: self._fetch_forecast(city, cache_key, revalidate=True)
+        )
+    
+    def _fetch_forecast(self, city, cache_key, revalidate=False):
+        """Fetch the forecast from the API and cache it"""
+        if not revalidate:
+            cached_data = self._cache_get(cache_key)
+            if cached_data:
+                return cached_data
         
-        # Fetch from API
-        url = f'{self.BASE_URL}/forecast'
+        url = f'{self.base_url}/forecast'
         params = {
             'q': city,
             'appid': self.api_key,
@@ -128,68 +501,386 @@ class WeatherService:
         }
         
         try:
-            response = requests.get(url, params=params, timeout=10)
+            response = self.client.get(url, params=params)
             response.raise_for_status()
             data = response.json()
             
-            # Get current weather first
-            current_weather = self.get_current_weather(city)
-            
-            # Process forecast data (group by day)
-            daily_forecasts = {}
-            
-            for item in data['list']:
-                # Get date from timestamp
-                date = datetime.fromtimestamp(item['dt']).strftime('%Y-%m-%d')
-                
-                if date not in daily_forecasts:
-                    daily_forecasts[date] = {
-                        'temps': [],
-                        'conditions': [],
-                        'icons': []
-                    }
-                
-                daily_forecasts[date]['temps'].append(item['main']['temp'])
-                daily_forecasts[date]['conditions'].append(item['weather'][0]['main'])
-                daily_forecasts[date]['icons'].append(item['weather'][0]['icon'])
-            
-            # Create 5-day summary
-            forecast_array = []
-            for date in sorted(daily_forecasts.keys())[:5]:
-                day_data = daily_forecasts[date]
-                
-                # Get most common condition
-                condition = max(set(day_data['conditions']), key=day_data['conditions'].count)
-                
-                # Get most common icon (prefer day icons)
-                icon = max(set(day_data['icons']), key=day_data['icons'].count)
-                
-                forecast_array.append({
-                    'date': date,
-                    'day_name': datetime.strptime(date, '%Y-%m-%d').strftime('%A'),
-                    'min_temp': round(min(day_data['temps']), 1),
-                    'max_temp': round(max(day_data['temps']), 1),
-                    'condition': condition,
-                    'icon': icon
-                })
-            
-            forecast_data = {
-                'city': data['city']['name'],
-                'country': data['city']['country'],
-                'current': current_weather,
-                'forecast': forecast_array,
-                'timestamp': datetime.utcnow().isoformat()
-            }
+            forecast_data = self._process_forecast(data)
             
             # Cache the result
             self.cache.set(cache_key, forecast_data)
             
             return forecast_data
             
+        except CircuitOpenError as e:
+            error = e
+        
         except requests.exceptions.HTTPError as e:
             if e.response.status_code == 404:
+                self._mark_not_found(cache_key)
                 raise ValueError(f'City "{city}" not found')
-            raise Exception(f'API error: {e.response.status_code}')
+            error = Exception(f'API error: {e.response.status_code}')
         
         except requests.exceptions.RequestException as e:
-            raise Exception(f'Network error: {str(e)}')
+            error = Exception(f'Network error: {str(e)}')
+        
+        if revalidate:
+            raise error
+        return self._serve_stale(cache_key, error)
+    
+    def _get_cached(self, kind, city):
+        """
+        Look up a full weather or forecast response without fetching
+        
+        Returns:
+            Response dictionary, or None if any part is not cached
+            
+        Raises:
+            ValueError if the city is known not to exist
+        """
+        key, query = self._resolve_city(city)
+        weather_key = f'weather_{key}'
+        current_weather = self._cache_get(
+            weather_key, refresh=lambda: self._refresh_current_weather(query, weather_key)
+        )
+        if kind == 'weather' or not current_weather:
+            return current_weather
+        
+        forecast_key = f'forecast_{key}'
+        forecast_entry = self._cache_get(
+            forecast_key, refresh=lambda: self._refresh_forecast(query, forecast_key)
+        )
+        if not forecast_entry:
+            return None
+        return self._compose_forecast(forecast_entry, current_weather)
+    
+    def _prefetch_current_weather(self, cities):
+        """
+        Bulk-fetch current weather for uncached cities and cache each one
+        
+        Args:
+            cities: City names
+            
+        Returns:
+            Dictionary of city -> exception for the cities that failed
+        """
+        uncached = {}
+        for city in cities:
+            key, query = self._resolve_city(city)
+            if not self._cache_get(f'weather_{key}'):
+                uncached.setdefault(query, []).append((city, f'weather_{key}'))
+        if len(uncached) < 2 or not self.group_fetcher.enabled:
+            return {}
+        
+        failures = {}
+        for query, outcome in self.group_fetcher.fetch_many(list(uncached)).items():
+            for city, cache_key in uncached[query]:
+                if isinstance(outcome, Exception):
+                    if isinstance(outcome, ValueError):
+                        self._mark_not_found(cache_key)
+                    failures[city] = outcome
+                else:
+                    self._store_current_weather(cache_key, outcome)
+        return failures
+    
+    def preload(self, cities, fetcher, rate_limiter=None, forecasts=False):
+        """
+        Fetch and cache cities that are not cached yet, e.g. at startup
+        
+        Args:
+            cities: City names
+            fetcher: GroupFetcher for current conditions, with its own
+                rate limiter and concurrency
+            rate_limiter: TokenBucket taken once per forecast call
+            forecasts: Also fetch forecasts
+            
+        Returns:
+            Dictionary with the number of cities loaded, already cached
+            and failed
+        """
+        uncached = {}
+        forecast_misses = []
+        cached = 0
+        failed = set()
+        
+        for city in dict.fromkeys(cities):
+            try:
+                key, query = self._resolve_city(city)
+            except ValueError:
+                failed.add(city)
+                continue
+            needs_weather = not self._cache_get(f'weather_{key}')
+            needs_forecast = forecasts and not self._cache_get(f'forecast_{key}')
+            if needs_weather:
+                uncached.setdefault(query, []).append(key)
+            if needs_forecast:
+                forecast_misses.append((key, query))
+            if not needs_weather and not needs_forecast:
+                cached += 1
+        
+        outcomes = fetcher.fetch_many(list(uncached)) if uncached else {}
+        for query, outcome in outcomes.items():
+            for key in uncached[query]:
+                if isinstance(outcome, Exception):
+                    if isinstance(outcome, ValueError):
+                        self._mark_not_found(f'weather_{key}')
+                    failed.add(key)
+                else:
+                    self._store_current_weather(f'weather_{key}', outcome)
+        
+        def fetch_forecast(key, query):
+            cache_key = f'forecast_{key}'
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            try:
+                self.flight.do(cache_key, lambda: self._fetch_forecast(query, cache_key))
+            except Exception:
+                failed.add(key)
+        
+        if forecast_misses:
+            # Leaving the block waits for every forecast
+            with ThreadPoolExecutor(max_workers=min(fetcher.workers, len(forecast_misses))) as pool:
+                for key, query in forecast_misses:
+                    pool.submit(fetch_forecast, key, query)
+        
+        fetched = {key for keys in uncached.values() for key in keys} | {key for key, _ in forecast_misses}
+        return {
+            'loaded': len(fetched - failed),
+            'cached': cached,
+            'failed': len(failed)
+        }
+    
+    def _take_not_found(self, misses, errors, failures):
+        """Record cities the bulk fetch reported as not found and drop them from misses"""
+        for city, error in failures.items():
+            if isinstance(error, ValueError):
+                errors[city] = {'error': str(error), 'status': 404}
+                misses.remove(city)
+    
+    def get_batch(self, cities, kind='weather'):
+        """
+        Get current weather or forecasts for several cities at once
+        
+        Cache hits are answered immediately. Current conditions for the
+        misses come from bulk /group calls once their city IDs are known;
+        the rest is fetched concurrently, at most BATCH_MAX_CONCURRENCY at a time.
+        
+        Args:
+            cities: List of city names
+            kind: 'weather' or 'forecast'
+            
+        Returns:
+            Dictionary with per-city results and per-city errors
+        """
+        if kind == 'weather':
+            fetch = self.get_current_weather
+        elif kind == 'forecast':
+            fetch = self.get_forecast
+        else:
+            raise ValueError(f'Unknown batch type: {kind}')
+        
+        results = {}
+        errors = {}
+        misses = []
+        
+        for city in dict.fromkeys(cities):
+            try:
+                cached_data = self._get_cached(kind, city)
+            except ValueError as e:
+                errors[city] = {'error': str(e), 'status': 404}
+                continue
+            if cached_data:
+                results[city] = cached_data
+            else:
+                misses.append(city)
+        
+        cache_hits = len(results)
+        fetched = len(misses)
+        
+        # Current conditions for every miss come from a few bulk calls; what
+        # is left (forecasts, failed cities) is fetched per city below
+        self._take_not_found(misses, errors, self._prefetch_current_weather(misses))
+        
+        if misses:
+            with ThreadPoolExecutor(max_workers=min(self.batch_concurrency, len(misses))) as pool:
+                futures = [(city, pool.submit(fetch, city)) for city in misses]
+                for city, future in futures:
+                    try:
+                        results[city] = future.result()
+                    except ValueError as e:
+                        errors[city] = {'error': str(e), 'status': 404}
+                    except CircuitOpenError:
+                        errors[city] = {'error': 'Weather service temporarily unavailable', 'status': 503}
+                    except Exception:
+                        errors[city] = {'error': f'Failed to fetch {kind} data', 'status': 500}
+        
+        return {
+            'type': kind,
+            'results': results,
+            'errors': errors,
+            'cache_hits': cache_hits,
+            'fetched': fetched
+        }
+    
+    def city_keys(self, cities):
+        """
+        Canonical keys for city names, e.g. for an alert filter
+        
+        Returns:
+            Set of keys; cities known not to exist are left out
+        """
+        keys = set()
+        for city in cities:
+            try:
+                keys.add(self._resolve_city(city)[0])
+            except ValueError:
+                continue
+        return keys
+    
+    def get_history(self, city, start, end, resolution='auto'):
+        """
+        Get stored snapshot history for a city
+        
+        Args:
+            city: City name
+            start: Range start, epoch seconds
+            end: Range end, epoch seconds
+            resolution: 'raw', 'hour', 'day', 'week' or 'auto'
+            
+        Returns:
+            Dictionary with the city key, range, resolution and points
+            
+        Raises:
+            ValueError if the city is known not to exist,
+            HistoryQueryError for an invalid range or resolution
+        """
+        key, _ = self._resolve_city(city)
+        resolution, points = self.history.query(key, start, end, resolution)
+        return {
+            'city': key,
+            'from': format_time(start),
+            'to': format_time(end),
+            'resolution': resolution,
+            'points': points
+        }
+    
+    def get_stats(self):
+        """
+        Get cache and upstream fetch statistics
+        
+        Returns:
+            Dictionary with cache hit/miss/eviction/size stats,
+            originated vs. coalesced fetch counts, bulk fetch counts,
+            circuit breaker state, upstream latency, cache warm-up and
+            scheduled refreshes
+        """
+        return {
+            'cache': self.cache.stats(),
+            'fetches': self.flight.stats(),
+            'group': self.group_fetcher.stats(),
+            'not_found': self.not_found.stats(),
+            'alerts': self.alerts.stats(),
+            'breaker': self.client.breaker.stats(),
+            'upstream': self.client.stats(),
+            'snapshot': self.snapshot.stats() if self.snapshot else None,
+            'preload': self.preloader.stats() if self.preloader else None,
+            'scheduler': self.scheduler.stats() if self.scheduler else None
+        }
+    
+    def metric_families(self):
+        """
+        Cache, fetch, breaker and alert counters for /metrics, read from
+        get_stats() at scrape time
+        
+        Returns:
+            List of metrics.MetricFamily
+        """
+        stats = self.get_stats()
+        cache = stats['cache']
+        # A shared cache reports its own lookups plus its local fallback
+        layers = [('shared', cache), ('local', cache['local'])] if 'local' in cache else [('memory', cache)]
+        
+        lookups = MetricFamily('weather_cache_lookups_total', 'counter',
+                               'Cache lookups by result', ('layer', 'result'))
+        entries = MetricFamily('weather_cache_entries', 'gauge', 'Entries held in memory', ('layer',))
+        size = MetricFamily('weather_cache_bytes', 'gauge', 'Approximate bytes held in memory', ('layer',))
+        removals = MetricFamily('weather_cache_removals_total', 'counter',
+                                'Entries evicted for space or expired', ('layer', 'reason'))
+        renders = MetricFamily('weather_cache_renders_total', 'counter',
+                               'HTTP responses serialized vs. served pre-rendered', ('layer', 'result'))
+        for layer, layer_stats in layers:
+            for result in ('hits', 'stale_hits', 'stale_if_error_hits', 'misses'):
+                if result in layer_stats:
+                    lookups.add(layer_stats[result], layer, result)
+            if 'entries' in layer_stats:
+                entries.add(layer_stats['entries'], layer)
+                size.add(layer_stats['bytes'], layer)
+                removals.add(layer_stats['evictions'], layer, 'evicted')
+                removals.add(layer_stats['expirations'], layer, 'expired')
+                renders.add(layer_stats['renders'], layer, 'rendered')
+                renders.add(layer_stats['render_hits'], layer, 'reused')
+        
+        fetches = MetricFamily('weather_fetches_total', 'counter',
+                               'Upstream fetches started vs. joined to one in flight', ('path', 'kind'))
+        in_flight = MetricFamily('weather_fetches_in_flight', 'gauge', 'Upstream fetches in flight', ('path',))
+        for path, name in (('sync', 'fetches'), ('async', 'fetches_async')):
+            if name in stats:
+                fetches.add(stats[name]['originated'], path, 'originated')
+                fetches.add(stats[name]['coalesced'], path, 'coalesced')
+                in_flight.add(stats[name]['in_flight'], path)
+        
+        breaker = stats['breaker']
+        breaker_state = MetricFamily('owm_circuit_state', 'gauge',
+                                     'OpenWeatherMap circuit breaker state (1 = current)', ('state',))
+        for state in ('closed', 'open', 'half_open'):
+            breaker_state.add(int(breaker['state'] == state), state)
+        rejected = MetricFamily('owm_circuit_rejected_total', 'counter', 'Calls rejected while the circuit was open')
+        rejected.add(breaker['rejected'])
+        
+        group_requests = MetricFamily('owm_group_requests_total', 'counter',
+                                      'Bulk /group vs. single-city upstream requests', ('kind',))
+        group_requests.add(stats['group']['group_requests'], 'group')
+        group_requests.add(stats['group']['single_requests'], 'single')
+        not_found = MetricFamily('weather_not_found_hits_total', 'counter',
+                                 'Requests answered 404 from the negative cache')
+        not_found.add(stats['not_found']['hits'])
+        
+        alerts = stats['alerts']
+        alerts_active = MetricFamily('weather_alerts_active', 'gauge', 'Alerts currently active')
+        alerts_active.add(alerts['active'])
+        alert_events = MetricFamily('weather_alert_events_total', 'counter', 'Alerts raised and cleared', ('event',))
+        alert_events.add(alerts['raised'], 'raised')
+        alert_events.add(alerts['cleared'], 'cleared')
+        subscribers = MetricFamily('weather_alert_subscribers', 'gauge', 'Open /alerts/stream connections')
+        subscribers.add(alerts['subscribers'])
+        
+        ready = MetricFamily('weather_ready', 'gauge', '1 once the startup cache preload is done')
+        ready.add(int(self.ready()))
+        warm = MetricFamily('weather_cache_warmup_entries', 'gauge',
+                            'Entries restored from / saved to the cache snapshot and cities preloaded', ('source',))
+        if stats['snapshot']:
+            warm.add(stats['snapshot']['restored'], 'snapshot_restored')
+            warm.add(stats['snapshot']['saved'], 'snapshot_saved')
+        if stats['preload']:
+            warm.add(stats['preload']['loaded'], 'preload_loaded')
+            warm.add(stats['preload']['failed'], 'preload_failed')
+        
+        scheduled = MetricFamily('weather_scheduled_refreshes_total', 'counter',
+                                 'Popularity-driven refreshes by result; refreshed and failed ones cost an upstream call',
+                                 ('result',))
+        avoided = MetricFamily('weather_scheduled_refresh_misses_avoided_total', 'counter',
+                               'Requests served from cache that would have missed without a scheduled refresh')
+        tracked = MetricFamily('weather_refresh_tracked_lookups_total', 'counter',
+                               'Client lookups counted by the refresh scheduler')
+        if stats['scheduler']:
+            scheduled.add(stats['scheduler']['refreshed'], 'refreshed')
+            scheduled.add(stats['scheduler']['failed'], 'failed')
+            scheduled.add(stats['scheduler']['over_budget'], 'over_budget')
+            avoided.add(stats['scheduler']['misses_avoided'])
+            tracked.add(stats['scheduler']['lookups'])
+        
+        return [
+            lookups, entries, size, removals, renders, fetches, in_flight, breaker_state, rejected,
+            group_requests, not_found, alerts_active, alert_events, subscribers, ready, warm,
+            scheduled, avoided, tracked
+        ]